@@ -0,0 +1,99 @@
+"""Compares the dictionary based and the sparse aggregation of pathway data
+
+run against a populated redis, e.g.:
+    python benchmarks/bench_aggregation.py --organism HSA --fraction 0.3
+"""
+
+import argparse
+import collections
+import pickle
+import random
+import time
+
+from visMOP.python_scripts.hierarchy_store import get_hierarchy_template
+from visMOP.python_scripts.reactome_hierarchy import (
+    ReactomeHierarchy,
+    ReactomeHierarchyTemplate,
+)
+from visMOP.python_scripts.sparse_aggregation import AGGREGATED_FIELDS
+
+
+def measured_hierarchy(
+    template: ReactomeHierarchyTemplate, fraction: float, seed: int
+) -> ReactomeHierarchy:
+    """Adds a random fraction of the proteins and metabolites of the organism as query data"""
+    rng = random.Random(seed)
+    hierarchy = ReactomeHierarchy(
+        template,
+        {
+            "amt_timesteps": 1,
+            "omics_recieved": [True, True, True],
+            "target_organism": template.organism,
+        },
+    )
+    for query_type, attribute in (
+        ("protein", "total_proteins"),
+        ("metabolite", "total_metabolites"),
+    ):
+        entity_pathways = collections.defaultdict(list)
+        for pathway_id, entry in template.items():
+            for entity in getattr(entry, attribute):
+                entity_pathways[entity].append((pathway_id, entry.name))
+        for entity, pathways in entity_pathways.items():
+            if rng.random() < fraction:
+                hierarchy.add_query_data(
+                    {
+                        "reactome_id": entity,
+                        "name": entity,
+                        "pathways": pathways,
+                        "measurement": [rng.gauss(0, 1)],
+                    },
+                    query_type,
+                    "Q-" + entity,
+                    "fc",
+                )
+    return hierarchy
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--organism", default="HSA")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--password", default="")
+    parser.add_argument("--fraction", type=float, default=0.3)
+    args = parser.parse_args()
+
+    # pickled hierarchies are restored on top of the template in the process wide store
+    template = get_hierarchy_template(
+        args.organism, args.host, args.port, args.password
+    )
+    start = time.perf_counter()
+    template.aggregation_index
+    print(f"sparse aggregation index: {time.perf_counter() - start:.3f}s")
+
+    for engine in ("dict", "sparse"):
+        hierarchy = measured_hierarchy(template, args.fraction, 0)
+        start = time.perf_counter()
+        hierarchy.aggregate_pathways(engine)
+        aggregated = time.perf_counter()
+        # the hierarchy is pickled into the session cache right after aggregation
+        cache_entry = pickle.dumps(hierarchy)
+        pickled = time.perf_counter()
+        # and loaded again by every follow up request
+        pickle.loads(cache_entry)
+        loaded = time.perf_counter()
+        for entry in hierarchy.values():
+            if entry.has_data:
+                for field in AGGREGATED_FIELDS:
+                    entry[field]
+        print(
+            f"{engine}: aggregation {aggregated - start:.3f}s, "
+            f"pickling {pickled - aggregated:.3f}s ({len(cache_entry) / 1e6:.1f} MB), "
+            f"loading {loaded - pickled:.3f}s, "
+            f"reading all pathways with data {time.perf_counter() - loaded:.3f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
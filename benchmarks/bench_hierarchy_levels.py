@@ -0,0 +1,85 @@
+"""Compares the breadth first level assignment with the previous recursive path enumeration
+
+run on the relation file of a release, e.g.:
+    python benchmarks/bench_hierarchy_levels.py reactome_data/ReactomePathwaysRelation.txt --organism HSA
+"""
+
+import argparse
+import time
+
+from visMOP.python_scripts.reactome_hierarchy import (
+    ReactomeHierarchyTemplate,
+    ReactomePathwayTemplate,
+)
+
+
+def read_relations(path: str, organism: str) -> ReactomeHierarchyTemplate:
+    """Builds the pathway structure of an organism from a relation file, without diagram data"""
+    template = ReactomeHierarchyTemplate(organism)
+    with open(path) as fh:
+        for line in fh:
+            left_entry, right_entry = line.strip().split("\t")[:2]
+            if organism not in left_entry:
+                continue
+            for pathway_id in (left_entry, right_entry):
+                if pathway_id not in template:
+                    template[pathway_id] = ReactomePathwayTemplate(pathway_id, False)
+            template[left_entry].children += (right_entry,)
+            template[right_entry].parents += (left_entry,)
+    for v in template.values():
+        v.assert_leaf_root_state()
+    return template
+
+
+def recursive_levels(template: ReactomeHierarchyTemplate) -> dict[str, tuple[int, str]]:
+    """The previous level assignment, enumerating all paths to a root for every pathway
+
+    The path list is shared between branches, as it was in the previous implementation.
+    """
+
+    def recursion(entry_id: str, path: list[str], final_entries: list[list[str]]):
+        path.append(entry_id)
+        if template[entry_id].is_root:
+            final_entries.append(path)
+        else:
+            for parent in template[entry_id].parents:
+                recursion(parent, path, final_entries)
+
+    levels: dict[str, tuple[int, str]] = {}
+    for k in template:
+        final_entries: list[list[str]] = []
+        recursion(k, [], final_entries)
+        shortest_path = min(final_entries, key=len)
+        level = len(shortest_path) - 1
+        levels[k] = (level, shortest_path[level])
+    return levels
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("relation_file")
+    parser.add_argument("--organism", default="HSA")
+    args = parser.parse_args()
+
+    template = read_relations(args.relation_file, args.organism)
+    print(f"{len(template)} pathways")
+
+    start = time.perf_counter()
+    previous = recursive_levels(template)
+    print(f"recursive: {time.perf_counter() - start:.3f}s")
+
+    start = time.perf_counter()
+    template.add_hierarchy_levels()
+    print(f"breadth first: {time.perf_counter() - start:.3f}s")
+
+    changed_levels = [k for k, v in template.items() if v.level != previous[k][0]]
+    changed_roots = [k for k, v in template.items() if v.root_id != previous[k][1]]
+    print(f"pathways with changed level: {len(changed_levels)}")
+    print(f"pathways with changed root: {len(changed_roots)}")
+    print(
+        f"max level: {max(template.levels)} (recursive: {max(l for l, _ in previous.values())})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Compares per key redis access with the bulk loader when building a hierarchy template,
+and parsing the relations with decoding the structure record written during ingest
+
+run against a populated redis, e.g.:
+    python benchmarks/bench_hierarchy_loading.py --organism HSA --batch-sizes 25 100 400
+"""
+
+import argparse
+import time
+
+from visMOP.python_scripts.storage_backend import get_storage_backend
+from visMOP.python_scripts.reactome_hierarchy import (
+    ReactomeHierarchyTemplate,
+    HIERARCHY_STRUCTURE_KEY,
+)
+from visMOP.python_scripts.redis_bulk_loader import RedisBulkLoader
+from visMOP.python_scripts.reactome_release import decode_relations, get_active_prefix
+
+
+def sequential_access(
+    organism: str, redis_host: str, redis_port: int, redis_pw: str
+) -> tuple[int, float]:
+    """Issues the requests of the previous per key loading one at a time
+
+    Returns:
+        round trips, elapsed seconds
+    """
+    start = time.perf_counter()
+    r1 = get_storage_backend(redis_host, redis_port, redis_pw).client(1)
+    r2 = get_storage_backend(redis_host, redis_port, redis_pw).client(2)
+    key_prefix = get_active_prefix(r2)
+    round_trips = 2
+    relations = r2.get(key_prefix + "ReactomePathwaysRelation")
+    if relations is None:
+        raise Exception("Could not find ReactomePathwaysRelation in redis")
+    has_diagram: dict[str, bool] = {}
+    for line in decode_relations(relations).splitlines():  # type: ignore
+        left_entry, right_entry = line.decode("utf-8").strip().split("\t")[:2]
+        left_entry_has_diagram = r1.exists(key_prefix + left_entry + ".graph") != 0
+        right_entry_has_diagram = r1.exists(key_prefix + right_entry + ".graph") != 0
+        round_trips += 2
+        if organism in left_entry:
+            has_diagram[left_entry] = left_entry_has_diagram
+            has_diagram[right_entry] = right_entry_has_diagram
+    for pathway, pathway_has_diagram in has_diagram.items():
+        if pathway_has_diagram:
+            r1.get(key_prefix + pathway)
+            r1.get(key_prefix + pathway + ".graph")
+            round_trips += 2
+    return round_trips, time.perf_counter() - start
+
+
+def structure_loading(
+    organism: str, redis_host: str, redis_port: int, redis_pw: str
+) -> None:
+    """Times creating the hierarchy structure from the relations and from the structure record"""
+    r1 = get_storage_backend(redis_host, redis_port, redis_pw).client(1)
+    r2 = get_storage_backend(redis_host, redis_port, redis_pw).client(2)
+    key_prefix = get_active_prefix(r2)
+    start = time.perf_counter()
+    ReactomeHierarchyTemplate(organism, key_prefix=key_prefix).load_data(
+        organism,
+        RedisBulkLoader(r2, key_prefix=key_prefix),
+        RedisBulkLoader(r1, key_prefix=key_prefix),
+    )
+    parsed = time.perf_counter() - start
+    relations = r2.get(key_prefix + "ReactomePathwaysRelation")
+
+    start = time.perf_counter()
+    record = r2.get(key_prefix + HIERARCHY_STRUCTURE_KEY.format(organism))
+    if record is None:
+        print("no structure record, run reactome_redis.py first")
+        return
+    ReactomeHierarchyTemplate(organism, key_prefix=key_prefix).apply_structure_record(
+        record
+    )  # type: ignore
+    decoded = time.perf_counter() - start
+    print(
+        f"relations: {parsed * 1000:.1f}ms ({len(relations) / 1e3:.0f} kB), "  # type: ignore
+        f"structure record: {decoded * 1000:.1f}ms ({len(record) / 1e3:.0f} kB)"  # type: ignore
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--organism", default="HSA")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--password", default="")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[25, 100, 400])
+    args = parser.parse_args()
+
+    round_trips, elapsed = sequential_access(
+        args.organism, args.host, args.port, args.password
+    )
+    print(f"sequential: {round_trips} round trips, {elapsed:.2f}s")
+    for batch_size in args.batch_sizes:
+        template = ReactomeHierarchyTemplate(
+            args.organism, args.host, args.port, args.password, batch_size
+        )
+        template.build()
+        report = template.load_report
+        assert report is not None
+        print(
+            f"bulk (batch size {batch_size}): {report['round_trips']} round trips, "
+            f"{report['elapsed_seconds']:.2f}s"
+        )
+    structure_loading(args.organism, args.host, args.port, args.password)
+
+
+if __name__ == "__main__":
+    main()
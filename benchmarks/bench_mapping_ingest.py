@@ -0,0 +1,145 @@
+"""Ingests a generated mapping file with populate_redis_mapping and reports duration and memory
+
+The file has the layout of the reactome *2Reactome_PE_Pathway.txt files, sorted by query id.
+Keys are written under the omics type BenchEnsembl and deleted afterwards, e.g.:
+    python benchmarks/bench_mapping_ingest.py --lines 2000000 --run-size 500000
+or without a redis server against an embedded database file:
+    python benchmarks/bench_mapping_ingest.py --host sqlite:///tmp/bench.sqlite
+With --changed-lines the file is ingested again after renaming the entities of that many lines,
+reporting how many records the differential ingest wrote.
+"""
+
+import argparse
+import pathlib
+import random
+import resource
+import tempfile
+
+from reactome_redis import MappingIngestReport, populate_redis_mapping
+from visMOP.python_scripts.storage_backend import get_storage_backend
+from visMOP.python_scripts.ingest_diff import FIELD_DIGESTS_KEY
+from visMOP.python_scripts.pathway_index import PATHWAY_ENTITIES_KEY
+
+ORGANISMS = ["Homo sapiens", "Mus musculus", "Rattus norvegicus", "Danio rerio"]
+
+
+def generate_mapping_file(path: pathlib.Path, lines: int, seed: int = 0) -> None:
+    """Writes lines of query id, entity, name, pathway, url, pathway name, evidence, species"""
+    rng = random.Random(seed)
+    pathways = 2500
+    written = 0
+    query_num = 0
+    with open(path, "w", encoding="utf8") as fh:
+        while written < lines:
+            organism = ORGANISMS[query_num % len(ORGANISMS)]
+            abbrev = "".join(word[0] for word in organism.split()).upper() + "A"
+            query_id = "ENSG{:011d}".format(query_num)
+            for _ in range(rng.randint(1, 4)):
+                entity_num = rng.randrange(lines // 8 + 1)
+                entity_id = "R-{}-{}".format(abbrev, entity_num)
+                entity_name = "Protein {} [cytosol]".format(entity_num)
+                for _ in range(rng.randint(1, 6)):
+                    pathway_num = rng.randrange(pathways)
+                    pathway_id = "R-{}-{}".format(abbrev, pathway_num)
+                    fh.write(
+                        "\t".join(
+                            [
+                                query_id,
+                                entity_id,
+                                entity_name,
+                                pathway_id,
+                                "https://reactome.org/PathwayBrowser/#/" + pathway_id,
+                                "Pathway number {}".format(pathway_num),
+                                "IEA",
+                                organism,
+                            ]
+                        )
+                        + "\n"
+                    )
+                    written += 1
+            query_num += 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--password", default="")
+    parser.add_argument("--lines", type=int, default=2000000)
+    parser.add_argument("--run-size", type=int, default=500000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--changed-lines", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        generate_mapping_file(pathlib.Path(data_dir) / "Bench.txt", args.lines)
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        report = ingest(args, data_dir)
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print_report(report)
+        print("peak memory grew by {:.0f} MB".format((rss_after - rss_before) / 1024))
+        if args.changed_lines:
+            change_lines(pathlib.Path(data_dir) / "Bench.txt", args.changed_lines)
+            report = ingest(args, data_dir)
+            print_report(report)
+            print(
+                "{} lines changed: {} records added, {} updated, {} removed, "
+                "{} unchanged".format(
+                    args.changed_lines,
+                    report["changes"]["added"],
+                    report["changes"]["updated"],
+                    report["changes"]["removed"],
+                    report["changes"]["unchanged"],
+                )
+            )
+    storage = get_storage_backend(args.host, args.port, args.password)
+    for organism in ORGANISMS:
+        organism = organism.replace(" ", "_")
+        names = [
+            "BenchEnsembl:" + organism,
+            PATHWAY_ENTITIES_KEY.format("BenchEnsembl", organism),
+        ]
+        storage.client(0).delete(*names)
+        storage.client(2).delete(*[FIELD_DIGESTS_KEY.format(0, name) for name in names])
+
+
+def ingest(args: argparse.Namespace, data_dir: str) -> MappingIngestReport:
+    return populate_redis_mapping(
+        args.password,
+        data_dir,
+        "Bench.txt",
+        "BenchEnsembl",
+        args.host,
+        args.port,
+        args.batch_size,
+        args.run_size,
+    )
+
+
+def change_lines(path: pathlib.Path, changed_lines: int, seed: int = 1) -> None:
+    """Renames the entities of randomly chosen lines"""
+    with open(path, encoding="utf8") as fh:
+        lines = fh.readlines()
+    for index in random.Random(seed).sample(range(len(lines)), changed_lines):
+        fields = lines[index].split("\t")
+        fields[2] = "Changed " + fields[2]
+        lines[index] = "\t".join(fields)
+    with open(path, "w", encoding="utf8") as fh:
+        fh.writelines(lines)
+
+
+def print_report(report: MappingIngestReport) -> None:
+    print(
+        "{} lines, {} records, {} runs, {} pipelines: {:.2f}s, {:.0f} lines/s".format(
+            report["lines"],
+            report["records"],
+            report["runs"],
+            report["round_trips"],
+            report["elapsed_seconds"],
+            report["lines"] / report["elapsed_seconds"],
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
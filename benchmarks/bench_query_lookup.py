@@ -0,0 +1,68 @@
+"""Compares per id HGET lookups with the batched lookup of ReactomeQuery
+
+run against a populated redis or embedded database (--host sqlite://<path>), e.g.:
+    python benchmarks/bench_query_lookup.py --database Ensembl --amount 20000 --batch-sizes 100 1000 5000
+"""
+
+import argparse
+import random
+import time
+
+from visMOP.python_scripts.storage_backend import get_storage_backend
+from visMOP.python_scripts.reactome_query import ReactomeQuery
+from visMOP.python_scripts.reactome_release import get_active_prefix
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database", default="Ensembl")
+    parser.add_argument("--organism", default="Homo_sapiens")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--password", default="")
+    parser.add_argument("--amount", type=int, default=20000)
+    parser.add_argument("--missing", type=float, default=0.1)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    args = parser.parse_args()
+
+    storage = get_storage_backend(args.host, args.port, args.password)
+    r = storage.client(0)
+    name = get_active_prefix(storage.client(2)) + f"{args.database}:{args.organism}"
+    known_ids = [key.decode("utf-8") for key in r.hkeys(name)]  # type: ignore
+    rng = random.Random(0)
+    query_ids = [
+        (
+            "missing-{}".format(num)
+            if rng.random() < args.missing
+            else rng.choice(known_ids)
+        )
+        for num in range(args.amount)
+    ]
+    query_data = [
+        ({"ID": query_id, "table_id": query_id}, [rng.gauss(0, 1)])
+        for query_id in query_ids
+    ]
+
+    start = time.perf_counter()
+    for query_id in query_ids:
+        r.hget(name, query_id)
+    print(f"per id: {len(query_ids)} round trips, {time.perf_counter() - start:.2f}s")
+    for batch_size in args.batch_sizes:
+        query = ReactomeQuery(
+            args.host,
+            args.port,
+            args.password,
+            query_data,
+            args.organism,  # type: ignore
+            args.database,  # type: ignore
+            batch_size,
+        )
+        assert query.lookup_report is not None
+        print(
+            f"batch size {batch_size}: {query.lookup_report['round_trips']} round trips, "
+            f"{query.lookup_report['elapsed_seconds']:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
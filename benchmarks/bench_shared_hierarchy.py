@@ -0,0 +1,72 @@
+"""Compares a hierarchy template built per worker with one attached to a shared segment
+
+run against a populated redis, e.g.:
+    python benchmarks/bench_shared_hierarchy.py --organism HSA --workers 3
+"""
+
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+from visMOP.python_scripts.reactome_hierarchy import ReactomeHierarchyTemplate
+from visMOP.python_scripts.shared_hierarchy import attach_template, export_template
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--organism", default="HSA")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--password", default="")
+    parser.add_argument("--workers", type=int, default=3)
+    args = parser.parse_args()
+
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    template = ReactomeHierarchyTemplate(
+        args.organism, args.host, args.port, args.password
+    )
+    template.build()
+    template.aggregation_index
+    built = time.perf_counter() - start
+    built_heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    path = os.path.join(tempfile.mkdtemp(), "{}.hierarchy".format(args.organism))
+    start = time.perf_counter()
+    export_template(template, path)
+    exported = time.perf_counter() - start
+    segment_size = os.path.getsize(path)
+
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    attached = attach_template(path, args.host, args.port, args.password)
+    attach_time = time.perf_counter() - start
+    attached_heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    for name, current in (("built", template), ("attached", attached)):
+        start = time.perf_counter()
+        for entry in current.values():
+            entry.total_proteins
+            entry.total_metabolites
+        print(f"{name}: reading all entity sets {time.perf_counter() - start:.3f}s")
+
+    print(f"build per worker: {built:.2f}s, {built_heap / 1e6:.1f} MB heap")
+    print(
+        f"shared: export {exported:.2f}s, segment {segment_size / 1e6:.1f} MB, "
+        f"attach {attach_time:.2f}s, {attached_heap / 1e6:.1f} MB heap per worker"
+    )
+    print(
+        f"{args.workers} workers: {args.workers * built_heap / 1e6:.1f} MB built, "
+        f"{(segment_size + args.workers * attached_heap) / 1e6:.1f} MB shared"
+    )
+
+
+if __name__ == "__main__":
+    main()
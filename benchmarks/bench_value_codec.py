@@ -0,0 +1,129 @@
+"""Compares json values with the binary value format, see visMOP/python_scripts/value_codec.py
+
+Samples values of each database of a populated redis, decodes them once and measures the decode
+time and the redis memory (MEMORY USAGE in a scratch database) of both encodings, e.g.:
+    python benchmarks/bench_value_codec.py --sample 2000
+"""
+
+import argparse
+import json
+import time
+import redis
+
+from visMOP.python_scripts.reactome_query import load_json_mapping_record
+from visMOP.python_scripts.value_codec import (
+    DIAGRAM_COMPRESSION,
+    decode_value,
+    encode_value,
+    zstandard,
+)
+
+
+def sample_values(r: redis.Redis, pattern: str, amount: int):
+    values = []
+    for key in r.scan_iter(match=pattern, count=1000):
+        key_type = r.type(key)
+        if key_type == b"hash":
+            values.extend(value for _, value in r.hscan_iter(key, count=1000))
+        elif key_type == b"string":
+            values.append(r.get(key))
+        if len(values) >= amount:
+            break
+    return values[:amount]
+
+
+def measure(values, decode, scratch: redis.Redis):
+    start = time.perf_counter()
+    for value in values:
+        decode(value)
+    decode_seconds = time.perf_counter() - start
+    memory = 0
+    try:
+        for num, value in enumerate(values):
+            scratch.set("bench:value:{}".format(num), value)
+            memory += scratch.memory_usage("bench:value:{}".format(num)) or 0
+    except redis.ResponseError:
+        # servers without the MEMORY command
+        memory = "unknown"
+    scratch.flushdb()
+    return sum(len(value) for value in values), memory, decode_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--password", default="")
+    parser.add_argument("--sample", type=int, default=2000)
+    parser.add_argument(
+        "--scratch-db", type=int, default=15, help="emptied after each measurement"
+    )
+    args = parser.parse_args()
+    scratch = redis.Redis(
+        host=args.host, port=args.port, db=args.scratch_db, password=args.password
+    )
+
+    compressions = ["none", "zlib"] + (["zstd"] if zstandard is not None else [])
+    # (name, database, key pattern, legacy decoder, json encoder of the decoded data, compressions)
+    cases = [
+        (
+            "mapping",
+            0,
+            "*:*",
+            load_json_mapping_record,
+            lambda data: json.dumps(data).encode("utf-8"),
+            ["none"],
+        ),
+        (
+            "diagrams",
+            1,
+            "*",
+            json.loads,
+            lambda data: json.dumps(data).encode("utf-8"),
+            compressions,
+        ),
+        (
+            "relations",
+            2,
+            "ReactomePathwaysRelation",
+            bytes,
+            bytes,
+            compressions,
+        ),
+        (
+            "pathway records",
+            2,
+            "PathwayRecords:*",
+            json.loads,
+            lambda data: json.dumps(data, separators=(",", ":")).encode("utf-8"),
+            ["none"],
+        ),
+    ]
+    for name, db, pattern, legacy, to_json, case_compressions in cases:
+        r = redis.Redis(host=args.host, port=args.port, db=db, password=args.password)
+        data = [
+            decode_value(value, legacy)
+            for value in sample_values(r, pattern, args.sample)
+        ]
+        if not data:
+            continue
+        print(f"{name}: {len(data)} values")
+        size, memory, seconds = measure(
+            [to_json(elem) for elem in data], legacy, scratch
+        )
+        print(f"  json: {size} bytes, {memory} bytes in redis, decode {seconds:.3f}s")
+        for compression in case_compressions:
+            size, memory, seconds = measure(
+                [encode_value(elem, compression) for elem in data],
+                lambda value: decode_value(value, legacy),
+                scratch,
+            )
+            print(
+                f"  binary {compression}: {size} bytes, {memory} bytes in redis, "
+                f"decode {seconds:.3f}s"
+            )
+    print(f"diagrams are stored with {DIAGRAM_COMPRESSION} compression")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,106 @@
 import json
+import hashlib
+import heapq
+import itertools
+import marshal
+import os
+import secrets
 import sys
 import pathlib
-from typing import Dict, List, NotRequired, Tuple, TypedDict
+import tarfile
+import tempfile
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from operator import itemgetter
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NotRequired,
+    Tuple,
+    TypedDict,
+    Union,
+)
 import redis
+from visMOP.python_scripts.redis_bulk_loader import DIAGRAM_ID_SET
+from visMOP.python_scripts.reactome_hierarchy import (
+    ReactomeHierarchyTemplate,
+    PATHWAY_RECORDS_KEY,
+    HIERARCHY_STRUCTURE_KEY,
+)
+from visMOP.python_scripts.reactome_release import (
+    ACTIVE_RELEASE_KEY,
+    RELEASE_FINGERPRINT_KEY,
+    RELEASE_KEY_PREFIX,
+    activate_release,
+    decode_relations,
+    get_active_prefix,
+    get_active_release,
+    get_release_fingerprint,
+    list_release_prefixes,
+)
+from visMOP.python_scripts.reactome_query import load_json_mapping_record
+from visMOP.python_scripts.utils import KEGG_CHEBI_KEY
+from visMOP.python_scripts.pathway_index import PATHWAY_ENTITIES_KEY
+from visMOP.python_scripts.storage_backend import get_storage_backend
+from visMOP.python_scripts.ingest_diff import (
+    HashDiffWriter,
+    IngestChanges,
+    add_changes,
+    content_digest,
+    no_changes,
+)
+from visMOP.python_scripts.value_codec import (
+    Compression,
+    DIAGRAM_COMPRESSION,
+    VALUE_FORMAT,
+    encode_json,
+    encode_value,
+    is_encoded,
+)
+
+# amount of values rewritten per pipeline by migrate_redis_values
+MIGRATION_BATCH_SIZE = 1000
+# amount of hash fields written per pipeline by populate_redis_mapping
+INGEST_BATCH_SIZE = 1000
+# amount of line contributions sorted in memory before they are spilled to disk
+INGEST_RUN_SIZE = 500000
+# contributions per marshal block of a spilled run
+INGEST_RUN_BLOCK = 10000
+# lines and records between two progress reports
+INGEST_PROGRESS_INTERVAL = 1000000
+# diagram files written per pipeline
+DIAGRAM_INGEST_BATCH_SIZE = 100
+# diagram files per ingest job of ingest_reactome
+DIAGRAM_JOB_SIZE = 500
+# diagram archive of the reactome download, read without extracting it if present
+DIAGRAM_ARCHIVE = "diagram.tgz"
+# diagram jobs per worker read from the archive ahead of the workers
+DIAGRAM_JOBS_PER_WORKER = 2
+# hash in the relation database (db 2) of the content digest of every diagram key
+DIAGRAM_DIGESTS_KEY = "DiagramDigests"
+# hash in the relation database of the digests of the source files and the pathway records of
+# each organism (records:HSA) a release was ingested from, see ingest_reactome
+INGEST_DIGESTS_KEY = "IngestDigests"
+RECORDS_DIGEST_FIELD = "records:{}"
+# field of the value format of the release, a release in another format is not used as base
+VALUE_FORMAT_FIELD = "value format"
+# keys of a running ingest are written under this prefix and renamed once all jobs succeeded
+INGEST_STAGING_PREFIX = "ingest:{}:"
+# mapping, diagram and relation database
+INGEST_DATABASES = (0, 1, 2)
+# bytes read per call when hashing the input files
+DIGEST_BLOCK_SIZE = 1 << 20
+# mapping file of each omics type
+MAPPING_FILES = {
+    "Ensembl": "Ensembl2Reactome_PE_Pathway.txt",
+    "UniProt": "UniProt2Reactome_PE_Pathway.txt",
+    "ChEBI": "ChEBI2Reactome_PE_Pathway.txt",
+}
 
 
 class ReactomeDBEntry(TypedDict):
@@ -33,6 +131,52 @@ A dictionary that maps organism IDs to ReactomeQueryEntry objects.
 """
 
 
+class MappingIngestReport(TypedDict):
+    """
+    A TypedDict that describes the statistics of a mapping file ingest.
+
+    Attributes:
+        lines (int): The number of lines read from the mapping file.
+        records (int): The number of mapping records and pathway index entries written.
+        runs (int): The number of sorted runs spilled to disk.
+        round_trips (int): The number of pipelines sent to redis.
+        elapsed_seconds (float): The duration of the ingest.
+        changes (IngestChanges): The hash fields written, deleted and skipped as unchanged.
+    """
+
+    lines: int
+    records: int
+    runs: int
+    round_trips: int
+    elapsed_seconds: float
+    changes: IngestChanges
+
+
+# contributions of one mapping line, sorted and grouped by (kind, organism, key, line order)
+# mapping: (0, organism, query or entity id, sequence, entity id, entity name, pathway id, pathway name)
+# pathway index: (1, organism, pathway id, sequence, query id, entity id, "", "")
+Contribution = Tuple[int, str, str, int, str, str, str, str]
+_MAPPING_RECORD = 0
+_PATHWAY_ENTITIES = 1
+
+
+def _write_run(path: pathlib.Path, contributions: List[Contribution]) -> None:
+    """Writes sorted contributions to a run file in length prefixed blocks"""
+    contributions.sort()
+    with open(path, "wb") as fh:
+        for start in range(0, len(contributions), INGEST_RUN_BLOCK):
+            block = marshal.dumps(contributions[start : start + INGEST_RUN_BLOCK])
+            fh.write(len(block).to_bytes(8, "little"))
+            fh.write(block)
+
+
+def _read_run(path: pathlib.Path) -> Iterator[Contribution]:
+    """Reads the contributions of a run file written by _write_run"""
+    with open(path, "rb") as fh:
+        while length := fh.read(8):
+            yield from marshal.loads(fh.read(int.from_bytes(length, "little")))
+
+
 def populate_redis_mapping(
     redis_pw: str,
     file_path: str,
@@ -40,132 +184,1446 @@ def populate_redis_mapping(
     omics_type: str,
     redis_host: str = "localhost",
     redis_port: int = 6379,
-):
+    batch_size: int = INGEST_BATCH_SIZE,
+    run_size: int = INGEST_RUN_SIZE,
+    key_prefix: str = "",
+) -> MappingIngestReport:
     """generate Redis mapping objects from mapping files. This is function should be run when updating the reactome data
+    Also stores the inverse mapping, the (query id, entity id) pairs of each pathway (see pathway_index).
+
+    The file is ingested with an external merge sort, so the memory does not grow with the file:
+    the first pass splits every line into its contributions to the records of the query id,
+    the entity id and the pathway, and spills them in sorted runs of run_size to disk.
+    The second pass merges the runs, builds one record at a time and writes them in pipelines.
+    Records are identical to building them in memory, entities and pathways keep the file order.
+    Only records that differ from the ones stored under key_prefix are written (see
+    ingest_diff.HashDiffWriter), hashes of organisms missing in the file are deleted.
 
     Args:
         file_path: path to pickles
         mapping_file_name: mapping file name
         omics_type: omics type
+        batch_size: amount of hash fields written per pipeline
+        run_size: amount of contributions sorted in memory before they are spilled to disk
+        key_prefix: prefix of the written keys, e.g. to stage them during ingest_reactome
 
+    Returns:
+        lines, records, runs, round trips, duration and changes of the ingest
     """
+    start_time = time.perf_counter()
     data_path = pathlib.Path(file_path)
-    database_2_reactome: Dict[str, ReactomeDBOrganism] = {}
-    r = redis.Redis(
-        host=redis_host, port=redis_port, db=0, password=redis_pw
-    )  # connect to local redis
+    storage = get_storage_backend(redis_host, redis_port, redis_pw)
+    writer = HashDiffWriter(
+        storage.client(0), storage.client(2), 0, key_prefix, batch_size
+    )
+    lines = 0
+    records = 0
 
-    # mapping_file e.g. 'UniProt2Reactome_PE_Pathway.txt' for uniprot
-    with open(data_path / mapping_file_name, encoding="utf8") as fh:
-        for line in fh:
-            line_split = line.strip().split("\t")
-            query_ID = line_split[0]
-            reactome_entity_ID = line_split[1]
-            entity_name = line_split[2]
-            reactome_pathway_ID = line_split[3]
-            reactome_pathway_Name = line_split[5]
-            organism = line_split[7].replace(" ", "_")
-            if organism not in database_2_reactome:
-                database_2_reactome[organism] = dict()
-            # for non reactome ID query
-            if query_ID in database_2_reactome[organism]:
-                if reactome_entity_ID in database_2_reactome[organism][query_ID]:
-                    database_2_reactome[organism][query_ID][reactome_entity_ID][
-                        "pathways"
-                    ].append((reactome_pathway_ID, reactome_pathway_Name))
-                else:
-                    database_2_reactome[organism][query_ID][reactome_entity_ID] = {
-                        "reactome_id": reactome_entity_ID,
-                        "name": entity_name,
-                        "pathways": [(reactome_pathway_ID, reactome_pathway_Name)],
-                    }
-            else:
-                database_2_reactome[organism][query_ID] = {}
-                database_2_reactome[organism][query_ID][reactome_entity_ID] = {
-                    "reactome_id": reactome_entity_ID,
-                    "name": entity_name,
-                    "pathways": [(reactome_pathway_ID, reactome_pathway_Name)],
-                }
-            # for reactome ID query
-            if reactome_entity_ID in database_2_reactome[organism]:
-                if (
-                    reactome_entity_ID
-                    in database_2_reactome[organism][reactome_entity_ID]
-                ):
-                    database_2_reactome[organism][reactome_entity_ID][
-                        reactome_entity_ID
-                    ]["pathways"].append((reactome_pathway_ID, reactome_pathway_Name))
-                else:
-                    database_2_reactome[organism][reactome_entity_ID][
-                        reactome_entity_ID
-                    ] = {
-                        "reactome_id": reactome_entity_ID,
-                        "name": entity_name,
-                        "pathways": [(reactome_pathway_ID, reactome_pathway_Name)],
-                    }
+    with tempfile.TemporaryDirectory(prefix="mapping_ingest") as run_dir:
+        # first pass: sorted runs of contributions
+        runs: List[pathlib.Path] = []
+        contributions: List[Contribution] = []
+        # mapping_file e.g. 'UniProt2Reactome_PE_Pathway.txt' for uniprot
+        with open(data_path / mapping_file_name, encoding="utf8") as fh:
+            for line in fh:
+                line_split = line.strip().split("\t")
+                query_ID = line_split[0]
+                reactome_entity_ID = line_split[1]
+                entity_name = line_split[2]
+                reactome_pathway_ID = line_split[3]
+                reactome_pathway_Name = line_split[5]
+                organism = line_split[7].replace(" ", "_")
+                sequence = 2 * lines
+                # for non reactome ID query
+                contributions.append(
+                    (
+                        _MAPPING_RECORD,
+                        organism,
+                        query_ID,
+                        sequence,
+                        reactome_entity_ID,
+                        entity_name,
+                        reactome_pathway_ID,
+                        reactome_pathway_Name,
+                    )
+                )
+                # for reactome ID query
+                contributions.append(
+                    (
+                        _MAPPING_RECORD,
+                        organism,
+                        reactome_entity_ID,
+                        sequence + 1,
+                        reactome_entity_ID,
+                        entity_name,
+                        reactome_pathway_ID,
+                        reactome_pathway_Name,
+                    )
+                )
+                contributions.append(
+                    (
+                        _PATHWAY_ENTITIES,
+                        organism,
+                        reactome_pathway_ID,
+                        sequence,
+                        query_ID,
+                        reactome_entity_ID,
+                        "",
+                        "",
+                    )
+                )
+                lines += 1
+                if len(contributions) >= run_size:
+                    runs.append(pathlib.Path(run_dir) / "run{}".format(len(runs)))
+                    _write_run(runs[-1], contributions)
+                    contributions = []
+                if lines % INGEST_PROGRESS_INTERVAL == 0:
+                    print(
+                        "{}: read {} lines, {:.0f} lines/s".format(
+                            mapping_file_name,
+                            lines,
+                            lines / (time.perf_counter() - start_time),
+                        )
+                    )
+        contributions.sort()
+        spilled_runs = len(runs)
+
+        # second pass: merge the runs and write one record per group, the groups of
+        # each hash follow each other in ascending key order
+        merged = heapq.merge(contributions, *[_read_run(run) for run in runs])
+        for (kind, organism, key), group in itertools.groupby(
+            merged, key=itemgetter(0, 1, 2)
+        ):
+            if kind == _MAPPING_RECORD:
+                record: ReactomeQueryEntry = {}
+                for (
+                    _,
+                    _,
+                    _,
+                    _,
+                    entity_ID,
+                    entity_name,
+                    pathway_ID,
+                    pathway_Name,
+                ) in group:
+                    if entity_ID in record:
+                        record[entity_ID]["pathways"].append((pathway_ID, pathway_Name))
+                    else:
+                        record[entity_ID] = {
+                            "reactome_id": entity_ID,
+                            "name": entity_name,
+                            "pathways": [(pathway_ID, pathway_Name)],
+                        }
+                writer.add(f"{omics_type}:{organism}", key, record)
             else:
-                database_2_reactome[organism][reactome_entity_ID] = {}
-                database_2_reactome[organism][reactome_entity_ID][
-                    reactome_entity_ID
-                ] = {
-                    "reactome_id": reactome_entity_ID,
-                    "name": entity_name,
-                    "pathways": [(reactome_pathway_ID, reactome_pathway_Name)],
-                }
-    for organism, entities in database_2_reactome.items():
-        for entity, data in entities.items():
-            r.hset(
-                f"{omics_type}:{organism}", entity, json.dumps(data)
-            )  # store data in redis
+                entities = dict.fromkeys(
+                    (query_ID, entity_ID)
+                    for _, _, _, _, query_ID, entity_ID, _, _ in group
+                )
+                writer.add(
+                    PATHWAY_ENTITIES_KEY.format(omics_type, organism),
+                    key,
+                    list(entities),
+                )
+            records += 1
+            if records % INGEST_PROGRESS_INTERVAL == 0:
+                print(
+                    "{}: wrote {} records, {:.0f} records/s".format(
+                        mapping_file_name,
+                        records,
+                        records / (time.perf_counter() - start_time),
+                    )
+                )
+        writer.finish()
+        writer.remove_unwritten(
+            [omics_type + ":*", PATHWAY_ENTITIES_KEY.format(omics_type, "*")]
+        )
+
+    elapsed_seconds = time.perf_counter() - start_time
+    print(
+        "{}: ingested {} lines as {} records in {:.2f}s ({:.0f} lines/s), "
+        "{} runs spilled, {} pipelines, {} records written".format(
+            mapping_file_name,
+            lines,
+            records,
+            elapsed_seconds,
+            lines / elapsed_seconds if elapsed_seconds else 0,
+            spilled_runs,
+            writer.round_trips,
+            writer.changes["added"] + writer.changes["updated"],
+        )
+    )
+    return {
+        "lines": lines,
+        "records": records,
+        "runs": spilled_runs,
+        "round_trips": writer.round_trips,
+        "elapsed_seconds": elapsed_seconds,
+        "changes": writer.changes,
+    }
+
+
+IngestJob = Tuple[str, Callable[..., Any], Tuple[Any, ...]]
+"""
+A tuple of job name, ingest function and its arguments.
+"""
+
+
+DiagramMember = Tuple[str, bytes]
+"""
+A tuple of the name of a diagram json file without extension and its content.
+"""
+
+
+class DiagramIngestReport(TypedDict):
+    """
+    A TypedDict that describes the diagram files stored by store_diagram_members.
+
+    Attributes:
+        names (List[str]): The keys of all files, e.g. R-HSA-1234 and R-HSA-1234.graph.
+        written (List[str]): The keys of the files whose content changed.
+        changes (IngestChanges): The keys written and skipped as unchanged.
+    """
+
+    names: List[str]
+    written: List[str]
+    changes: IngestChanges
+
+
+def store_diagram_members(
+    redis_pw: str,
+    members: Iterable[DiagramMember],
+    redis_host: str = "localhost",
+    redis_port: int = 6379,
+    compression: Compression = DIAGRAM_COMPRESSION,
+    key_prefix: str = "",
+) -> DiagramIngestReport:
+    """
+    save the contents of diagram json files to redis, compressed with the supplied compression.
+    Files whose content digest equals the one stored under key_prefix are skipped.
+
+    Returns:
+        the keys of all and of the written files and the amount of changes
+    """
+    storage = get_storage_backend(redis_host, redis_port, redis_pw)
+    r = storage.client(1)
+    relation_db = storage.client(2)
+    report: DiagramIngestReport = {"names": [], "written": [], "changes": no_changes()}
+    pipe = r.pipeline(transaction=False)
+    members = iter(members)
+    while batch := list(itertools.islice(members, DIAGRAM_INGEST_BATCH_SIZE)):
+        stored = relation_db.hmget(
+            key_prefix + DIAGRAM_DIGESTS_KEY, [name for name, _ in batch]
+        )
+        digests: Dict[str, bytes] = {}
+        for (name, content), stored_digest in zip(batch, stored):
+            report["names"].append(name)
+            digest = content_digest(content)
+            if digest == stored_digest:
+                report["changes"]["unchanged"] += 1
+                continue
+            pipe.set(key_prefix + name, encode_json(content, compression))
+            digests[name] = digest
+            report["written"].append(name)
+            report["changes"]["added" if stored_digest is None else "updated"] += 1
+        pipe.execute()
+        if digests:
+            relation_db.hset(key_prefix + DIAGRAM_DIGESTS_KEY, mapping=digests)
+    return report
+
+
+def store_diagram_files(
+    redis_pw: str,
+    files: List[str],
+    redis_host: str = "localhost",
+    redis_port: int = 6379,
+    compression: Compression = DIAGRAM_COMPRESSION,
+    key_prefix: str = "",
+) -> DiagramIngestReport:
+    """
+    save diagram json files to redis, compressed with the supplied compression,
+    see store_diagram_members
+    """
+    return store_diagram_members(
+        redis_pw,
+        ((file.stem, file.read_bytes()) for file in map(pathlib.Path, files)),
+        redis_host,
+        redis_port,
+        compression,
+        key_prefix,
+    )
+
+
+def store_diagram_ids(
+    redis_pw: str,
+    diagram_ids: List[str],
+    redis_host: str = "localhost",
+    redis_port: int = 6379,
+    key_prefix: str = "",
+):
+    """
+    save the set of pathways with diagram, allows loading the hierarchy without a lookup per pathway
+
+    Args:
+        diagram_ids: ids of the pathways with a graph file
+    """
+    r = get_storage_backend(redis_host, redis_port, redis_pw).client(1)
+    r.delete(key_prefix + DIAGRAM_ID_SET)
+    if diagram_ids:
+        r.sadd(key_prefix + DIAGRAM_ID_SET, *diagram_ids)
+
+
+def graph_diagram_ids(names: Iterable[str]) -> List[str]:
+    """Returns the ids of the pathways with a graph file among the diagram keys"""
+    return [name[: -len(".graph")] for name in names if name.endswith(".graph")]
+
+
+def remove_missing_diagrams(
+    redis_pw: str,
+    names: Iterable[str],
+    redis_host: str = "localhost",
+    redis_port: int = 6379,
+    key_prefix: str = "",
+) -> List[str]:
+    """
+    delete the diagram keys stored under key_prefix that are not among names, e.g. the files
+    of the current diagram archive
+
+    Returns:
+        the deleted keys without prefix
+    """
+    storage = get_storage_backend(redis_host, redis_port, redis_pw)
+    r = storage.client(1)
+    current = set(names)
+    current.add(DIAGRAM_ID_SET)
+    removed = [
+        name
+        for name in (
+            key.decode("utf-8")[len(key_prefix) :]
+            for key in _prefixed_keys(r, key_prefix)
+        )
+        if name not in current
+    ]
+    for start in range(0, len(removed), MIGRATION_BATCH_SIZE):
+        batch = removed[start : start + MIGRATION_BATCH_SIZE]
+        r.delete(*[key_prefix + name for name in batch])
+        storage.client(2).hdel(key_prefix + DIAGRAM_DIGESTS_KEY, *batch)
+    return removed
+
+
+def diagram_files(file_path: str) -> List[str]:
+    """Returns the paths of the diagram json files in file_path/diagram"""
+    return sorted(
+        str(file) for file in (pathlib.Path(file_path) / "diagram").glob("*.json")
+    )
+
+
+def diagram_archive_members(archive: str) -> Iterator[DiagramMember]:
+    """Yields the diagram json files of a diagram.tgz in archive order
+
+    The archive is decompressed as a stream, nothing is extracted to disk.
+    """
+    with tarfile.open(archive, "r|gz") as tar:
+        for member in tar:
+            if member.isfile() and member.name.endswith(".json"):
+                fh = tar.extractfile(member)
+                assert fh is not None
+                yield pathlib.PurePosixPath(member.name).stem, fh.read()
+
+
+def diagram_jobs(
+    redis_pw: str,
+    file_path: str,
+    redis_host: str = "localhost",
+    redis_port: int = 6379,
+    compression: Compression = DIAGRAM_COMPRESSION,
+    key_prefix: str = "",
+) -> Iterator[IngestJob]:
+    """
+    Yields ingest jobs of DIAGRAM_JOB_SIZE diagram files each, read from file_path/diagram.tgz
+    while the jobs are taken or, without archive, from the extracted file_path/diagram folder.
+    """
+    archive = pathlib.Path(file_path) / DIAGRAM_ARCHIVE
+    if archive.exists():
+        function: Callable[..., DiagramIngestReport] = store_diagram_members
+        diagrams: Iterator[Any] = diagram_archive_members(str(archive))
+    else:
+        function = store_diagram_files
+        diagrams = iter(diagram_files(file_path))
+    for num, chunk in enumerate(
+        iter(lambda: list(itertools.islice(diagrams, DIAGRAM_JOB_SIZE)), [])
+    ):
+        yield (
+            "diagrams {}-{}".format(
+                num * DIAGRAM_JOB_SIZE + 1, num * DIAGRAM_JOB_SIZE + len(chunk)
+            ),
+            function,
+            (redis_pw, chunk, redis_host, redis_port, compression, key_prefix),
+        )
 
 
 def populate_redis_diagram(
-    redis_pw: str, file_path: str, redis_host: str = "localhost", redis_port: int = 6379
+    redis_pw: str,
+    file_path: str,
+    redis_host: str = "localhost",
+    redis_port: int = 6379,
+    compression: Compression = DIAGRAM_COMPRESSION,
+    key_prefix: str = "",
 ):
     """
-    save the diagram json files in file_path to redis
+    save the diagram json files in file_path to redis, compressed with the supplied compression
     """
-    data_path = pathlib.Path(file_path) / "diagram"
-    r = redis.Redis(
-        host=redis_host, port=redis_port, db=1, password=redis_pw
-    )  # connect to local redis
-    for file in data_path.glob("*.json"):
-        with open(file) as fh:
-            data = json.load(fh)
-            r.set(file.stem, json.dumps(data))
+    names = [
+        name
+        for _, function, args in diagram_jobs(
+            redis_pw, file_path, redis_host, redis_port, compression, key_prefix
+        )
+        for name in function(*args)["names"]
+    ]
+    store_diagram_ids(
+        redis_pw, graph_diagram_ids(names), redis_host, redis_port, key_prefix
+    )
 
 
 def populate_relations(
-    redis_pw: str, file_path: str, redis_host: str = "localhost", redis_port: int = 6379
-):
+    redis_pw: str,
+    file_path: str,
+    redis_host: str = "localhost",
+    redis_port: int = 6379,
+    compression: Compression = DIAGRAM_COMPRESSION,
+    key_prefix: str = "",
+) -> IngestChanges:
     """
     save the content, as a whole, from file_path/ReactomePathwaysRelation.txt to redis
+
+    Returns:
+        the key written
     """
     data_path = pathlib.Path(file_path)
-    r = redis.Redis(
-        host=redis_host, port=redis_port, db=2, password=redis_pw
-    )  # connect to local redis
-    with open(data_path / "ReactomePathwaysRelation.txt") as fh:
+    r = get_storage_backend(redis_host, redis_port, redis_pw).client(2)
+    changes = no_changes()
+    changes[
+        "updated" if r.exists(key_prefix + "ReactomePathwaysRelation") else "added"
+    ] = 1
+    with open(data_path / "ReactomePathwaysRelation.txt", "rb") as fh:
         data = fh.read()
-        r.set("ReactomePathwaysRelation", data)
+        r.set(key_prefix + "ReactomePathwaysRelation", encode_value(data, compression))
+    return changes
 
 
-if __name__ == "__main__":
-    # run with path_to_files, filename, omics_type as args
-    omics_types = ["Ensembl", "UniProt", "ChEBI"]
-    file_names = [
-        "Ensembl2Reactome_PE_Pathway.txt",
-        "UniProt2Reactome_PE_Pathway.txt",
-        "ChEBI2Reactome_PE_Pathway.txt",
+def relation_organisms(
+    redis_pw: str,
+    redis_host: str = "localhost",
+    redis_port: int = 6379,
+    key_prefix: str = "",
+) -> Tuple[bytes, List[str]]:
+    """
+    Returns:
+        the relations stored in redis and the 3 letter abbrevs of the organisms in them
+    """
+    r = get_storage_backend(redis_host, redis_port, redis_pw).client(2)
+    relations = r.get(key_prefix + "ReactomePathwaysRelation")
+    if relations is None:
+        raise Exception("Could not find ReactomePathwaysRelation in redis")
+    relations = decode_relations(relations)  # type: ignore
+    # stable ids are of the form R-HSA-123456
+    organisms = sorted(
+        {
+            line.split(b"\t")[0].decode("utf-8").split("-")[1]
+            for line in relations.splitlines()
+            if line.strip()
+        }
+    )
+    return relations, organisms
+
+
+def populate_organism_records(
+    redis_pw: str,
+    organism: str,
+    redis_host: str = "localhost",
+    redis_port: int = 6379,
+    key_prefix: str = "",
+) -> str:
+    """
+    save the pathway records and the structure record of one organism, see populate_pathway_records
+
+    Returns:
+        hex digest of the structure and the records, part of the release fingerprint
+    """
+    r = get_storage_backend(redis_host, redis_port, redis_pw).client(2)
+    template = ReactomeHierarchyTemplate(
+        organism, redis_host, redis_port, redis_pw, key_prefix=key_prefix
+    )
+    template.build(use_records=False)
+    records = {
+        key: encode_value(entry.record_data()) for key, entry in template.items()
+    }
+    r.delete(key_prefix + PATHWAY_RECORDS_KEY.format(organism))
+    r.hset(key_prefix + PATHWAY_RECORDS_KEY.format(organism), mapping=records)
+    structure = template.to_structure_record()
+    r.set(key_prefix + HIERARCHY_STRUCTURE_KEY.format(organism), structure)
+    fingerprint = hashlib.sha1(structure)
+    # hashed as json, the binary encoding of equal records can differ between runs
+    for key in sorted(records):
+        fingerprint.update(key.encode("utf-8"))
+        fingerprint.update(template[key].to_record().encode("utf-8"))
+    return fingerprint.hexdigest()
+
+
+def file_digest(file_path: str, file_names: List[str]) -> str:
+    """
+    hash the content of the files, e.g. of the mapping files that the pathway records do not cover
+    """
+    digest = hashlib.sha1()
+    for file_name in file_names:
+        digest.update(file_name.encode("utf-8"))
+        with open(pathlib.Path(file_path) / file_name, "rb") as fh:
+            for block in iter(lambda: fh.read(DIGEST_BLOCK_SIZE), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def store_release_fingerprint(
+    redis_pw: str,
+    relations: bytes,
+    organism_digests: List[str],
+    redis_host: str = "localhost",
+    redis_port: int = 6379,
+    key_prefix: str = "",
+):
+    """
+    set the release fingerprint to a hash of the relations, the digests of all organisms
+    and input files and the value format, so data written again in another format is published
+    """
+    r = get_storage_backend(redis_host, redis_port, redis_pw).client(2)
+    fingerprint = hashlib.sha1(relations)
+    fingerprint.update(VALUE_FORMAT.encode("utf-8"))
+    for digest in organism_digests:
+        fingerprint.update(digest.encode("utf-8"))
+    r.set(key_prefix + RELEASE_FINGERPRINT_KEY, fingerprint.hexdigest())
+
+
+def populate_pathway_records(
+    redis_pw: str,
+    redis_host: str = "localhost",
+    redis_port: int = 6379,
+    key_prefix: str = "",
+):
+    """
+    derive the contained entities, names and ids of all pathways from the diagrams and relations
+    already stored in redis and save them as one record per pathway.
+    The structure of each organisms hierarchy (relations, levels, roots, topological order and
+    diagram flags) is saved as one binary record, so workers do not parse the relations.
+    Has to run after populate_redis_diagram and populate_relations.
+    Afterwards the release fingerprint is set to a hash of the relations and all records,
+    workers use it to tell if their shared hierarchy segments are still valid.
+    """
+    relations, organisms = relation_organisms(
+        redis_pw, redis_host, redis_port, key_prefix
+    )
+    organism_digests = [
+        populate_organism_records(
+            redis_pw, organism, redis_host, redis_port, key_prefix
+        )
+        for organism in organisms
+    ]
+    store_release_fingerprint(
+        redis_pw, relations, organism_digests, redis_host, redis_port, key_prefix
+    )
+
+
+def populate_kegg_chebi(
+    redis_pw: str,
+    file_path: str,
+    mapping_file_name: str = "database_accession.tsv",
+    redis_host: str = "localhost",
+    redis_port: int = 6379,
+    key_prefix: str = "",
+) -> IngestChanges:
+    """
+    save the KEGG compound to ChEBI translation from the ChEBI accession file to redis,
+    so KEGG ids of metabolomics uploads are translated without the reactome analysis service
+
+    Args:
+        file_path: path to the reactome data
+        mapping_file_name: tab separated ChEBI database accessions
+            (ID, COMPOUND_ID, SOURCE, TYPE, ACCESSION_NUMBER)
+
+    Returns:
+        the hash fields written, deleted and skipped as unchanged
+    """
+    data_path = pathlib.Path(file_path)
+    storage = get_storage_backend(redis_host, redis_port, redis_pw)
+    writer = HashDiffWriter(storage.client(0), storage.client(2), 0, key_prefix)
+    kegg_2_chebi: Dict[str, List[str]] = {}
+    with open(data_path / mapping_file_name, encoding="utf8") as fh:
+        next(fh)  # header
+        for line in fh:
+            line_split = line.rstrip("\n").split("\t")
+            if len(line_split) < 5 or line_split[3] != "KEGG COMPOUND accession":
+                continue
+            chebi_ids = kegg_2_chebi.setdefault(line_split[4], [])
+            if line_split[1] not in chebi_ids:
+                chebi_ids.append(line_split[1])
+    for kegg_id in sorted(kegg_2_chebi):
+        writer.add(KEGG_CHEBI_KEY, kegg_id, kegg_2_chebi[kegg_id])
+    writer.finish()
+    writer.remove_unwritten([KEGG_CHEBI_KEY])
+    print("stored ChEBI ids of {} KEGG compounds".format(len(kegg_2_chebi)))
+    return writer.changes
+
+
+class IngestJobReport(TypedDict):
+    """
+    A TypedDict that describes one job of ingest_reactome.
+
+    Attributes:
+        name (str): The name of the job.
+        seconds (float): The duration of the job.
+        error (str | None): The traceback of the job if it failed.
+    """
+
+    name: str
+    seconds: float
+    error: Union[str, None]
+
+
+def _run_ingest_job(
+    function: Callable[..., Any], args: Tuple[Any, ...]
+) -> Tuple[Any, float, Union[str, None]]:
+    """Runs an ingest function, in a worker process if ingest_reactome uses a pool
+
+    Returns:
+        result, duration and traceback of the failure or None
+    """
+    start_time = time.perf_counter()
+    try:
+        result = function(*args)
+    except Exception:
+        return None, time.perf_counter() - start_time, traceback.format_exc()
+    return result, time.perf_counter() - start_time, None
+
+
+def _run_ingest_jobs(
+    jobs: Iterable[IngestJob],
+    executor: Union[ProcessPoolExecutor, None],
+    reports: List[IngestJobReport],
+    max_pending: Union[int, None] = None,
+) -> List[Any]:
+    """Runs jobs on the executor, or one after another without executor
+
+    Jobs are taken from the iterable while the earlier ones run, e.g. diagrams read from the
+    archive, at most max_pending jobs are submitted and not finished at a time.
+
+    Returns:
+        the results of the jobs in order, None for failed jobs
+    """
+    names: List[str] = []
+    if executor is None:
+        outcomes = []
+        for name, function, args in jobs:
+            names.append(name)
+            outcomes.append(_run_ingest_job(function, args))
+    else:
+        futures = []
+        for name, function, args in jobs:
+            pending = [future for future in futures if not future.done()]
+            if max_pending is not None and len(pending) >= max_pending:
+                wait(pending, return_when=FIRST_COMPLETED)
+            names.append(name)
+            futures.append(executor.submit(_run_ingest_job, function, args))
+        outcomes = [future.result() for future in futures]
+    for name, (_, seconds, error) in zip(names, outcomes):
+        reports.append({"name": name, "seconds": seconds, "error": error})
+    return [result for result, _, _ in outcomes]
+
+
+def _prefixed_keys(r: redis.Redis, key_prefix: str) -> List[bytes]:
+    return list(r.scan_iter(match=key_prefix + "*", count=MIGRATION_BATCH_SIZE))
+
+
+def rename_prefixed_keys(
+    redis_pw: str,
+    key_prefix: str,
+    target_prefix: str,
+    redis_host: str = "localhost",
+    redis_port: int = 6379,
+):
+    """
+    move the keys under key_prefix to target_prefix, e.g. staged keys into their release snapshot
+    """
+    for db in INGEST_DATABASES:
+        r = get_storage_backend(redis_host, redis_port, redis_pw).client(db)
+        pipe = r.pipeline(transaction=True)
+        for key in _prefixed_keys(r, key_prefix):
+            pipe.rename(key, target_prefix.encode("utf-8") + key[len(key_prefix) :])
+        pipe.execute()
+
+
+def delete_prefixed_keys(
+    redis_pw: str,
+    key_prefix: str,
+    redis_host: str = "localhost",
+    redis_port: int = 6379,
+):
+    """
+    delete the keys under key_prefix, e.g. staged keys after a failed ingest or an old release
+    """
+    for db in INGEST_DATABASES:
+        r = get_storage_backend(redis_host, redis_port, redis_pw).client(db)
+        keys = _prefixed_keys(r, key_prefix)
+        for start in range(0, len(keys), MIGRATION_BATCH_SIZE):
+            r.delete(*keys[start : start + MIGRATION_BATCH_SIZE])
+
+
+def delete_legacy_keys(
+    redis_pw: str,
+    redis_host: str = "localhost",
+    redis_port: int = 6379,
+) -> int:
+    """
+    delete the keys of data ingested before release snapshots, stored without prefix.
+    Only the snapshots, staged ingests and the active release pointer are kept, so this must
+    not run while the legacy data is the active release.
+
+    Returns:
+        the amount of deleted keys
+    """
+    storage = get_storage_backend(redis_host, redis_port, redis_pw)
+    relation_db = storage.client(2)
+    # every legacy ingest wrote the relations, they are deleted last so an interrupted
+    # cleanup is repeated
+    if not relation_db.exists("ReactomePathwaysRelation"):
+        return 0
+    kept = tuple(
+        prefix.encode("utf-8")
+        for prefix in [
+            *list_release_prefixes(relation_db),
+            # ingest: of every staged ingest
+            INGEST_STAGING_PREFIX[: INGEST_STAGING_PREFIX.index("{")],
+        ]
+    )
+    deleted = 0
+    for db in INGEST_DATABASES:
+        r = storage.client(db)
+        keys = [
+            key
+            for key in _prefixed_keys(r, "")
+            if not key.startswith(kept)
+            and key not in (ACTIVE_RELEASE_KEY.encode(), b"ReactomePathwaysRelation")
+        ]
+        for start in range(0, len(keys), MIGRATION_BATCH_SIZE):
+            deleted += r.delete(*keys[start : start + MIGRATION_BATCH_SIZE])
+    return deleted + relation_db.delete("ReactomePathwaysRelation")
+
+
+def copy_prefixed_keys(
+    redis_pw: str,
+    key_prefix: str,
+    target_prefix: str,
+    redis_host: str = "localhost",
+    redis_port: int = 6379,
+):
+    """
+    copy the keys under key_prefix to target_prefix on the server, e.g. the active release as
+    base of a differential ingest
+    """
+    for db in INGEST_DATABASES:
+        r = get_storage_backend(redis_host, redis_port, redis_pw).client(db)
+        keys = _prefixed_keys(r, key_prefix)
+        for start in range(0, len(keys), MIGRATION_BATCH_SIZE):
+            pipe = r.pipeline(transaction=False)
+            for key in keys[start : start + MIGRATION_BATCH_SIZE]:
+                pipe.copy(
+                    key,
+                    target_prefix.encode("utf-8") + key[len(key_prefix) :],
+                    replace=True,
+                )
+            pipe.execute()
+
+
+def remove_organism_records(
+    redis_pw: str,
+    organisms: List[str],
+    redis_host: str = "localhost",
+    redis_port: int = 6379,
+    key_prefix: str = "",
+) -> int:
+    """
+    delete the pathway and structure records stored under key_prefix of organisms that are
+    not among organisms anymore
+
+    Returns:
+        the amount of deleted organisms
+    """
+    r = get_storage_backend(redis_host, redis_port, redis_pw).client(2)
+    pattern = key_prefix + PATHWAY_RECORDS_KEY.format("*")
+    removed = [
+        organism
+        for organism in (
+            key.decode("utf-8")[len(pattern) - 1 :]
+            for key in r.scan_iter(match=pattern, count=MIGRATION_BATCH_SIZE)
+        )
+        if organism not in organisms
     ]
-    populate_redis_diagram(sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4]))
-    populate_relations(sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4]))
-    for omics_type, file_name in zip(omics_types, file_names):
-        populate_redis_mapping(
-            sys.argv[1],
+    for organism in removed:
+        r.delete(
+            key_prefix + PATHWAY_RECORDS_KEY.format(organism),
+            key_prefix + HIERARCHY_STRUCTURE_KEY.format(organism),
+        )
+    return len(removed)
+
+
+def _delete_legacy_release(redis_pw: str, redis_host: str, redis_port: int):
+    deleted = delete_legacy_keys(redis_pw, redis_host, redis_port)
+    if deleted:
+        print("deleted {} keys of the data without release snapshot".format(deleted))
+
+
+def publish_release(
+    redis_pw: str,
+    staging_prefix: str,
+    release: str,
+    redis_host: str = "localhost",
+    redis_port: int = 6379,
+) -> str:
+    """
+    move the keys staged under staging_prefix into the snapshot of the release (e.g. r87:) and
+    switch the active release pointer to it. The snapshot of the previously active release is kept
+    for requests still reading it, older snapshots and data ingested before snapshots are deleted.
+    If the active release has the same fingerprint the staged keys are dropped instead, a changed
+    release with the name of the active one gets the fingerprint appended (e.g. r87-1a2b3c4d:).
+
+    Returns:
+        the key prefix of the active release
+    """
+    relation_db = get_storage_backend(redis_host, redis_port, redis_pw).client(2)
+    fingerprint = get_release_fingerprint(relation_db, staging_prefix)
+    try:
+        active = get_active_release(relation_db)
+    except Exception:  # nothing ingested yet
+        active = None
+    # data without snapshot is replaced by a snapshot of the same data, so it can be deleted
+    if active is not None and active["prefix"] and active["fingerprint"] == fingerprint:
+        delete_prefixed_keys(redis_pw, staging_prefix, redis_host, redis_port)
+        print("release {} is unchanged".format(active["prefix"]))
+        return active["prefix"]
+    release_prefix = RELEASE_KEY_PREFIX.format(release)
+    if active is not None and active["prefix"] == release_prefix:
+        release_prefix = RELEASE_KEY_PREFIX.format(
+            "{}-{}".format(release, fingerprint[:8])
+        )
+    # leftovers of an inactive snapshot with the same name
+    delete_prefixed_keys(redis_pw, release_prefix, redis_host, redis_port)
+    rename_prefixed_keys(
+        redis_pw, staging_prefix, release_prefix, redis_host, redis_port
+    )
+    previous = activate_release(relation_db, release_prefix)
+    print("activated release {} ({})".format(release_prefix, fingerprint))
+    _delete_legacy_release(redis_pw, redis_host, redis_port)
+    for prefix in list_release_prefixes(relation_db):
+        if prefix not in (release_prefix, previous):
+            delete_prefixed_keys(redis_pw, prefix, redis_host, redis_port)
+            print("deleted release {}".format(prefix))
+    return release_prefix
+
+
+def print_ingest_summary(reports: List[IngestJobReport], wall_seconds: float):
+    """Prints the duration and status of every job"""
+    width = max(len(report["name"]) for report in reports)
+    for report in reports:
+        print(
+            "{}  {:8.2f}s  {}".format(
+                report["name"].ljust(width),
+                report["seconds"],
+                "failed" if report["error"] else "ok",
+            )
+        )
+    print(
+        "{} jobs: {:.2f}s of work in {:.2f}s".format(
+            len(reports), sum(report["seconds"] for report in reports), wall_seconds
+        )
+    )
+
+
+def ingest_sources(file_path: str) -> Dict[str, List[str]]:
+    """
+    Returns:
+        the files of every source of an ingest by source name, the diagram archive or the files of
+        the extracted diagram folder and database_accession.tsv if it exists
+    """
+    data_path = pathlib.Path(file_path)
+    sources = {"ReactomePathwaysRelation.txt": ["ReactomePathwaysRelation.txt"]}
+    for file_name in MAPPING_FILES.values():
+        sources[file_name] = [file_name]
+    if (data_path / "database_accession.tsv").exists():
+        sources["database_accession.tsv"] = ["database_accession.tsv"]
+    if (data_path / DIAGRAM_ARCHIVE).exists():
+        sources[DIAGRAM_ARCHIVE] = [DIAGRAM_ARCHIVE]
+    else:
+        sources["diagram"] = [
+            str(pathlib.Path(file).relative_to(data_path))
+            for file in diagram_files(file_path)
+        ]
+    return sources
+
+
+class IngestChangeReport(TypedDict):
+    """
+    A TypedDict that describes what an ingest changed for one source.
+
+    Attributes:
+        source (str): The source file or the derived data, e.g. pathway records.
+        changes (IngestChanges | None): The keys or hash fields changed, None if skipped as unchanged.
+        seconds (float): The duration of the jobs of the source.
+    """
+
+    source: str
+    changes: Union[IngestChanges, None]
+    seconds: float
+
+
+def print_change_summary(change_reports: List[IngestChangeReport]):
+    """Prints the changes and duration of every source"""
+    width = max(len(report["source"]) for report in change_reports)
+    for report in change_reports:
+        changes = report["changes"]
+        print(
+            "{}  {:8.2f}s  {}".format(
+                report["source"].ljust(width),
+                report["seconds"],
+                (
+                    "unchanged, skipped"
+                    if changes is None
+                    else "{} added, {} updated, {} removed, {} unchanged".format(
+                        changes["added"],
+                        changes["updated"],
+                        changes["removed"],
+                        changes["unchanged"],
+                    )
+                ),
+            )
+        )
+
+
+def ingest_reactome(
+    redis_pw: str,
+    file_path: str,
+    release: str,
+    redis_host: str = "localhost",
+    redis_port: int = 6379,
+    workers: Union[int, None] = None,
+    incremental: bool = True,
+) -> List[IngestJobReport]:
+    """
+    ingest the reactome files in file_path with independent jobs on a process pool:
+    the relations, the three mapping files, the KEGG to ChEBI table (if database_accession.tsv
+    exists) and diagram files in chunks, then the pathway records of each organism.
+    The diagrams are streamed out of diagram.tgz while the workers store earlier chunks,
+    an extracted diagram folder is read if there is no archive.
+    All keys are staged under a prefix and only published as release snapshot after every job
+    succeeded (see publish_release), a failed job is reported and the staged keys are deleted,
+    the active release stays.
+
+    The ingest is differential: the digests of the source files are compared with the ones the
+    active release was ingested from. Without changed source nothing is written, otherwise the
+    active release is copied to the staging prefix on the server and only the changed sources
+    are ingested, writing the hash fields and diagram keys that differ (see
+    ingest_diff.HashDiffWriter). Pathway records are derived again for organisms whose
+    diagrams changed, for all if the relations changed. Prints the changes of every source.
+
+    Args:
+        file_path: path to the reactome data
+        release: name of the reactome release, e.g. 87
+        redis_host: host of the redis server, or sqlite:// and the path of an embedded database
+        workers: amount of worker processes, None for the cpu count, 1 to run in this process
+        incremental: False to ingest every source from scratch
+
+    Returns:
+        name, duration and error of every job
+    """
+    start_time = time.perf_counter()
+    key_prefix = INGEST_STAGING_PREFIX.format(secrets.token_hex(4))
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    storage = get_storage_backend(redis_host, redis_port, redis_pw)
+    relation_db = storage.client(2)
+    # the active release is the base of the ingest, data without snapshot is ingested again
+    base_prefix = get_active_prefix(relation_db) if incremental else ""
+    stored_digests: Dict[str, str] = (
+        {
+            name.decode("utf-8"): digest.decode("utf-8")
+            for name, digest in relation_db.hgetall(
+                base_prefix + INGEST_DIGESTS_KEY
+            ).items()
+        }
+        if base_prefix
+        else {}
+    )
+    if base_prefix and stored_digests.get(VALUE_FORMAT_FIELD) != VALUE_FORMAT:
+        # e.g. written by another python version, whose marshal format can differ
+        print(
+            "release {} is stored in value format {}, ingesting all sources in {}".format(
+                base_prefix, stored_digests.get(VALUE_FORMAT_FIELD), VALUE_FORMAT
+            )
+        )
+        base_prefix = ""
+        stored_digests = {}
+    sources = ingest_sources(file_path)
+    if "database_accession.tsv" not in sources:
+        print("database_accession.tsv not found, KEGG ids are translated online")
+
+    reports: List[IngestJobReport] = []
+    change_reports: List[IngestChangeReport] = []
+    changed: List[str] = []
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        digest_results = _run_ingest_jobs(
+            [
+                ("digest {}".format(name), file_digest, (file_path, files))
+                for name, files in sources.items()
+            ],
+            executor,
+            reports,
+        )
+        digests = dict(zip(sources, digest_results))
+        changed = [
+            name for name in sources if stored_digests.get(name) != digests[name]
+        ]
+        # sources of the active release that are gone, e.g. database_accession.tsv
+        changed += [
+            name
+            for name in stored_digests
+            if name not in sources
+            and name != VALUE_FORMAT_FIELD
+            and not name.startswith(RECORDS_DIGEST_FIELD.format(""))
+        ]
+        if changed and not any(report["error"] for report in reports):
+            change_reports = _ingest_changed_sources(
+                redis_pw,
+                file_path,
+                sources,
+                digests,
+                changed,
+                stored_digests,
+                base_prefix,
+                key_prefix,
+                redis_host,
+                redis_port,
+                executor,
+                workers,
+                reports,
+            )
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    failed = [report for report in reports if report["error"]]
+    if failed:
+        delete_prefixed_keys(redis_pw, key_prefix, redis_host, redis_port)
+    elif not changed:
+        print("no source changed since release {} was ingested".format(base_prefix))
+        # left over by publishes that kept the data without snapshot
+        _delete_legacy_release(redis_pw, redis_host, redis_port)
+    else:
+        publish_release(redis_pw, key_prefix, release, redis_host, redis_port)
+    print_ingest_summary(reports, time.perf_counter() - start_time)
+    if not failed:
+        # the digest of a source is part of its work
+        digest_seconds = {
+            source: report["seconds"] for source, report in zip(sources, reports)
+        }
+        print_change_summary(
+            [
+                {"source": source, "changes": None, "seconds": digest_seconds[source]}
+                for source in sources
+                if source not in changed
+            ]
+            + [
+                {**report, "seconds": report["seconds"] + digest_seconds.get(report["source"], 0.0)}  # type: ignore
+                for report in change_reports
+            ]
+        )
+    if failed:
+        for report in failed:
+            print("{} failed:\n{}".format(report["name"], report["error"]))
+        raise Exception(
+            "Ingest failed in {}, the active release was kept".format(
+                ", ".join(report["name"] for report in failed)
+            )
+        )
+    return reports
+
+
+def _ingest_changed_sources(
+    redis_pw: str,
+    file_path: str,
+    sources: Dict[str, List[str]],
+    digests: Dict[str, str],
+    changed: List[str],
+    stored_digests: Dict[str, str],
+    base_prefix: str,
+    key_prefix: str,
+    redis_host: str,
+    redis_port: int,
+    executor: Union[ProcessPoolExecutor, None],
+    workers: int,
+    reports: List[IngestJobReport],
+) -> List[IngestChangeReport]:
+    """
+    stage the release of ingest_reactome under key_prefix: a copy of the release under
+    base_prefix, if any, with the changed sources ingested again and the pathway records derived
+    again where needed. Failed jobs are added to reports.
+
+    Returns:
+        the changes of the changed sources and the pathway records
+    """
+    storage = get_storage_backend(redis_host, redis_port, redis_pw)
+    if base_prefix:
+        _run_ingest_jobs(
+            [
+                (
+                    "copy release {}".format(base_prefix),
+                    copy_prefixed_keys,
+                    (redis_pw, base_prefix, key_prefix, redis_host, redis_port),
+                )
+            ],
+            None,
+            reports,
+        )
+    jobs: List[IngestJob] = []
+    job_sources: List[str] = []
+    if "ReactomePathwaysRelation.txt" in changed:
+        jobs.append(
+            (
+                "relations",
+                populate_relations,
+                (
+                    redis_pw,
+                    file_path,
+                    redis_host,
+                    redis_port,
+                    DIAGRAM_COMPRESSION,
+                    key_prefix,
+                ),
+            )
+        )
+        job_sources.append("ReactomePathwaysRelation.txt")
+    for omics_type, file_name in MAPPING_FILES.items():
+        if file_name in changed:
+            jobs.append(
+                (
+                    file_name,
+                    populate_redis_mapping,
+                    (
+                        redis_pw,
+                        file_path,
+                        file_name,
+                        omics_type,
+                        redis_host,
+                        redis_port,
+                        INGEST_BATCH_SIZE,
+                        INGEST_RUN_SIZE,
+                        key_prefix,
+                    ),
+                )
+            )
+            job_sources.append(file_name)
+    if "database_accession.tsv" in changed:
+        if "database_accession.tsv" in sources:
+            jobs.append(
+                (
+                    "database_accession.tsv",
+                    populate_kegg_chebi,
+                    (
+                        redis_pw,
+                        file_path,
+                        "database_accession.tsv",
+                        redis_host,
+                        redis_port,
+                        key_prefix,
+                    ),
+                )
+            )
+            job_sources.append("database_accession.tsv")
+        else:
+            writer = HashDiffWriter(storage.client(0), storage.client(2), 0, key_prefix)
+            writer.remove_unwritten([KEGG_CHEBI_KEY])
+    diagram_source = DIAGRAM_ARCHIVE if DIAGRAM_ARCHIVE in sources else "diagram"
+    diagrams_changed = diagram_source in changed
+    if any(report["error"] for report in reports):
+        return []
+
+    try:
+        # the long mapping jobs start first, the diagram jobs follow as the archive is read
+        results = _run_ingest_jobs(
+            itertools.chain(
+                jobs,
+                (
+                    diagram_jobs(
+                        redis_pw,
+                        file_path,
+                        redis_host,
+                        redis_port,
+                        DIAGRAM_COMPRESSION,
+                        key_prefix,
+                    )
+                    if diagrams_changed
+                    else []
+                ),
+            ),
+            executor,
+            reports,
+            len(jobs) + workers * DIAGRAM_JOBS_PER_WORKER,
+        )
+    except (OSError, tarfile.TarError):
+        # an unreadable archive fails the ingest like a failed job
+        reports.append(
+            {"name": DIAGRAM_ARCHIVE, "seconds": 0.0, "error": traceback.format_exc()}
+        )
+        return []
+    if any(report["error"] for report in reports):
+        return []
+    job_reports = reports[len(reports) - len(results) :]
+    change_reports: List[IngestChangeReport] = [
+        {
+            "source": source,
+            "changes": result["changes"] if "changes" in result else result,
+            "seconds": report["seconds"],
+        }
+        for source, result, report in zip(job_sources, results, job_reports)
+    ]
+
+    written_diagrams: List[str] = []
+    if diagrams_changed:
+        diagram_changes = no_changes()
+        names: List[str] = []
+        for result in results[len(jobs) :]:
+            add_changes(diagram_changes, result["changes"])
+            names += result["names"]
+            written_diagrams += result["written"]
+        removed = remove_missing_diagrams(
+            redis_pw, names, redis_host, redis_port, key_prefix
+        )
+        diagram_changes["removed"] += len(removed)
+        written_diagrams += removed
+        store_diagram_ids(
+            redis_pw, graph_diagram_ids(names), redis_host, redis_port, key_prefix
+        )
+        change_reports.append(
+            {
+                "source": diagram_source,
+                "changes": diagram_changes,
+                "seconds": sum(
+                    report["seconds"] for report in job_reports[len(jobs) :]
+                ),
+            }
+        )
+
+    # the records are derived from the staged diagrams and relations
+    relations, organisms = relation_organisms(
+        redis_pw, redis_host, redis_port, key_prefix
+    )
+    if not base_prefix or "ReactomePathwaysRelation.txt" in changed:
+        affected = set(organisms)
+    else:
+        # stable ids are of the form R-HSA-123456
+        affected = {
+            name.split("-")[1] for name in written_diagrams if name.count("-") >= 2
+        }
+    record_digests = {
+        organism: stored_digests.get(RECORDS_DIGEST_FIELD.format(organism))
+        for organism in organisms
+    }
+    rebuilt = [
+        organism
+        for organism in organisms
+        if organism in affected or record_digests[organism] is None
+    ]
+    record_results = _run_ingest_jobs(
+        [
+            (
+                "pathway records {}".format(organism),
+                populate_organism_records,
+                (redis_pw, organism, redis_host, redis_port, key_prefix),
+            )
+            for organism in rebuilt
+        ],
+        executor,
+        reports,
+    )
+    if any(report["error"] for report in reports):
+        return []
+    record_digests.update(zip(rebuilt, record_results))
+    record_changes = no_changes()
+    for organism in rebuilt:
+        record_changes[
+            (
+                "added"
+                if stored_digests.get(RECORDS_DIGEST_FIELD.format(organism)) is None
+                else "updated"
+            )
+        ] += 1
+    record_changes["unchanged"] = len(organisms) - len(rebuilt)
+    record_changes["removed"] = remove_organism_records(
+        redis_pw, organisms, redis_host, redis_port, key_prefix
+    )
+    change_reports.append(
+        {
+            "source": "pathway records",
+            "changes": record_changes,
+            "seconds": (
+                sum(report["seconds"] for report in reports[-len(rebuilt) :])
+                if rebuilt
+                else 0.0
+            ),
+        }
+    )
+
+    relation_db = storage.client(2)
+    relation_db.delete(key_prefix + INGEST_DIGESTS_KEY)
+    relation_db.hset(
+        key_prefix + INGEST_DIGESTS_KEY,
+        mapping={
+            VALUE_FORMAT_FIELD: VALUE_FORMAT,
+            **digests,
+            **{
+                RECORDS_DIGEST_FIELD.format(organism): digest
+                for organism, digest in record_digests.items()
+            },
+        },
+    )
+    store_release_fingerprint(
+        redis_pw,
+        relations,
+        [record_digests[organism] for organism in organisms]  # type: ignore
+        + [
+            digests[file_name]
+            for file_name in [*MAPPING_FILES.values(), "database_accession.tsv"]
+            if file_name in digests
+        ],
+        redis_host,
+        redis_port,
+        key_prefix,
+    )
+    return change_reports
+
+
+def _migrate_values(
+    r: redis.Redis,
+    values: Dict[Tuple[str, str], bytes],
+    encode: Callable[[bytes], bytes],
+) -> int:
+    """Rewrites legacy values of (key, hash field) pairs, an empty field for string keys
+
+    Returns:
+        the size of the rewritten values in bytes
+    """
+    pipe = r.pipeline(transaction=False)
+    size = 0
+    for (key, field), value in values.items():
+        encoded = encode(value)
+        size += len(encoded)
+        if field:
+            pipe.hset(key, field, encoded)
+        else:
+            pipe.set(key, encoded)
+    pipe.execute()
+    return size
+
+
+def migrate_redis_values(
+    redis_pw: str,
+    redis_host: str = "localhost",
+    redis_port: int = 6379,
+    compression: Compression = DIAGRAM_COMPRESSION,
+    key_prefix: Union[str, None] = None,
+):
+    """
+    rewrite the json values of existing mapping, diagram and relation databases in the binary
+    value format, without ingesting the reactome files again.
+    Values that are already encoded are skipped, so the migration can be repeated.
+    Prints the amount of rewritten values and their size before and after per database.
+
+    Args:
+        key_prefix: prefix of the migrated release snapshot, e.g. r87:, None for the active
+            release, empty for data ingested before release snapshots
+    """
+    storage = get_storage_backend(redis_host, redis_port, redis_pw)
+    if key_prefix is None:
+        key_prefix = get_active_prefix(storage.client(2))
+    # (database, key pattern, encoder of the legacy values)
+    migrations: List[Tuple[int, str, Callable[[bytes], bytes]]] = [
+        (
+            0,
+            key_prefix + "*:*",
+            lambda value: encode_value(load_json_mapping_record(value)),
+        ),
+        (1, key_prefix + "*", lambda value: encode_json(value, compression)),
+        (
+            2,
+            key_prefix + "ReactomePathwaysRelation",
+            lambda value: encode_value(value, compression),
+        ),
+        (
+            2,
+            key_prefix + PATHWAY_RECORDS_KEY.format("*"),
+            lambda value: encode_value(json.loads(value)),
+        ),
+    ]
+    for db, pattern, encode in migrations:
+        r = storage.client(db)
+        amount = 0
+        migrated = 0
+        size_before = 0
+        size_after = 0
+        legacy: Dict[Tuple[str, str], bytes] = {}
+        for key in r.scan_iter(match=pattern, count=MIGRATION_BATCH_SIZE):
+            key = key.decode("utf-8")
+            key_type = r.type(key)
+            if key_type == b"hash":
+                items = r.hscan_iter(key, count=MIGRATION_BATCH_SIZE)
+            elif key_type == b"string":
+                items = [("", r.get(key))]
+            else:
+                # e.g. the set of diagram ids
+                continue
+            for field, value in items:
+                amount += 1
+                if is_encoded(value):  # type: ignore
+                    continue
+                field = field.decode("utf-8") if isinstance(field, bytes) else field
+                legacy[(key, field)] = value  # type: ignore
+                migrated += 1
+                size_before += len(value)  # type: ignore
+                if len(legacy) >= MIGRATION_BATCH_SIZE:
+                    size_after += _migrate_values(r, legacy, encode)
+                    legacy = {}
+        size_after += _migrate_values(r, legacy, encode)
+        print(
+            "db {} {}: migrated {} of {} values, {} -> {} bytes".format(
+                db, pattern, migrated, amount, size_before, size_after
+            )
+        )
+
+
+if __name__ == "__main__":
+    if sys.argv[1] == "migrate":
+        # run with migrate, redis_pw, redis_host, redis_port and optionally the key prefix of the
+        # release (the active one by default, "" for data without release snapshots) as args
+        migrate_redis_values(
             sys.argv[2],
-            file_name,
-            omics_type,
             sys.argv[3],
             int(sys.argv[4]),
+            key_prefix=sys.argv[5] if len(sys.argv) > 5 else None,
         )
+        sys.exit()
+    # run with redis_pw, path_to_files, redis_host, redis_port, release and optionally the
+    # worker count as args
+    ingest_reactome(
+        sys.argv[1],
+        sys.argv[2],
+        sys.argv[5],
+        sys.argv[3],
+        int(sys.argv[4]),
+        int(sys.argv[6]) if len(sys.argv) > 6 else None,
+    )
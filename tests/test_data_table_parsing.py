@@ -0,0 +1,66 @@
+import io
+import json
+
+import pandas as pd
+import pytest
+
+from visMOP.python_scripts.data_table_parsing import create_df, detect_table_format
+
+TABLE = pd.DataFrame(
+    {
+        "Gene": ["ENSG01", "ENSG02", "ENSG03"],
+        "Symbol": ["A1", None, "C3"],
+        "FC 1h": [0.5, -1.25, 2.5],
+        "FC 2h": [1.5, None, -0.75],
+    }
+)
+
+
+def table_files():
+    xlsx = io.BytesIO()
+    TABLE.to_excel(xlsx, index=False, sheet_name="Sheet1")
+    parquet = io.BytesIO()
+    TABLE.to_parquet(parquet)
+    return {
+        "table.xlsx": xlsx.getvalue(),
+        "table.csv": TABLE.to_csv(index=False).encode("utf-8"),
+        "table.tsv": TABLE.to_csv(index=False, sep="\t").encode("utf-8"),
+        "table.parquet": parquet.getvalue(),
+    }
+
+
+def test_formats_are_detected():
+    formats = {
+        name: detect_table_format(data, name) for name, data in table_files().items()
+    }
+    assert formats == {
+        "table.xlsx": "xlsx",
+        "table.csv": "csv",
+        "table.tsv": "tsv",
+        "table.parquet": "parquet",
+    }
+    assert detect_table_format(b"Gene\tFC\nENSG01\t1.5\n", "upload.txt") == "tsv"
+
+
+def test_uploads_give_the_excel_frame():
+    pytest.importorskip("pyarrow")
+    frames = {
+        name: create_df(data, "Sheet1", detect_table_format(data, name))
+        for name, data in table_files().items()
+    }
+    assert all(state == 0 for state, _ in frames.values())
+    excel = frames["table.xlsx"][1]
+    assert list(excel.columns[-3:]) == [
+        "_reserved_sort_id",
+        "_reserved_available",
+        "_reserved_inSelected",
+    ]
+    for _, frame in frames.values():
+        assert list(frame.columns) == list(excel.columns)
+        assert json.loads(frame.to_json(orient="columns")) == json.loads(
+            excel.to_json(orient="columns")
+        )
+
+
+def test_broken_uploads_are_rejected():
+    assert create_df(b"PAR1 not a parquet file", "", "parquet")[0] == 1
@@ -0,0 +1,40 @@
+import io
+import json
+import tarfile
+import zlib
+
+from reactome_redis import populate_redis_diagram
+from visMOP.python_scripts.redis_bulk_loader import DIAGRAM_ID_SET
+from visMOP.python_scripts.storage_backend import (
+    EMBEDDED_SCHEME,
+    get_storage_backend,
+)
+from visMOP.python_scripts.value_codec import VALUE_MAGIC, decode_value
+
+
+def test_diagrams_are_read_from_the_archive(tmp_path):
+    diagrams = {
+        "R-HSA-1.json": {"nodes": [{"id": 1, "displayName": "Protein [cytosol]"}]},
+        "R-HSA-1.graph.json": {"nodes": [], "subpathways": []},
+        "R-HSA-2.json": {"nodes": []},
+    }
+    with tarfile.open(tmp_path / "diagram.tgz", "w:gz") as tar:
+        for name, data in diagrams.items():
+            content = json.dumps(data).encode("utf-8")
+            member = tarfile.TarInfo("diagram/" + name)
+            member.size = len(content)
+            tar.addfile(member, io.BytesIO(content))
+    host = EMBEDDED_SCHEME + str(tmp_path / "db.sqlite")
+    populate_redis_diagram("", str(tmp_path), host, 0, "zlib")
+
+    r = get_storage_backend(host, 0, "").client(1)
+    for name, data in diagrams.items():
+        value = r.get(name[: -len(".json")])
+        assert decode_value(value) == data
+        # the file content is stored as it is
+        assert zlib.decompress(value[len(VALUE_MAGIC) + 3 :]) == json.dumps(
+            data
+        ).encode("utf-8")
+    assert r.smembers(DIAGRAM_ID_SET) == {b"R-HSA-1"}
+    # nothing was extracted next to the archive
+    assert not (tmp_path / "diagram").exists()
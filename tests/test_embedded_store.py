@@ -0,0 +1,48 @@
+import pickle
+
+from visMOP.python_scripts.storage_backend import (
+    EMBEDDED_SCHEME,
+    get_storage_backend,
+)
+
+
+def test_commands(tmp_path):
+    backend = get_storage_backend(EMBEDDED_SCHEME + str(tmp_path / "db.sqlite"), 0, "")
+    mapping, relations = backend.client(0), backend.client(2)
+    mapping.hset("UniProt:Homo_sapiens", mapping={"P1": b"\x00record", "P2": "text"})
+    relations.set("ReactomePathwaysRelation", b"relations")
+    assert mapping.hmget("UniProt:Homo_sapiens", ["P2", "P3", "P1"]) == [
+        b"text",
+        None,
+        b"\x00record",
+    ]
+    # databases are separated
+    assert mapping.get("ReactomePathwaysRelation") is None
+    assert relations.getset("ReactomePathwaysRelation", "new") == b"relations"
+    relations.sadd("DiagramIds", "R-HSA-1", "R-HSA-2", "R-HSA-1")
+    assert relations.smembers("DiagramIds") == {b"R-HSA-1", b"R-HSA-2"}
+    assert (relations.type("DiagramIds"), relations.type("Missing")) == (
+        b"set",
+        b"none",
+    )
+    assert pickle.loads(pickle.dumps(backend)) is backend
+
+
+def test_pipeline_rename_and_scan(tmp_path):
+    backend = get_storage_backend(EMBEDDED_SCHEME + str(tmp_path / "db.sqlite"), 0, "")
+    r = backend.client(1)
+    pipe = r.pipeline(transaction=False)
+    for num in range(3):
+        pipe.set("ingest:ab:R-HSA-{}".format(num), num)
+    pipe.sadd("ingest:ab:DiagramIds", "R-HSA-0")
+    pipe.execute()
+    for key in list(r.scan_iter(match="ingest:ab:*")):
+        r.rename(key, key.replace(b"ingest:ab:", b"r87:"))
+    assert sorted(r.scan_iter(match="r87:R-HSA-?")) == [
+        b"r87:R-HSA-0",
+        b"r87:R-HSA-1",
+        b"r87:R-HSA-2",
+    ]
+    assert r.mget(["r87:R-HSA-1", "ingest:ab:R-HSA-1"]) == [b"1", None]
+    assert r.delete("r87:R-HSA-0", "r87:DiagramIds", "missing") == 2
+    assert r.exists("r87:R-HSA-0", "r87:R-HSA-1") == 1
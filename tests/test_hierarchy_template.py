@@ -0,0 +1,328 @@
+import json
+import pickle
+import sys
+import pytest
+
+from visMOP.python_scripts import hierarchy_store, reactome_hierarchy
+from visMOP.python_scripts.reactome_hierarchy import (
+    ReactomeHierarchy,
+    ReactomeHierarchyTemplate,
+    ReactomePathwayTemplate,
+)
+
+# small organism hierarchy:
+#   R-HSA-1 -> R-HSA-2 -> R-HSA-4
+#   R-HSA-1 -> R-HSA-3 -> R-HSA-4
+#   R-HSA-3 -> R-HSA-5
+RELATIONS = [
+    ("R-HSA-1", "R-HSA-2"),
+    ("R-HSA-1", "R-HSA-3"),
+    ("R-HSA-2", "R-HSA-4"),
+    ("R-HSA-3", "R-HSA-4"),
+    ("R-HSA-3", "R-HSA-5"),
+]
+DIAGRAMS = ["R-HSA-1", "R-HSA-2", "R-HSA-3"]
+
+
+def build_template() -> ReactomeHierarchyTemplate:
+    """Builds a hierarchy template without redis from the relations above"""
+    template = ReactomeHierarchyTemplate("HSA")
+    for parent, child in RELATIONS:
+        for pathway_id in (parent, child):
+            if pathway_id not in template:
+                template[pathway_id] = ReactomePathwayTemplate(
+                    pathway_id, pathway_id in DIAGRAMS
+                )
+        template[parent].children += (child,)
+        template[child].parents += (parent,)
+    for v in template.values():
+        v.assert_leaf_root_state()
+    template.add_hierarchy_levels()
+    for num, (pathway_id, entry) in enumerate(template.items()):
+        entry.name = "Pathway " + pathway_id
+        entry.db_Id = num
+        entry.is_overview = pathway_id == "R-HSA-1"
+        entry.diagram_entry = template["R-HSA-3" if num > 2 else pathway_id]
+    template["R-HSA-4"].total_proteins = {
+        "R-HSA-E1": {11: {"internalID": 11, "stableID": "R-HSA-E1"}},
+        "R-HSA-E2": {12: {"internalID": 12, "stableID": "R-HSA-E2"}},
+    }
+    template["R-HSA-5"].total_metabolites = {
+        "R-HSA-M1": {13: {"internalID": 13, "stableID": "R-HSA-M1"}},
+    }
+    template.add_subtree_index()
+    return template
+
+
+@pytest.fixture(scope="module")
+def template():
+    yield build_template()
+
+
+def new_hierarchy(template: ReactomeHierarchyTemplate) -> ReactomeHierarchy:
+    return ReactomeHierarchy(
+        template,
+        {
+            "amt_timesteps": 1,
+            "omics_recieved": [True, True, True],
+            "target_organism": "HSA",
+        },
+    )
+
+
+def add_protein(hierarchy: ReactomeHierarchy, query_key: str, entity: str) -> None:
+    hierarchy.add_query_data(
+        {
+            "reactome_id": entity,
+            "name": entity + " [cytosol]",
+            "pathways": [("R-HSA-4", "Pathway R-HSA-4")],
+            "measurement": [1.5],
+        },
+        "protein",
+        query_key,
+        "fc",
+    )
+
+
+class TestHierarchyOverlay:
+    def test_static_data_is_shared(self, template):
+        """Overlays read static attributes from the template entries"""
+        hierarchy = new_hierarchy(template)
+        assert hierarchy["R-HSA-4"].template is template["R-HSA-4"]
+        assert hierarchy["R-HSA-4"].parents == ("R-HSA-2", "R-HSA-3")
+        assert hierarchy["R-HSA-4"].total_proteins is template["R-HSA-4"].total_proteins
+        assert hierarchy.levels is template.levels
+
+    def test_diagram_entry_points_to_overlay(self, template):
+        """diagram entries have to resolve to the overlay of the same request"""
+        hierarchy = new_hierarchy(template)
+        assert hierarchy["R-HSA-5"].diagram_entry is hierarchy["R-HSA-3"]
+
+    def test_requests_do_not_leak(self, template):
+        """Query data of one request is neither visible in the template nor in other requests"""
+        first = new_hierarchy(template)
+        second = new_hierarchy(template)
+        add_protein(first, "P1", "R-HSA-E1")
+        first.aggregate_pathways()
+        second.aggregate_pathways()
+
+        assert list(first["R-HSA-1"].total_measured_proteins) == ["P1"]
+        assert first["R-HSA-1"].has_data
+        assert second["R-HSA-1"].total_measured_proteins == {}
+        assert not second["R-HSA-1"].has_data
+        assert not hasattr(template["R-HSA-1"], "total_measured_proteins")
+        # aggregated totals are stored on the overlay only
+        assert set(first["R-HSA-1"].total_proteins) == {"R-HSA-E1", "R-HSA-E2"}
+        assert template["R-HSA-1"].total_proteins == {}
+
+
+class TestPathwayRecords:
+    def test_record_round_trip(self, template):
+        """Records written during ingest restore the diagram derived data"""
+        entry = template["R-HSA-4"]
+        restored = ReactomePathwayTemplate("R-HSA-4", False)
+        restored.apply_record(json.loads(entry.to_record()))
+        assert restored.name == entry.name
+        assert restored.db_Id == entry.db_Id
+        assert restored.is_overview == entry.is_overview
+        assert restored.total_proteins == entry.total_proteins
+        assert restored.total_metabolites == entry.total_metabolites
+        assert restored.maplinks == entry.maplinks
+
+
+class TestStructureRecord:
+    def test_structure_round_trip(self, template):
+        """Templates created from a structure record match templates built from the relations"""
+        restored = ReactomeHierarchyTemplate("HSA")
+        assert restored.apply_structure_record(template.to_structure_record())
+        assert list(restored) == list(template)
+        assert restored.levels == template.levels
+        assert restored.topological_order == template.topological_order
+        for pathway_id, entry in template.items():
+            assert restored[pathway_id].asdict() == entry.asdict()
+            assert restored[pathway_id].has_diagram == entry.has_diagram
+
+    def test_other_version_is_ignored(self, template, monkeypatch):
+        record = template.to_structure_record()
+        monkeypatch.setattr(reactome_hierarchy, "HIERARCHY_STRUCTURE_VERSION", 2)
+        restored = ReactomeHierarchyTemplate("HSA")
+        assert not restored.apply_structure_record(record)
+        assert len(restored) == 0
+
+
+class TestHierarchyLevels:
+    def test_levels_are_shortest_distance_to_root(self, template):
+        """Pathways reachable over several parents get the level of the shortest path"""
+        assert template["R-HSA-1"].level == 0
+        assert template["R-HSA-4"].level == 2
+        assert template["R-HSA-5"].level == 2
+        assert template.levels == {
+            0: ["R-HSA-1"],
+            1: ["R-HSA-2", "R-HSA-3"],
+            2: ["R-HSA-4", "R-HSA-5"],
+        }
+
+    def test_closest_root_with_smallest_id(self):
+        """If several roots are equally close, the smallest root id is chosen"""
+        template = ReactomeHierarchyTemplate("HSA")
+        for pathway_id in ("R-HSA-9", "R-HSA-8", "R-HSA-7", "R-HSA-6"):
+            template[pathway_id] = ReactomePathwayTemplate(pathway_id, False)
+        # R-HSA-6 is one level below R-HSA-9 and R-HSA-8, two levels below R-HSA-7
+        for parent, child in [
+            ("R-HSA-9", "R-HSA-6"),
+            ("R-HSA-7", "R-HSA-8"),
+            ("R-HSA-8", "R-HSA-6"),
+        ]:
+            template[parent].children += (child,)
+            template[child].parents += (parent,)
+        for v in template.values():
+            v.assert_leaf_root_state()
+        template.add_hierarchy_levels()
+        assert template["R-HSA-6"].level == 1
+        assert template["R-HSA-6"].root_id == "R-HSA-9"
+        assert template["R-HSA-8"].root_id == "R-HSA-7"
+        assert template.topological_order.index(
+            "R-HSA-8"
+        ) < template.topological_order.index("R-HSA-6")
+
+    def test_cycle_is_rejected(self):
+        template = build_template()
+        template["R-HSA-5"].children += ("R-HSA-3",)
+        template["R-HSA-3"].parents += ("R-HSA-5",)
+        with pytest.raises(ValueError, match="R-HSA-3, R-HSA-4, R-HSA-5"):
+            template.add_hierarchy_levels()
+
+
+class TestSubtreeIndex:
+    def test_subtree_contains_shared_descendants_once(self, template):
+        assert template.get_subtree_target("R-HSA-1") == [
+            "R-HSA-4",
+            "R-HSA-2",
+            "R-HSA-5",
+            "R-HSA-3",
+            "R-HSA-1",
+        ]
+        assert template.get_subtree_target("R-HSA-3") == [
+            "R-HSA-4",
+            "R-HSA-5",
+            "R-HSA-3",
+        ]
+        assert template.get_subtree_target("R-HSA-4") == ["R-HSA-4"]
+        assert template.get_subtree_target("R-HSA-X") == []
+
+    def test_leaves_and_non_overview(self, template):
+        assert template.get_subtree_leaves("R-HSA-1") == ["R-HSA-4", "R-HSA-5"]
+        assert template.get_subtree_leaves("R-HSA-5") == ["R-HSA-5"]
+        # R-HSA-1 is the only overview pathway, the search stops below it
+        assert template.get_subtree_non_overview("R-HSA-1") == ["R-HSA-2", "R-HSA-3"]
+        assert template.get_subtree_non_overview("R-HSA-3") == ["R-HSA-3"]
+
+    def test_subtree_ids_are_shared(self, template):
+        """Aggregation does not rebuild the subtrees per request"""
+        hierarchy = new_hierarchy(template)
+        hierarchy.aggregate_pathways()
+        assert hierarchy["R-HSA-1"].subtree_ids is template["R-HSA-1"].subtree_ids
+
+
+class TestSessionPickling:
+    @pytest.fixture
+    def store(self, template, monkeypatch):
+        """Serves the test template as the template of the current release"""
+        template.fingerprint = "release"
+        monkeypatch.setattr(
+            hierarchy_store, "get_hierarchy_template", lambda *args: template
+        )
+        yield template
+        template.fingerprint = ""
+
+    @pytest.mark.parametrize("engine", ["dict", "sparse"])
+    def test_round_trip(self, store, engine):
+        hierarchy = new_hierarchy(store)
+        add_protein(hierarchy, "P1", "R-HSA-E1")
+        hierarchy.aggregate_pathways(engine)
+        restored = pickle.loads(pickle.dumps(hierarchy))
+
+        assert restored.template is store
+        assert restored.amt_timesteps == hierarchy.amt_timesteps
+        assert restored["R-HSA-5"].diagram_entry is restored["R-HSA-3"]
+        for pathway_id, entry in hierarchy.items():
+            assert restored[pathway_id].has_data == entry.has_data
+            assert restored[pathway_id].name == entry.name
+            assert restored[pathway_id].total_proteins == entry.total_proteins
+            assert (
+                restored[pathway_id].total_measured_proteins
+                == entry.total_measured_proteins
+            )
+            assert (
+                restored[pathway_id].subdiagrams_measured_proteins
+                == entry.subdiagrams_measured_proteins
+            )
+
+    def test_template_is_not_pickled(self, store):
+        """Only measured entities end up in the pickle, the sparse totals are read from the template"""
+        hierarchy = new_hierarchy(store)
+        add_protein(hierarchy, "P1", "R-HSA-E1")
+        hierarchy.aggregate_pathways("sparse")
+        assert b"R-HSA-M1" not in pickle.dumps(hierarchy)
+
+    def test_other_release_is_rejected(self, store):
+        data = pickle.dumps(new_hierarchy(store))
+        store.fingerprint = "next release"
+        with pytest.raises(ValueError, match="different reactome data"):
+            pickle.loads(data)
+
+
+def deep_sizeof(obj, seen: set) -> int:
+    """Size of an object and everything it references, skipping objects in seen"""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deep_sizeof(v, seen) for v in obj)
+    for cls in type(obj).__mro__:
+        for slot in getattr(cls, "__slots__", ()):
+            # read the slots directly, getattr would allocate the lazy containers
+            try:
+                size += deep_sizeof(object.__getattribute__(obj, slot), seen)
+            except AttributeError:
+                pass
+    return size
+
+
+class TestMemory:
+    def test_memory_report(self, template, record_property):
+        """Reports the bytes per pathway of the template and of a request hierarchy"""
+        template_bytes = deep_sizeof(template, set())
+        # the overlays reference the shared template, count only the per request part
+        hierarchy = new_hierarchy(template)
+        hierarchy_bytes = deep_sizeof(
+            hierarchy, {id(template)} | {id(v) for v in template.values()}
+        )
+        add_protein(hierarchy, "P1", "R-HSA-E1")
+        hierarchy.aggregate_pathways()
+        aggregated_bytes = deep_sizeof(
+            hierarchy, {id(template)} | {id(v) for v in template.values()}
+        )
+        report = {
+            "template_bytes_per_pathway": template_bytes / len(template),
+            "hierarchy_bytes_per_pathway": hierarchy_bytes / len(hierarchy),
+            "aggregated_hierarchy_bytes_per_pathway": aggregated_bytes / len(hierarchy),
+            "hierarchy_bytes": hierarchy_bytes,
+        }
+        for name, value in report.items():
+            record_property(name, value)
+            print("{}: {:.0f}".format(name, value))
+        assert report["hierarchy_bytes_per_pathway"] < 400
+
+    def test_overlays_are_compact(self, template):
+        hierarchy = new_hierarchy(template)
+        entry = hierarchy["R-HSA-4"]
+        assert not hasattr(entry, "__dict__")
+        # containers are allocated on first access only
+        with pytest.raises(AttributeError):
+            object.__getattribute__(entry, "total_measured_proteins")
+        assert entry.total_measured_proteins == {}
+        assert object.__getattribute__(entry, "total_measured_proteins") == {}
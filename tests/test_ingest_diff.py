@@ -0,0 +1,52 @@
+from visMOP.python_scripts.ingest_diff import HashDiffWriter
+from visMOP.python_scripts.storage_backend import (
+    EMBEDDED_SCHEME,
+    get_storage_backend,
+)
+from visMOP.python_scripts.value_codec import decode_value
+
+
+def write_hashes(storage, hashes):
+    writer = HashDiffWriter(storage.client(0), storage.client(2), 0, "r1:", 50)
+    for name in sorted(hashes):
+        for field in sorted(hashes[name]):
+            writer.add(name, field, hashes[name][field])
+    writer.finish()
+    writer.remove_unwritten(["UniProt:*"])
+    return writer.changes
+
+
+def stored_hashes(storage):
+    r = storage.client(0)
+    return {
+        key.decode("utf-8")[len("r1:") :]: {
+            field.decode("utf-8"): decode_value(value)
+            for field, value in r.hgetall(key).items()
+        }
+        for key in r.scan_iter(match="r1:*")
+    }
+
+
+def test_only_changed_fields_are_written(tmp_path):
+    storage = get_storage_backend(EMBEDDED_SCHEME + str(tmp_path / "db.sqlite"), 0, "")
+    hashes = {
+        "UniProt:Homo_sapiens": {"P{:05}".format(i): [i, "a"] for i in range(2000)},
+        "UniProt:Mus_musculus": {"Q{:05}".format(i): [i] for i in range(10)},
+    }
+    assert write_hashes(storage, hashes)["added"] == 2010
+    assert stored_hashes(storage) == hashes
+
+    human = hashes["UniProt:Homo_sapiens"]
+    human["P00500"] = [500, "b"]
+    del human["P01500"]
+    human["P01500a"] = [1500]
+    del hashes["UniProt:Mus_musculus"]
+    changes = write_hashes(storage, hashes)
+    assert stored_hashes(storage) == hashes
+    assert changes["removed"] == 11
+    assert changes["added"] == 1
+    # only the buckets around the changed fields are written again
+    assert changes["unchanged"] > 1500
+    assert changes["added"] + changes["updated"] + changes["unchanged"] == 2000
+
+    assert write_hashes(storage, hashes)["unchanged"] == 2000
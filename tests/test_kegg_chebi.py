@@ -0,0 +1,58 @@
+import pytest
+
+from visMOP.python_scripts import redis_pool, utils
+from visMOP.python_scripts.utils import KEGG_CHEBI_KEY, kegg_to_chebi
+from visMOP.python_scripts.value_codec import encode_value
+
+TABLE = {
+    "C00031": encode_value(["4167", "17634"]),
+    "C00002": encode_value(["15422"]),
+}
+
+
+class TableClient:
+    """Answers lookups of the KEGG to ChEBI table and records the HMGET requests"""
+
+    table = TABLE
+    requests = []
+
+    def __init__(self, **kwargs):
+        pass
+
+    def get(self, name):
+        # data without release snapshots
+        assert name == "ActiveRelease"
+        return None
+
+    def exists(self, name):
+        return int(name == KEGG_CHEBI_KEY and bool(TableClient.table))
+
+    def hmget(self, name, fields):
+        TableClient.requests.append(list(fields))
+        return [TableClient.table.get(field) for field in fields]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    TableClient.table = TABLE
+    TableClient.requests = []
+    monkeypatch.setattr(redis_pool.redis, "Redis", TableClient)
+    # the reactome service is not called in tests
+    monkeypatch.setattr(utils, "analysis", object())
+    monkeypatch.setattr(
+        utils, "kegg_to_chebi_online", lambda ids: {"online": list(ids)}
+    )
+    yield TableClient
+
+
+def test_offline_translation(client):
+    chebi_ids = kegg_to_chebi(["C00031", "C99999", "C00002", "C00031"], "", 0, "")
+    assert chebi_ids == {"C00031": ["4167", "17634"], "C00002": ["15422"]}
+    assert client.requests == [["C00031", "C99999", "C00002"]]
+
+
+def test_live_fallback(client):
+    client.table = {}
+    assert kegg_to_chebi(["C00031"], "", 0, "") == {"online": ["C00031"]}
+    with pytest.raises(Exception):
+        kegg_to_chebi(["C00031"], "", 0, "", live_fallback=False)
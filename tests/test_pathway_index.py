@@ -0,0 +1,26 @@
+from visMOP.python_scripts.pathway_index import get_pathway_coverage
+from visMOP.python_scripts.value_codec import encode_value
+
+INDEX = {
+    "R-HSA-1": encode_value(
+        [("P1", "R-HSA-E1"), ("P1", "R-HSA-E2"), ("P2", "R-HSA-E3")]
+    ),
+}
+
+
+class IndexClient:
+    """Answers HMGET requests from the reverse index of UniProt ids"""
+
+    def hmget(self, name, fields):
+        assert name == "PathwayEntities:UniProt:Homo_sapiens"
+        return [INDEX.get(field) for field in fields]
+
+
+def test_pathway_coverage():
+    coverage = get_pathway_coverage(
+        IndexClient(), "UniProt", "Homo_sapiens", ["R-HSA-1", "R-HSA-2"], ["P2", "P9"]
+    )
+    assert coverage["R-HSA-1"]["total"] == 2
+    assert coverage["R-HSA-1"]["measured"] == ["P2"]
+    assert coverage["R-HSA-1"]["entities"][1] == ("P1", "R-HSA-E2")
+    assert coverage["R-HSA-2"] == {"total": 0, "entities": [], "measured": []}
@@ -1,113 +1,85 @@
-from html import entities
-import pathlib
 import pytest
 
-from visMOP.python_scripts.reactome_hierarchy import (
-    ReactomeHierarchy,
-    get_occurrences_graph_json,
-)
-
-data_path = pathlib.Path().resolve()
+from test_hierarchy_template import build_template, new_hierarchy
+from visMOP.python_scripts.reactome_hierarchy import get_occurrences_graph_json
 
 
 @pytest.fixture(scope="module")
 def hierarchy():
-    """Generate hierarchy as fixture for the unit tests"""
-    target_db = "MMU"
-    reactome_hierarchy = ReactomeHierarchy()
-    reactome_hierarchy.load_data(data_path / "reactome_data", target_db.upper())
-    reactome_hierarchy.add_json_data(data_path / "reactome_data" / "diagram")
-    yield reactome_hierarchy
+    """Generate hierarchy as fixture for the unit tests, see test_hierarchy_template"""
+    yield new_hierarchy(build_template())
 
 
 class TestGetSubtreeTarget:
     def test_at_leaf(self, hierarchy):
         """When already at leaf, subtree should only be the leaf itself"""
-        subtree_expected = ["R-MMU-381753"]
+        subtree_expected = ["R-HSA-4"]
 
         assert (
-            hierarchy.get_subtree_target("R-MMU-381753") == subtree_expected
+            hierarchy.get_subtree_target("R-HSA-4") == subtree_expected
         )  # check that subtree is only query
 
     def test_small_subtree(self, hierarchy):
         """test small subtree"""
-        generated_subtree = hierarchy.get_subtree_target("R-MMU-9717189")
-        query_elem_index = generated_subtree.index("R-MMU-9717189")
+        generated_subtree = hierarchy.get_subtree_target("R-HSA-3")
+        query_elem_index = generated_subtree.index("R-HSA-3")
 
         assert len(generated_subtree) == 3  # check if size is correct
         assert (
             query_elem_index == 2
         )  # check if query element is correctly at last position
         assert query_elem_index > generated_subtree.index(
-            "R-MMU-9717207"
+            "R-HSA-4"
         )  # check if children nodes are correctly placed BEFORE the query node
         assert query_elem_index > generated_subtree.index(
-            "R-MMU-9730628"
+            "R-HSA-5"
         )  # check if children nodes are correctly placed BEFORE the query node
 
     def test_medium_subtree(self, hierarchy):
-        generated_subtree = hierarchy.get_subtree_target("R-MMU-2187338")
-        query_elem_index = generated_subtree.index("R-MMU-2187338")
+        generated_subtree = hierarchy.get_subtree_target("R-HSA-1")
+        query_elem_index = generated_subtree.index("R-HSA-1")
 
-        assert len(generated_subtree) == 7  # check if size is correct
+        assert len(generated_subtree) == 5  # check if size is correct
         assert (
-            query_elem_index == 6
+            query_elem_index == 4
         )  # check if query element is correctly at last position
         assert query_elem_index > generated_subtree.index(
-            "R-MMU-2187335"
-        )  # check if children nodes are correctly placed BEFORE the query node
-        assert query_elem_index > generated_subtree.index(
-            "R-MMU-2453902"
+            "R-HSA-2"
         )  # check if children nodes are correctly placed BEFORE the query node
         assert query_elem_index > generated_subtree.index(
-            "R-MMU-975634"
+            "R-HSA-3"
         )  # check if children nodes are correctly placed BEFORE the query node
-        assert query_elem_index > generated_subtree.index(
-            "R-MMU-2514856"
-        )  # check if children nodes are correctly placed BEFORE the query node
-        assert generated_subtree.index("R-MMU-2514856") > generated_subtree.index(
-            "R-MMU-2514859"
+        assert generated_subtree.index("R-HSA-2") > generated_subtree.index(
+            "R-HSA-4"
         )  # check if children nodes of specific subtree node are placed before it
-        assert generated_subtree.index("R-MMU-2514856") > generated_subtree.index(
-            "R-MMU-2485179"
+        assert generated_subtree.index("R-HSA-3") > generated_subtree.index(
+            "R-HSA-4"
         )  # check if children nodes of specific subtree node are placed before it
 
 
 class TestGetSubtreeNonOverview:
     def test_at_non_overview(self, hierarchy):
         """If already at node which posses a non-overview diagram"""
-        non_overview_diagrams = hierarchy.get_subtree_non_overview("R-MMU-2187338")
+        non_overview_diagrams = hierarchy.get_subtree_non_overview("R-HSA-3")
         assert non_overview_diagrams == [
-            "R-MMU-2187338"
+            "R-HSA-3"
         ]  # check if result contains only query
 
     def test_small_tree(self, hierarchy):
         """Not starting at non overview, small testcase"""
-        non_overview_diagrams = ["R-MMU-2187338", "R-MMU-9717189", "R-MMU-381753"]
+        non_overview_diagrams = ["R-HSA-2", "R-HSA-3"]
         assert set(non_overview_diagrams) == set(
-            hierarchy.get_subtree_non_overview("R-MMU-9709957")
+            hierarchy.get_subtree_non_overview("R-HSA-1")
         )  # check if results contain the same pathways
 
-    def test_skip_node(self, hierarchy):
+    def test_skip_node(self):
         """Not starting at non overview with node skip, i.e. not the first level of child-nodes posses non-overview diagrams"""
-        non_overview_diagrams = [
-            "R-MMU-5663220",
-            "R-MMU-5668599",
-            "R-MMU-5627117",
-            "R-MMU-5666185",
-            "R-MMU-5663213",
-            "R-MMU-5625900",
-            "R-MMU-5626467",
-            "R-MMU-5625970",
-            "R-MMU-5627123",
-            "R-MMU-5625740",
-            "R-MMU-5627083",
-            "R-MMU-9012999",
-            "R-MMU-9706019",
-            "R-MMU-9715370",
-        ]
+        template = build_template()
+        template["R-HSA-3"].is_overview = True
+        template.add_subtree_index()
+        non_overview_diagrams = ["R-HSA-2", "R-HSA-4", "R-HSA-5"]
         assert set(non_overview_diagrams) == set(
-            hierarchy.get_subtree_non_overview("R-MMU-9716542")
+            new_hierarchy(template).get_subtree_non_overview("R-HSA-1")
         )  # check if results contain the same pathways
 
 
@@ -115,47 +87,52 @@ class TestFindDiagram:
     def test_already_at_diagram(self, hierarchy):
         """test case where target already has a diagram"""
         entries = []
-        hierarchy._find_diagram_recursion("R-MMU-9717189", entries, 0)
-        true_diagram_parent = [("R-MMU-9717189", 0)]
+        hierarchy.template._find_diagram_recursion("R-HSA-3", entries, 0)
+        true_diagram_parent = [("R-HSA-3", 0)]
         assert true_diagram_parent == entries
 
     def test_simple_example(self, hierarchy):
         """test case where direct parent has a diagram"""
         entries = []
-        hierarchy._find_diagram_recursion("R-MMU-9730628", entries, 0)
-        true_diagram_parent = [("R-MMU-9717189", 1)]
+        hierarchy.template._find_diagram_recursion("R-HSA-5", entries, 0)
+        true_diagram_parent = [("R-HSA-3", 1)]
         assert true_diagram_parent == entries
 
     def test_branch_example(self, hierarchy):
         """test where mutiple diagram parents should be found"""
         entries = []
-        hierarchy._find_diagram_recursion("R-MMU-162699", entries, 0)
-        true_diagram_parents = [("R-MMU-163125", 1), ("R-MMU-446203", 3)]
+        hierarchy.template._find_diagram_recursion("R-HSA-4", entries, 0)
+        true_diagram_parents = [("R-HSA-2", 1), ("R-HSA-3", 1)]
         assert set(true_diagram_parents) == set(entries)
 
 
 class TestFindOccurences:
     @pytest.fixture(scope="class")
-    def get_intermediate_node_dict(self, hierarchy):
-        yield hierarchy["R-MMU-68884"].graph_json_file["nodes"]
+    def get_intermediate_node_dict(self):
+        """graph nodes of a protein 11 contained in complex 21, which is part of complexes 31 and 32"""
+        yield {
+            11: {"dbId": 11, "stId": "R-HSA-E1", "parents": [21]},
+            21: {"dbId": 21, "stId": "R-HSA-C1", "parents": [31, 32]},
+            31: {"dbId": 31, "stId": "R-HSA-C2"},
+            32: {"dbId": 32, "stId": "R-HSA-C3"},
+            41: {"dbId": 41, "stId": "R-HSA-E2"},
+        }
 
     def test_no_parents(self, get_intermediate_node_dict):
         """test case with no parents"""
-        expected_result = {9768535: {"internalID": 9768535, "stableID": "R-MMU-156721"}}
+        expected_result = {41: {"internalID": 41, "stableID": "R-HSA-E2"}}
         assert expected_result == get_occurrences_graph_json(
-            get_intermediate_node_dict, 9768535
+            get_intermediate_node_dict, 41
         )
 
     def test_with_parents(self, get_intermediate_node_dict):
         """test case with multiple parents"""
         expected_result = {
-            912410: {"internalID": 912410, "stableID": "R-MMU-912410"},
-            9820451: {"internalID": 9820451, "stableID": "R-MMU-1641505"},
-            9820461: {"internalID": 9820461, "stableID": "R-MMU-2468042"},
-            9820523: {"internalID": 9820523, "stableID": "R-MMU-2470943"},
-            9820527: {"internalID": 9820527, "stableID": "R-MMU-2537688"},
-            9820525: {"internalID": 9820525, "stableID": "R-MMU-2470928"},
+            11: {"internalID": 11, "stableID": "R-HSA-E1"},
+            21: {"internalID": 21, "stableID": "R-HSA-C1"},
+            31: {"internalID": 31, "stableID": "R-HSA-C2"},
+            32: {"internalID": 32, "stableID": "R-HSA-C3"},
         }
         assert expected_result == get_occurrences_graph_json(
-            get_intermediate_node_dict, 912410
+            get_intermediate_node_dict, 11
         )
@@ -0,0 +1,133 @@
+import json
+import pytest
+
+from visMOP.python_scripts import redis_pool
+from visMOP.python_scripts.reactome_query import ReactomeQuery
+from visMOP.python_scripts.mapping_cache import MappingCache
+
+MAPPING = {
+    "P1": {
+        "R-HSA-E1": {
+            "reactome_id": "R-HSA-E1",
+            "name": "E1",
+            "pathways": [["R-HSA-4", "Pathway R-HSA-4"]],
+        }
+    },
+    "P2": {
+        "R-HSA-E2": {
+            "reactome_id": "R-HSA-E2",
+            "name": "E2",
+            "pathways": [["R-HSA-5", "Pathway R-HSA-5"]],
+        }
+    },
+}
+
+
+class MappingClient:
+    """Answers HMGET requests from MAPPING and records the size of every request"""
+
+    requests = []
+    fingerprint = b"release-1"
+    # key prefix of the active release, None for data without release snapshots
+    active = None
+
+    def __init__(self, **kwargs):
+        pass
+
+    def get(self, name):
+        if name == "ActiveRelease":
+            return MappingClient.active
+        assert name == (MappingClient.active or b"").decode() + "ReleaseFingerprint"
+        return MappingClient.fingerprint
+
+    def hmget(self, name, fields):
+        assert name == (MappingClient.active or b"").decode() + "UniProt:Homo_sapiens"
+        MappingClient.requests.append(len(fields))
+        return [
+            json.dumps(MAPPING[field]).encode("utf-8") if field in MAPPING else None
+            for field in fields
+        ]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    MappingClient.requests = []
+    MappingClient.fingerprint = b"release-1"
+    MappingClient.active = None
+    monkeypatch.setattr(redis_pool.redis, "Redis", MappingClient)
+    yield MappingClient
+
+
+def run_query(query_ids, batch_size, cache=None):
+    return ReactomeQuery(
+        "localhost",
+        6379,
+        "",
+        [
+            ({"ID": query_id, "table_id": query_id}, [num])
+            for num, query_id in enumerate(query_ids)
+        ],
+        "Homo_sapiens",
+        "UniProt",
+        batch_size,
+        cache,
+    )
+
+
+def test_lookup_is_batched(client, capsys):
+    query = run_query(["P1", "X1", "P2", "X2", "X3"], 2)
+    assert client.requests == [2, 2, 1]
+    assert len(query.batch_seconds) == 3
+    assert query.lookup_report is not None
+    assert query.lookup_report["round_trips"] == 3
+    assert "3 entries from UniProt were not found" in capsys.readouterr().out
+    assert set(query.query_results) == {"P1", "P2"}
+    assert query.query_results["P2"]["R-HSA-E2"]["measurement"] == [2]
+    assert query.query_results["P2"]["R-HSA-E2"]["pathways"] == [
+        ("R-HSA-5", "Pathway R-HSA-5")
+    ]
+
+
+def test_later_duplicates_win(client):
+    query = run_query(["P1", "P2", "P1"], 2)
+    assert query.query_results["P1"]["R-HSA-E1"]["measurement"] == [2]
+
+
+def test_cache_returns_copies(client, capsys):
+    cache = MappingCache(10)
+    first = run_query(["P1", "X1"], 2, cache)
+    second = run_query(["X1", "P1", "P2"], 2, cache)
+    # only P2 was not requested before, the missing X1 is cached as well
+    assert client.requests == [2, 1]
+    assert cache.stats()["hits"] == 2
+    assert "1 entries from UniProt were not found" in capsys.readouterr().out
+    assert first.query_results["P1"]["R-HSA-E1"]["measurement"] == [0]
+    assert second.query_results["P1"]["R-HSA-E1"]["measurement"] == [1]
+    second.query_results["P1"]["R-HSA-E1"]["pathways"].append(("R-HSA-6", "Other"))
+    third = run_query(["P1"], 2, cache)
+    assert third.query_results["P1"]["R-HSA-E1"]["pathways"] == [
+        ("R-HSA-4", "Pathway R-HSA-4")
+    ]
+
+
+def test_cache_is_bounded_and_versioned(client):
+    cache = MappingCache(2)
+    run_query(["P1", "P2", "X1"], 3, cache)
+    # P1 is the least recently used record
+    run_query(["P1", "P2"], 3, cache)
+    assert client.requests == [3, 1]
+    MappingClient.fingerprint = b"release-2"
+    run_query(["P2"], 3, cache)
+    assert client.requests == [3, 1, 1]
+    assert cache.stats()["fingerprint"] == "release-2"
+
+
+def test_cache_follows_active_release(client):
+    cache = MappingCache(10)
+    run_query(["P1", "P2"], 3, cache)
+    client.active = b"r88:"
+    client.fingerprint = b"release-88"
+    run_query(["P1", "P2"], 3, cache)
+    # the records of the new snapshot are requested again
+    assert client.requests == [2, 2]
+    assert cache.stats()["fingerprint"] == "release-88"
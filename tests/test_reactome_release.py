@@ -0,0 +1,31 @@
+from reactome_redis import delete_legacy_keys
+from visMOP.python_scripts.reactome_release import activate_release
+from visMOP.python_scripts.storage_backend import (
+    EMBEDDED_SCHEME,
+    get_storage_backend,
+)
+
+
+def test_legacy_keys_are_deleted(tmp_path):
+    host = EMBEDDED_SCHEME + str(tmp_path / "db.sqlite")
+    storage = get_storage_backend(host, 0, "")
+    for prefix in ["", "r87:"]:
+        storage.client(0).hset(prefix + "UniProt:Homo_sapiens", "P1", b"record")
+        storage.client(1).set(prefix + "R-HSA-1", b"diagram")
+        storage.client(2).set(prefix + "ReactomePathwaysRelation", b"relations")
+        storage.client(2).set(prefix + "ReleaseFingerprint", b"fingerprint")
+    storage.client(1).set("ingest:1a2b3c4d:R-HSA-1", b"staged diagram")
+    activate_release(storage.client(2), "r87:")
+
+    assert delete_legacy_keys("", host, 0) == 4
+    assert sorted(storage.client(0).scan_iter()) == [b"r87:UniProt:Homo_sapiens"]
+    assert sorted(storage.client(1).scan_iter()) == [
+        b"ingest:1a2b3c4d:R-HSA-1",
+        b"r87:R-HSA-1",
+    ]
+    assert sorted(storage.client(2).scan_iter()) == [
+        b"ActiveRelease",
+        b"r87:ReactomePathwaysRelation",
+        b"r87:ReleaseFingerprint",
+    ]
+    assert delete_legacy_keys("", host, 0) == 0
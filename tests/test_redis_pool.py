@@ -0,0 +1,44 @@
+import pickle
+import redis
+
+from visMOP.python_scripts.redis_pool import CountingConnectionPool
+from visMOP.python_scripts.storage_backend import (
+    configure_storage_backend,
+    get_storage_backend,
+)
+
+
+class IdleConnection(redis.Connection):
+    """Connection that is never opened"""
+
+    def connect(self):
+        pass
+
+    def can_read(self, timeout=0):
+        return False
+
+
+def test_pool_statistics():
+    pool = CountingConnectionPool(2, 1, connection_class=IdleConnection)
+    first = pool.get_connection()
+    second = pool.get_connection()
+    pool.release(first)
+    # the released connection is handed out again
+    assert pool.get_connection() is first
+    assert (pool.created, pool.in_use, pool.peak_in_use, pool.checkouts) == (
+        2,
+        2,
+        2,
+        3,
+    )
+    pool.release(second)
+    assert pool.in_use == 1
+
+
+def test_pools_are_shared():
+    pools = configure_storage_backend("localhost", 6379, "", max_connections=4)
+    assert get_storage_backend("localhost", 6379, "") is pools
+    assert pickle.loads(pickle.dumps(pools)) is pools
+    assert pools.client(0).connection_pool is pools.client(0).connection_pool
+    assert [pool_stats["db"] for pool_stats in pools.stats()] == [0]
+    assert pools.stats()[0]["max_connections"] == 4
@@ -0,0 +1,83 @@
+import pickle
+import pytest
+
+from visMOP.python_scripts.shared_hierarchy import (
+    CLOSURE_FIELDS,
+    ENTITY_FIELDS,
+    SharedSegment,
+    attach_template,
+    export_template,
+)
+from visMOP.python_scripts.sparse_aggregation import AGGREGATED_FIELDS
+from test_sparse_aggregation import random_hierarchy, random_template
+
+SCALAR_FIELDS = (
+    "is_root",
+    "is_leaf",
+    "has_diagram",
+    "is_overview",
+    "name",
+    "db_Id",
+    "children",
+    "parents",
+    "level",
+    "root_id",
+)
+
+
+@pytest.fixture(scope="module", params=range(3))
+def templates(request, tmp_path_factory):
+    template = random_template(request.param)
+    for num, entry in enumerate(template.values()):
+        entry.name = "Pathway {}".format(num)
+        entry.maplinks = dict(entry.total_metabolites)
+        if entry.has_diagram:
+            entry.diagram_entry = entry
+    path = str(tmp_path_factory.mktemp("segments") / "HSA.hierarchy")
+    export_template(template, path)
+    yield template, attach_template(path, "localhost", 6379, "")
+
+
+def test_attached_template_matches(templates):
+    template, attached = templates
+    assert list(attached) == list(template)
+    assert attached.levels == template.levels
+    assert attached.topological_order == template.topological_order
+    for pathway_id, entry in template.items():
+        attached_entry = attached[pathway_id]
+        for field in SCALAR_FIELDS + ENTITY_FIELDS + CLOSURE_FIELDS:
+            assert attached_entry[field] == entry[field]
+        if entry.diagram_entry is not None:
+            assert attached_entry.diagram_entry is attached[pathway_id]
+
+
+def test_arrays_are_views_on_the_segment(templates):
+    _, attached = templates
+    index = attached.aggregation_index
+    for array in (index.closure_indices, index.total_proteins.sources):
+        assert not array.flags.owndata
+        assert not array.flags.writeable
+
+
+@pytest.mark.parametrize("engine", ["dict", "sparse"])
+def test_aggregation_matches(templates, engine):
+    template, attached = templates
+    expected = random_hierarchy(template, 0)
+    expected.aggregate_pathways(engine)
+    result = random_hierarchy(attached, 0)
+    result.aggregate_pathways(engine)
+    for pathway_id, expected_entry in expected.items():
+        assert result[pathway_id].has_data == expected_entry.has_data
+        for field in AGGREGATED_FIELDS:
+            assert result[pathway_id][field] == expected_entry[field]
+
+
+def test_pickle_keeps_the_segment(templates):
+    _, attached = templates
+    entry = next(iter(attached.values()))
+    restored_entry = pickle.loads(pickle.dumps(entry))
+    assert isinstance(restored_entry.shared.segment, SharedSegment)
+    # the shared attributes are read from the segment, not pickled
+    with pytest.raises(AttributeError):
+        object.__getattribute__(restored_entry, "total_proteins")
+    assert restored_entry.total_proteins == entry.total_proteins
@@ -0,0 +1,89 @@
+import random
+import pytest
+
+from visMOP.python_scripts.reactome_hierarchy import (
+    ReactomeHierarchy,
+    ReactomeHierarchyTemplate,
+    ReactomePathwayTemplate,
+)
+from visMOP.python_scripts.sparse_aggregation import AGGREGATED_FIELDS, OMICS
+
+AMT_PATHWAYS = 60
+
+
+def random_template(seed: int) -> ReactomeHierarchyTemplate:
+    """Random multi parent hierarchy with diagram derived entities"""
+    rng = random.Random(seed)
+    template = ReactomeHierarchyTemplate("HSA")
+    ids = ["R-HSA-{}".format(num) for num in range(AMT_PATHWAYS)]
+    for num, pathway_id in enumerate(ids):
+        template[pathway_id] = ReactomePathwayTemplate(pathway_id, rng.random() < 0.4)
+        template[pathway_id].db_Id = 1000 + num
+        template[pathway_id].is_overview = rng.random() < 0.2
+    for num, pathway_id in enumerate(ids[3:], start=3):
+        for parent in rng.sample(ids[:num], rng.choice([1, 1, 2, 3])):
+            template[parent].children += (pathway_id,)
+            template[pathway_id].parents += (parent,)
+    for num, entry in enumerate(template.values()):
+        entry.assert_leaf_root_state()
+        for attribute in ("total_proteins", "total_metabolites"):
+            for entity in rng.sample(range(30), rng.randint(0, 4)):
+                getattr(entry, attribute)["R-HSA-E{}".format(entity)] = {
+                    num: {"internalID": num, "stableID": entry.reactome_sID}
+                }
+    template.add_hierarchy_levels()
+    template.add_subtree_index()
+    return template
+
+
+def random_hierarchy(
+    template: ReactomeHierarchyTemplate, seed: int
+) -> ReactomeHierarchy:
+    """Hierarchy with random own measurements, query keys are shared between pathways"""
+    rng = random.Random(seed)
+    hierarchy = ReactomeHierarchy(
+        template,
+        {
+            "amt_timesteps": 1,
+            "omics_recieved": [True, True, True],
+            "target_organism": "HSA",
+        },
+    )
+    for pathway_id, entry in hierarchy.items():
+        for omic in OMICS:
+            for query in rng.sample(range(40), rng.randint(0, 3)):
+                query_key = "{}{}".format(omic[0], query)
+                # every pathway has its own measurement object, to detect which one is kept
+                entry["total_measured_" + omic][query_key] = {
+                    "measurement": [query],
+                    "regressionData": None,
+                    "forms": {pathway_id: {"name": pathway_id, "toplevelId": []}},
+                }
+                entry["own_measured_" + omic].append(query_key)
+    return hierarchy
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_sparse_aggregation_matches_dict_aggregation(seed):
+    template = random_template(seed)
+    expected = random_hierarchy(template, seed)
+    expected.aggregate_pathways("dict")
+    result = random_hierarchy(template, seed)
+    result.aggregate_pathways("sparse")
+
+    for pathway_id, expected_entry in expected.items():
+        entry = result[pathway_id]
+        assert entry.has_data == expected_entry.has_data
+        for field in AGGREGATED_FIELDS:
+            if field.startswith("own_measured_"):
+                assert sorted(entry[field]) == sorted(expected_entry[field])
+            else:
+                # same keys in the same order, the forms identify the pathway a value was taken from
+                assert list(entry[field]) == list(expected_entry[field])
+                for key, value in expected_entry[field].items():
+                    assert entry[field][key] == value
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        random_hierarchy(random_template(0), 0).aggregate_pathways("other")  # type: ignore
@@ -0,0 +1,75 @@
+import json
+import pytest
+
+from visMOP.python_scripts.value_codec import (
+    JSON_PAYLOAD,
+    MARSHAL_VERSION,
+    VALUE_MAGIC,
+    VALUE_VERSION,
+    StaleValueError,
+    decode_value,
+    encode_json,
+    encode_value,
+    is_encoded,
+)
+
+RECORD = {
+    "R-HSA-E1": {
+        "reactome_id": "R-HSA-E1",
+        "name": "E1",
+        "pathways": [("R-HSA-4", "Pathway R-HSA-4")],
+    }
+}
+
+
+@pytest.mark.parametrize("compression", ["none", "zlib"])
+def test_round_trip(compression):
+    value = encode_value(RECORD, compression)
+    assert is_encoded(value)
+    assert decode_value(value) == RECORD
+    assert decode_value(encode_value(b"R-HSA-1\tR-HSA-2\n", compression)) == (
+        b"R-HSA-1\tR-HSA-2\n"
+    )
+
+
+@pytest.mark.parametrize("compression", ["none", "zlib"])
+def test_json_round_trip(compression):
+    value = encode_json(json.dumps(RECORD).encode("utf-8"), compression)
+    assert is_encoded(value)
+    assert value[len(VALUE_MAGIC) + 2] == JSON_PAYLOAD
+    assert decode_value(value)["R-HSA-E1"]["pathways"] == [
+        ["R-HSA-4", "Pathway R-HSA-4"]
+    ]
+
+
+def test_legacy_values():
+    value = json.dumps(RECORD).encode("utf-8")
+    assert not is_encoded(value)
+    assert decode_value(value)["R-HSA-E1"]["pathways"] == [
+        ["R-HSA-4", "Pathway R-HSA-4"]
+    ]
+    assert decode_value(b"R-HSA-1\tR-HSA-2\n", bytes) == b"R-HSA-1\tR-HSA-2\n"
+
+
+def test_unknown_version():
+    value = encode_value(RECORD)
+    with pytest.raises(ValueError):
+        decode_value(
+            VALUE_MAGIC + bytes((VALUE_VERSION + 1,)) + value[len(VALUE_MAGIC) + 1 :]
+        )
+
+
+def test_marshal_format_of_another_python():
+    value = encode_value(RECORD)
+    header = len(VALUE_MAGIC) + 2
+    assert value[header] == MARSHAL_VERSION
+    with pytest.raises(StaleValueError, match="ingest the reactome data again"):
+        decode_value(
+            value[:header] + bytes((MARSHAL_VERSION + 1,)) + value[header + 1 :]
+        )
+    # version 1 values, written before the header had the marshal format
+    version_1 = VALUE_MAGIC + b"\x01" + value[len(VALUE_MAGIC) + 1 : header]
+    assert decode_value(version_1 + value[header + 1 :]) == RECORD
+    # version 2 values, written before json payloads
+    version_2 = VALUE_MAGIC + b"\x02" + value[len(VALUE_MAGIC) + 1 :]
+    assert decode_value(version_2) == RECORD
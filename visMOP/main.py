@@ -6,7 +6,23 @@ from visMOP.python_scripts.utils import kegg_to_chebi
 from visMOP.python_scripts.data_table_parsing import table_request, format_omics_data
 from visMOP.python_scripts.create_overview import create_overview_data
 from visMOP.python_scripts.reactome_hierarchy import ReactomeHierarchy
-from visMOP.python_scripts.reactome_query import ReactomeQuery
+from visMOP.python_scripts.hierarchy_store import (
+    get_hierarchy_template,
+    preload_hierarchy_templates,
+)
+from visMOP.python_scripts.reactome_query import ReactomeQuery, QUERY_BATCH_SIZE
+from visMOP.python_scripts.mapping_cache import MappingCache, MAPPING_CACHE_SIZE
+from visMOP.python_scripts.redis_pool import (
+    REDIS_HEALTH_CHECK_INTERVAL,
+    REDIS_POOL_SIZE,
+)
+from visMOP.python_scripts.storage_backend import configure_storage_backend
+from visMOP.python_scripts.reactome_release import get_active_prefix
+from visMOP.python_scripts.pathway_index import (
+    OMICS_ID_DATABASES,
+    PathwayCoverage,
+    get_pathway_coverage,
+)
 from visMOP.python_scripts.omicsTypeDefs import (
     MeasurementData,
     OmicsInputVals,
@@ -21,15 +37,39 @@ from visMOP.python_scripts.cluster_layout import (
     get_layout_settings,
     getClusterLayout,
 )
-from typing import Dict, List, Tuple, DefaultDict
+from typing import (
+    Callable,
+    Dict,
+    List,
+    Tuple,
+    DefaultDict,
+    Iterable,
+    Literal,
+    TypeVar,
+    Union,
+)
 
 import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
 from flask_caching import Cache
 from multiprocessing import set_start_method
 
+T = TypeVar("T")
+
 
 def create_app(
-    redis_host: str = "localhost", redis_port: int = 6379, redis_pw: str = ""
+    redis_host: str = "localhost",
+    redis_port: int = 6379,
+    redis_pw: str = "",
+    preload_organisms: Iterable[str] = (),
+    aggregation_engine: Literal["dict", "sparse"] = "dict",
+    shared_hierarchy_dir: Union[str, None] = None,
+    query_batch_size: int = QUERY_BATCH_SIZE,
+    mapping_cache_size: int = MAPPING_CACHE_SIZE,
+    kegg_live_fallback: bool = True,
+    redis_pool_size: int = REDIS_POOL_SIZE,
+    redis_health_check_interval: int = REDIS_HEALTH_CHECK_INTERVAL,
 ):
     # seems to be needed for linux not sure why i need to force the start method tho
     set_start_method("spawn", force=True)
@@ -51,6 +91,26 @@ def create_app(
         ICON_FOLDER=data_path / "dist/icons",
     )
     cache = Cache(app)
+    # connections to the reactome data are shared by all requests of the worker
+    storage = configure_storage_backend(
+        redis_host,
+        redis_port,
+        redis_pw,
+        redis_pool_size,
+        redis_health_check_interval,
+    )
+    # build the static reactome hierarchies before the first request instead of on demand
+    # with a shared directory the workers of a host attach to one memory mapped copy
+    preload_hierarchy_templates(
+        preload_organisms,
+        redis_host,
+        redis_port,
+        redis_pw,
+        shared_hierarchy_dir,
+        storage,
+    )
+    # mapping records of recently queried ids, reused when the same upload is submitted again
+    mapping_cache = MappingCache(mapping_cache_size) if mapping_cache_size > 0 else None
 
     """
     Default app routes for index and favicon
@@ -137,9 +197,14 @@ def create_app(
             amt_timesteps = metabolomics["amtTimesteps"]
 
         reactome_hierarchy = ReactomeHierarchy(
-            redis_host,
-            redis_port,
-            redis_pw,
+            get_hierarchy_template(
+                target_db.upper(),
+                redis_host,
+                redis_port,
+                redis_pw,
+                shared_hierarchy_dir,
+                storage,
+            ),
             {
                 "amt_timesteps": amt_timesteps,
                 "omics_recieved": omics_recieved,
@@ -157,10 +222,14 @@ def create_app(
             "metabolomics": {},
         }
         chebi_ids: DefaultDict[str, List[str]] = defaultdict(list)
+        # target organism is a little bit annoying at the moment
+        tar_organism = "Mus_musculus" if target_db == "mmu" else "Homo_sapiens"
+        print(tar_organism)
+
         ##
-        # Add Proteomics Data
+        # Filter and map the omics data, the branches run concurrently
         ##
-        if proteomics["recieved"]:
+        def query_proteomics() -> ReactomeQuery:
             proteomics_query_data_tuples: List[OmicsDataTuples] = []
 
             format_omics_data(
@@ -181,33 +250,21 @@ def create_app(
                     [entry[valCol] for valCol in proteomics["value"]],
                 )
                 proteomics_query_data_tuples.append(tuple_entry)
-            # target organism is a little bit annoying at the moment
-            tar_organism = "Mus_musculus" if target_db == "mmu" else "Homo_sapiens"
-            print(tar_organism)
-            protein_query = ReactomeQuery(
+            return ReactomeQuery(
                 redis_host,
                 redis_port,
                 redis_pw,
                 proteomics_query_data_tuples,
                 tar_organism,
                 "UniProt",
+                query_batch_size,
+                mapping_cache,
+                storage,
             )
-            fold_changes["proteomics"] = protein_query.get_measurement_levels()
-            # add entries to hierarchy
-            node_pathway_dict = {
-                **node_pathway_dict,
-                **protein_query.get_query_pathway_dict(),
-            }
-            for query_key, query_result in protein_query.query_results.items():
-                for entity_data in query_result.values():
-                    reactome_hierarchy.add_query_data(
-                        entity_data, "protein", query_key, timeseries_mode
-                    )
-        ##
-        # Add Metabolomics Data
-        ##
-        if metabolomics["recieved"]:
+
+        def query_metabolomics() -> Tuple[ReactomeQuery, DefaultDict[str, List[str]]]:
             metabolomics_query_data_tuples: List[OmicsDataTuples] = []
+            kegg_chebi_ids: DefaultDict[str, List[str]] = defaultdict(list)
 
             format_omics_data(
                 metabolomics["symbol"],
@@ -226,9 +283,15 @@ def create_app(
                 (str(entry)[0] == "C") and (str(entry)[1] != "H")
                 for entry in metabolomics_IDs
             ):
-                chebi_ids = kegg_to_chebi(metabolomics_IDs)
-                for k in chebi_ids.keys():
-                    for entry in chebi_ids[k]:
+                kegg_chebi_ids = kegg_to_chebi(
+                    metabolomics_IDs,
+                    redis_host,
+                    redis_port,
+                    redis_pw,
+                    kegg_live_fallback,
+                )
+                for k in kegg_chebi_ids.keys():
+                    for entry in kegg_chebi_ids[k]:
                         tuple_entry: OmicsDataTuples = (
                             {"ID": entry, "table_id": k},
                             [
@@ -251,9 +314,6 @@ def create_app(
 
                     metabolomics_query_data_tuples.append(tuple_entry)
 
-            # target organism is a little bit annoying at the moment
-            tar_organism = "Mus_musculus" if target_db == "mmu" else "Homo_sapiens"
-            print(tar_organism)
             metabolite_query = ReactomeQuery(
                 redis_host,
                 redis_port,
@@ -261,23 +321,13 @@ def create_app(
                 metabolomics_query_data_tuples,
                 tar_organism,
                 "ChEBI",
+                query_batch_size,
+                mapping_cache,
+                storage,
             )
-            fold_changes["metabolomics"] = metabolite_query.get_measurement_levels()
-            # add entries to hierarchy
-            node_pathway_dict = {
-                **node_pathway_dict,
-                **metabolite_query.get_query_pathway_dict(),
-            }
+            return metabolite_query, kegg_chebi_ids
 
-            for query_key, query_result in metabolite_query.query_results.items():
-                for entity_data in query_result.values():
-                    reactome_hierarchy.add_query_data(
-                        entity_data, "metabolite", query_key, timeseries_mode
-                    )
-        ##
-        # Add Transcriptomics Data Data
-        ##
-        if transcriptomics["recieved"]:
+        def query_transcriptomics() -> ReactomeQuery:
             transcriptomics_query_data_tuples: List[OmicsDataTuples] = []
             format_omics_data(
                 transcriptomics["symbol"],
@@ -304,18 +354,90 @@ def create_app(
                 )
                 transcriptomics_query_data_tuples.append(tuple_entry)
 
-            # target organism is a little bit annoying at the moment
-            tar_organism = "Mus_musculus" if target_db == "mmu" else "Homo_sapiens"
-            print(tar_organism)
             # Some entries do not exist for ENMUSG but do exist for ENSMUSP
-            transcriptomics_query = ReactomeQuery(
+            return ReactomeQuery(
                 redis_host,
                 redis_port,
                 redis_pw,
                 transcriptomics_query_data_tuples,
                 tar_organism,
                 "Ensembl",
+                query_batch_size,
+                mapping_cache,
+                storage,
+            )
+
+        def timed_branch(name: str, branch: Callable[[], T]) -> T:
+            branch_start = time.perf_counter()
+            # the session cache needs an application context in the worker thread
+            with app.app_context():
+                result = branch()
+            print("{} branch: {:.3f}s".format(name, time.perf_counter() - branch_start))
+            return result
+
+        branches_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            protein_future = (
+                executor.submit(timed_branch, "proteomics", query_proteomics)
+                if proteomics["recieved"]
+                else None
+            )
+            metabolite_future = (
+                executor.submit(timed_branch, "metabolomics", query_metabolomics)
+                if metabolomics["recieved"]
+                else None
+            )
+            transcriptomics_future = (
+                executor.submit(timed_branch, "transcriptomics", query_transcriptomics)
+                if transcriptomics["recieved"]
+                else None
+            )
+            # results are merged in the order of the serial implementation
+            protein_query = protein_future.result() if protein_future else None
+            metabolite_result = (
+                metabolite_future.result() if metabolite_future else None
             )
+            transcriptomics_query = (
+                transcriptomics_future.result() if transcriptomics_future else None
+            )
+        print("omics branches: {:.3f}s".format(time.perf_counter() - branches_start))
+
+        ##
+        # Add Proteomics Data
+        ##
+        if protein_query is not None:
+            fold_changes["proteomics"] = protein_query.get_measurement_levels()
+            # add entries to hierarchy
+            node_pathway_dict = {
+                **node_pathway_dict,
+                **protein_query.get_query_pathway_dict(),
+            }
+            for query_key, query_result in protein_query.query_results.items():
+                for entity_data in query_result.values():
+                    reactome_hierarchy.add_query_data(
+                        entity_data, "protein", query_key, timeseries_mode
+                    )
+        ##
+        # Add Metabolomics Data
+        ##
+        if metabolite_result is not None:
+            metabolite_query, chebi_ids = metabolite_result
+            fold_changes["metabolomics"] = metabolite_query.get_measurement_levels()
+            # add entries to hierarchy
+            node_pathway_dict = {
+                **node_pathway_dict,
+                **metabolite_query.get_query_pathway_dict(),
+            }
+
+            for query_key, query_result in metabolite_query.query_results.items():
+                for entity_data in query_result.values():
+                    reactome_hierarchy.add_query_data(
+                        entity_data, "metabolite", query_key, timeseries_mode
+                    )
+        ##
+        # Add Transcriptomics Data Data
+        ##
+        if transcriptomics_query is not None:
             fold_changes["transcriptomics"] = (
                 transcriptomics_query.get_measurement_levels()
             )
@@ -331,11 +453,16 @@ def create_app(
                     )
         # Aggregate Data in Hierarchy, and set session cache
         ##
-        reactome_hierarchy.aggregate_pathways()
+        reactome_hierarchy.aggregate_pathways(aggregation_engine)
         layout_settings = get_layout_settings(
             layout_settings_recieved, timeseries_mode, omics_recieved
         )
         cache.set("layout_settings", layout_settings)
+        # mapped ids of each omics type, used for the pathway coverage
+        cache.set(
+            "measured_ids",
+            {omics: list(values.keys()) for omics, values in fold_changes.items()},
+        )
         cache.set("reactome_hierarchy", reactome_hierarchy)
 
         # use add_regression_data_to_omics_data to add regression data to the fold_changes dict
@@ -497,6 +624,50 @@ def create_app(
             }
         )
 
+    @app.route("/pathway_entities", methods=["POST"])
+    def pathway_entities() -> str:
+        """Sends the entities of pathways from the reverse pathway index, without the hierarchy
+        Returns:
+            json string containing per pathway and omics type
+                total: number of ids in the pathway
+                entities: list of (query id, reactome entity id) pairs
+                measured: ids of the pathway in the submitted data
+        """
+        if not request.json:
+            raise TypeError("Request is empty")
+        pathway_ids: List[str] = request.json["pathways"]
+        omics_types: List[str] = request.json.get(
+            "omicsTypes", list(OMICS_ID_DATABASES.keys())
+        )
+        target_db = request.json.get("targetOrganism", cache.get("target_db"))
+        tar_organism = "Mus_musculus" if target_db == "mmu" else "Homo_sapiens"
+        measured_ids: Dict[str, List[str]] = cache.get("measured_ids") or {}  # type: ignore Until flask_caching is updated
+
+        r = storage.client(0)
+        key_prefix = get_active_prefix(storage.client(2))
+        coverage: DefaultDict[str, Dict[str, PathwayCoverage]] = defaultdict(dict)
+        for omics_type in omics_types:
+            omics_coverage = get_pathway_coverage(
+                r,
+                OMICS_ID_DATABASES[omics_type],
+                tar_organism,
+                pathway_ids,
+                measured_ids.get(omics_type, []),
+                key_prefix,
+            )
+            for pathway_id, pathway_coverage in omics_coverage.items():
+                coverage[pathway_id][omics_type] = pathway_coverage
+        return json.dumps(coverage)
+
+    @app.route("/storage_stats", methods=["GET"])
+    def storage_stats() -> str:
+        """Sends the usage of the storage connections of the worker answering the request
+        Returns:
+            json string containing the connection pool usage per redis database, or the file and
+            opened connections of an embedded database
+        """
+        return json.dumps(storage.stats())
+
     return app
 
 
@@ -0,0 +1,133 @@
+import json
+import sys
+import numpy as np
+from typing import Any, Dict, List, Mapping, Sequence, Tuple, Union
+
+# binary container of named one dimensional arrays, used for the hierarchy structure records
+# in redis and for the shared hierarchy segments
+SEGMENT_MAGIC = b"VISMOPA1"
+# arrays start at multiples of the alignment, relative to the end of the header
+SEGMENT_ALIGNMENT = 64
+
+Buffer = Union[bytes, bytearray, memoryview, Any]
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // SEGMENT_ALIGNMENT) * SEGMENT_ALIGNMENT
+
+
+def csr_arrays(
+    name: str, rows: Sequence[Sequence[int]], dtype: type = np.int64
+) -> Dict[str, np.ndarray]:
+    """Concatenates rows of integers to an indptr array and a values array
+
+    Args:
+        name: name of the values array, the indptr array is named name + "_indptr"
+        rows: integers of each row
+        dtype: dtype of the values, the indptr is always int64
+
+    Returns:
+        both arrays by name
+    """
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum([len(row) for row in rows], out=indptr[1:])
+    values = np.fromiter(
+        (value for row in rows for value in row), dtype=dtype, count=indptr[-1]
+    )
+    return {name + "_indptr": indptr, name: values}
+
+
+def csr_row(arrays: Mapping[str, np.ndarray], name: str, row: int) -> List[int]:
+    """Returns one row of arrays written by csr_arrays"""
+    indptr = arrays[name + "_indptr"]
+    return arrays[name][indptr[row] : indptr[row + 1]].tolist()
+
+
+def string_arrays(name: str, strings: Sequence[str]) -> Dict[str, np.ndarray]:
+    """Encodes strings to one utf-8 buffer and the offsets of the strings in it"""
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+    return {
+        name + "_data": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        name + "_offsets": offsets,
+    }
+
+
+def decode_strings(arrays: Mapping[str, np.ndarray], name: str) -> List[str]:
+    """Decodes strings written by string_arrays, the strings are interned"""
+    data = arrays[name + "_data"].tobytes()
+    offsets = arrays[name + "_offsets"].tolist()
+    return [
+        sys.intern(data[start:end].decode("utf-8"))
+        for start, end in zip(offsets[:-1], offsets[1:])
+    ]
+
+
+def encode_arrays(arrays: Mapping[str, np.ndarray], metadata: Dict[str, Any]) -> bytes:
+    """Encodes one dimensional arrays and json serializable metadata
+
+    Layout: magic, header length (8 byte little endian), json header with the metadata and
+    dtype, length and offset of every array, then the aligned array data.
+
+    Args:
+        arrays: arrays by name
+        metadata: json serializable information about the arrays
+
+    Returns:
+        the encoded arrays
+    """
+    layout: Dict[str, Tuple[str, int, int]] = {}
+    size = 0
+    for name, array in arrays.items():
+        size = _aligned(size)
+        layout[name] = (array.dtype.str, len(array), size)
+        size += array.nbytes
+    header = json.dumps({"metadata": metadata, "arrays": layout}).encode("utf-8")
+    data_start = _aligned(len(SEGMENT_MAGIC) + 8 + len(header))
+    encoded = bytearray(data_start + size)
+    encoded[: len(SEGMENT_MAGIC)] = SEGMENT_MAGIC
+    encoded[len(SEGMENT_MAGIC) : len(SEGMENT_MAGIC) + 8] = len(header).to_bytes(
+        8, "little"
+    )
+    encoded[len(SEGMENT_MAGIC) + 8 : len(SEGMENT_MAGIC) + 8 + len(header)] = header
+    for name, array in arrays.items():
+        start = data_start + layout[name][2]
+        encoded[start : start + array.nbytes] = np.ascontiguousarray(array).tobytes()
+    return bytes(encoded)
+
+
+def decode_arrays(
+    buffer: Buffer,
+) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """Decodes arrays written by encode_arrays without copying them
+
+    The arrays are read only views on the buffer, e.g. a memory mapped file.
+    Raises a ValueError if the buffer was not written by encode_arrays.
+
+    Args:
+        buffer: encoded arrays
+
+    Returns:
+        metadata, arrays by name
+    """
+    if buffer[: len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+        raise ValueError("Buffer does not contain encoded arrays")
+    header_start = len(SEGMENT_MAGIC) + 8
+    header_length = int.from_bytes(buffer[len(SEGMENT_MAGIC) : header_start], "little")
+    header = json.loads(buffer[header_start : header_start + header_length])
+    data_start = _aligned(header_start + header_length)
+    arrays: Dict[str, np.ndarray] = {
+        name: (
+            np.frombuffer(
+                buffer,
+                dtype=np.dtype(dtype),
+                count=length,
+                offset=data_start + offset,
+            )
+            if length
+            else np.zeros(0, dtype=np.dtype(dtype))
+        )
+        for name, (dtype, length, offset) in header["arrays"].items()
+    }
+    return header["metadata"], arrays
@@ -1,5 +1,7 @@
 import json
 import io
+import pathlib
+import time
 import pandas as pd  # pyright: ignore[reportUnknownMemberType, reportUnknownArgumentType]
 from typing import BinaryIO, List, Dict
 from visMOP.python_scripts.omicsTypeDefs import (
@@ -10,16 +12,98 @@ from visMOP.python_scripts.omicsTypeDefs import (
 from flask import Request
 from flask_caching import Cache
 
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:  # optional, csv tables are then parsed by the pandas c parser
+    pyarrow = None
 
-def create_df(data: BinaryIO, sheet_name: str) -> tuple[int, pd.DataFrame]:
+# leading bytes of the binary table formats, text tables are told apart by their file extension
+# or the delimiter of their header line
+XLSX_MAGIC = b"PK\x03\x04"
+PARQUET_MAGIC = b"PAR1"
+ARROW_FILE_MAGIC = b"ARROW1"
+ARROW_STREAM_MAGIC = b"\xff\xff\xff\xff"
+TEXT_TABLE_EXTENSIONS = {".csv": "csv", ".tsv": "tsv", ".tab": "tsv"}
+# csv delimiters in order of preference
+CSV_DELIMITERS = (",", ";")
+
+
+def detect_table_format(data: bytes, file_name: str = "") -> str:
     """
-    Creates a pandas dataframe from the supplied excel file
+    Determines the format of an uploaded table
     Args:
-        data: excel file
-        sheet_name: name of the sheet to be read
+        data: content of the uploaded file
+        file_name: name of the uploaded file, used for text tables
+    Return:
+        one of xlsx, parquet, arrow, csv and tsv
+    """
+    if data.startswith(XLSX_MAGIC):
+        return "xlsx"
+    if data.startswith(PARQUET_MAGIC):
+        return "parquet"
+    if data.startswith(ARROW_FILE_MAGIC) or data.startswith(ARROW_STREAM_MAGIC):
+        return "arrow"
+    suffix = pathlib.PurePath(file_name).suffix.lower()
+    if suffix in TEXT_TABLE_EXTENSIONS:
+        return TEXT_TABLE_EXTENSIONS[suffix]
+    header = data.split(b"\n", 1)[0]
+    if header.count(b"\t") > max(
+        header.count(delimiter.encode()) for delimiter in CSV_DELIMITERS
+    ):
+        return "tsv"
+    return "csv"
+
+
+def _csv_delimiter(data: bytes) -> str:
+    header = data.split(b"\n", 1)[0]
+    return max(CSV_DELIMITERS, key=lambda delimiter: header.count(delimiter.encode()))
+
+
+def _read_columnar_table(data: bytes, table_format: str) -> pd.DataFrame:
+    """
+    Reads a csv, tsv, parquet or arrow table with its first row as header
+    """
+    if table_format in ("csv", "tsv"):
+        delimiter = "\t" if table_format == "tsv" else _csv_delimiter(data)
+        # the pyarrow parser is multithreaded and several times faster
+        return pd.read_csv(
+            io.BytesIO(data),
+            sep=delimiter,
+            # semicolons separate tables of spreadsheets that write decimal commas
+            decimal="," if delimiter == ";" else ".",
+            engine="pyarrow" if pyarrow is not None else "c",
+        )
+    if table_format == "parquet":
+        return pd.read_parquet(io.BytesIO(data))
+    if pyarrow is None:
+        raise ImportError("arrow tables need pyarrow")
+    if data.startswith(ARROW_FILE_MAGIC):
+        return pyarrow.ipc.open_file(pyarrow.BufferReader(data)).read_pandas()
+    return pyarrow.ipc.open_stream(pyarrow.BufferReader(data)).read_pandas()
+
+
+def create_df(
+    data: BinaryIO, sheet_name: str, table_format: str = "xlsx"
+) -> tuple[int, pd.DataFrame]:
+    """
+    Creates a pandas dataframe from the supplied table file
+    Args:
+        data: excel, csv, tsv, parquet or arrow file
+        sheet_name: name of the sheet to be read, only used for excel files
+        table_format: format of the file, see detect_table_format
     Return:
         0 if successful, 1 if unsuccessful, pandas dataframe
     """
+    if table_format != "xlsx":
+        try:
+            read_table = _read_columnar_table(data, table_format)  # type: ignore
+        except (ValueError, ImportError) as error:
+            print("{} parse error: {}".format(table_format, error))
+            return 1, pd.DataFrame()
+        # rows are numbered like spreadsheet rows after the header row
+        read_table.index = pd.RangeIndex(1, len(read_table) + 1)
+        return 0, _add_reserved_columns(read_table.dropna(how="all"))
     try:
         read_table: pd.DataFrame = pd.read_excel(
             io.BytesIO(data), sheet_name=sheet_name, header=None, engine="openpyxl"
@@ -31,11 +115,15 @@ def create_df(data: BinaryIO, sheet_name: str) -> tuple[int, pd.DataFrame]:
         columns=read_table.iloc[0].to_dict()
     )  # NOTE check if program is broken --> this might be at fault
     read_table = read_table.drop(read_table.index[0])
+    return 0, _add_reserved_columns(read_table)
+
+
+def _add_reserved_columns(read_table: pd.DataFrame) -> pd.DataFrame:
     read_table = read_table.fillna(value="None").infer_objects(copy=False)
     read_table["_reserved_sort_id"] = read_table.index
     read_table["_reserved_available"] = "No"
     read_table["_reserved_inSelected"] = "No"
-    return 0, read_table
+    return read_table
 
 
 def generate_vue_table_header(df: pd.DataFrame) -> List[TableHeaders]:
@@ -92,17 +180,32 @@ def table_request(request: Request, cache: Cache, requestType: str) -> str:
     print("table recieve triggered")
 
     # recieve data-blob
-    transfer_dat: BinaryIO = request.files["dataTable"].read()
-    sheet_name = request.form["sheetName"]
+    upload = request.files["dataTable"]
+    transfer_dat: BinaryIO = upload.read()
+    # only excel uploads have sheets
+    sheet_name = request.form.get("sheetName", "")
+    table_format = detect_table_format(transfer_dat, upload.filename or "")  # type: ignore
     # create and parse data table and prepare json
-    exitState, data_table = create_df(transfer_dat, sheet_name)
+    start_time = time.perf_counter()
+    exitState, data_table = create_df(transfer_dat, sheet_name, table_format)
     if exitState == 1:
         return json.dumps(
             {
                 "exitState": 1,
-                "errorMsg": "Xlsx parse Error!! Is the Correct Sheet chosen?",
+                "errorMsg": (
+                    "Xlsx parse Error!! Is the Correct Sheet chosen?"
+                    if table_format == "xlsx"
+                    else "{} parse Error!! Is the file a valid {} table?".format(
+                        table_format.capitalize(), table_format
+                    )
+                ),
             }
         )
+    print(
+        "parsed {} table with {} rows in {:.3f}s".format(
+            table_format, len(data_table), time.perf_counter() - start_time
+        )
+    )
     cache.set(
         requestType,
         data_table.copy(deep=True).to_json(orient="columns"),
@@ -0,0 +1,170 @@
+import threading
+import redis
+from collections import OrderedDict
+from typing import Dict, Tuple, Union
+from visMOP.python_scripts.hierarchy_types import (
+    ModifiedReactomeGraphJSON,
+    ReactomeGraphJSON,
+    EntityNode,
+    EventNode,
+    SubpathwayNode,
+)
+from visMOP.python_scripts.storage_backend import get_storage_backend
+from visMOP.python_scripts.value_codec import decode_value
+
+# amount of decoded diagrams (layout and graph file) kept per worker
+DIAGRAM_CACHE_SIZE = 32
+
+DiagramFiles = Tuple[Dict[str, str], ModifiedReactomeGraphJSON]
+"""
+A Tuple containing the layout json and the formatted graph json of a diagram.
+"""
+
+
+def empty_graph_json() -> ModifiedReactomeGraphJSON:
+    """Returns the graph json used for pathways without diagram files"""
+    return {
+        "nodes": {},
+        "edges": {},
+        "subpathways": {},
+        "dbId": 0,
+        "stId": "",
+    }
+
+
+def format_graph_json(graph_json_file: ReactomeGraphJSON) -> ModifiedReactomeGraphJSON:
+    """Formats .graph.json nodes to be easily accessible in dictionary form with
+    the keys being node Ids
+
+    Args:
+        graph_json_file: loaded graph.json file
+
+    Returns:
+        formatted json file dictionary
+    """
+
+    intermediate_node_dict: Dict[int, EntityNode] = {}
+    intermediate_edge_dict: Dict[int, EventNode] = {}
+    intermediate_subpathway_dict: Dict[int, SubpathwayNode] = {}
+
+    try:
+        for v in graph_json_file["nodes"]:
+            intermediate_node_dict[v["dbId"]] = v
+    except:
+        pass
+
+    try:
+        for v in graph_json_file["edges"]:
+            intermediate_edge_dict[v["dbId"]] = v
+    except:
+        pass
+
+    try:
+        for v in graph_json_file["subpathways"]:
+            intermediate_subpathway_dict[v["dbId"]] = v
+    except:
+        pass
+
+    return {
+        "nodes": intermediate_node_dict,
+        "edges": intermediate_edge_dict,
+        "subpathways": intermediate_subpathway_dict,
+        "dbId": graph_json_file["dbId"],
+        "stId": graph_json_file["stId"],
+    }
+
+
+class DiagramStore:
+    """
+    Bounded LRU of decoded diagram files, loading missing diagrams from redis on first access.
+
+    Pickling a store only keeps the connection settings and the release, unpickling returns the
+    process wide store for them (see get_diagram_store).
+
+    Args:
+        redis_host: host of the redis server containing the diagrams (db 1)
+        redis_port: port of the redis server
+        redis_pw: password of the redis server
+        key_prefix: key prefix of the release snapshot the diagrams belong to
+        max_entries: amount of diagrams kept in memory
+
+    Attributes:
+        hits: amount of diagram requests answered from memory
+        misses: amount of diagram requests loaded from redis
+    """
+
+    def __init__(
+        self,
+        redis_host: str,
+        redis_port: int,
+        redis_pw: str,
+        key_prefix: str = "",
+        max_entries: int = DIAGRAM_CACHE_SIZE,
+    ):
+        self.redis_host = redis_host
+        self.redis_port = redis_port
+        self.redis_pw = redis_pw
+        self.key_prefix = key_prefix
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, DiagramFiles] = OrderedDict()
+        self._lock = threading.Lock()
+        self._client: Union[redis.Redis, None] = None
+
+    def __reduce__(self):
+        return (
+            get_diagram_store,
+            (self.redis_host, self.redis_port, self.redis_pw, self.key_prefix),
+        )
+
+    def get(self, pathway_id: str) -> DiagramFiles:
+        """Returns layout and formatted graph json of a pathway diagram"""
+        with self._lock:
+            if pathway_id in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(pathway_id)
+                return self._entries[pathway_id]
+        diagram = self._load(pathway_id)
+        with self._lock:
+            self.misses += 1
+            self._entries[pathway_id] = diagram
+            self._entries.move_to_end(pathway_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return diagram
+
+    def _load(self, pathway_id: str) -> DiagramFiles:
+        if self._client is None:
+            self._client = get_storage_backend(
+                self.redis_host, self.redis_port, self.redis_pw
+            ).client(1)
+        key = self.key_prefix + pathway_id
+        layout_query, graph_query = self._client.mget([key, key + ".graph"])  # type: ignore
+        layout_json_file: Dict[str, str] = (
+            decode_value(layout_query) if layout_query else {}
+        )
+        graph_json_file: ModifiedReactomeGraphJSON = (
+            format_graph_json(decode_value(graph_query))
+            if graph_query
+            else empty_graph_json()
+        )
+        return layout_json_file, graph_json_file
+
+
+# process wide diagram stores, keyed by redis connection and release key prefix
+_diagram_stores: Dict[Tuple[str, int, str, str], DiagramStore] = {}
+_diagram_stores_lock = threading.Lock()
+
+
+def get_diagram_store(
+    redis_host: str, redis_port: int, redis_pw: str, key_prefix: str = ""
+) -> DiagramStore:
+    """Returns the process wide diagram store for a redis server and release snapshot"""
+    with _diagram_stores_lock:
+        key = (redis_host, redis_port, redis_pw, key_prefix)
+        if key not in _diagram_stores:
+            _diagram_stores[key] = DiagramStore(
+                redis_host, redis_port, redis_pw, key_prefix
+            )
+        return _diagram_stores[key]
@@ -0,0 +1,448 @@
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterator, List, Set, Tuple, Union
+
+# bytes of the database file mapped into memory for reads
+EMBEDDED_MMAP_SIZE = 1 << 30
+# milliseconds a writer waits for the lock held by another connection, e.g. of an ingest job
+EMBEDDED_BUSY_TIMEOUT = 60000
+
+# strings, hashes and sets of the databases 0 to 2 in one file
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS strings (
+    db INTEGER, key TEXT, value BLOB, PRIMARY KEY (db, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS hashes (
+    db INTEGER, key TEXT, field TEXT, value BLOB, PRIMARY KEY (db, key, field)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sets (
+    db INTEGER, key TEXT, member BLOB, PRIMARY KEY (db, key, member)
+) WITHOUT ROWID;
+"""
+_TABLES = ("strings", "hashes", "sets")
+_READ_COMMANDS = {
+    "get",
+    "mget",
+    "hget",
+    "hmget",
+    "hgetall",
+    "hkeys",
+    "hlen",
+    "smembers",
+    "type",
+    "exists",
+}
+
+Key = Union[str, bytes]
+
+
+def _text(key: Key) -> str:
+    return key.decode("utf-8") if isinstance(key, bytes) else key
+
+
+def _blob(value: Union[str, bytes, int, float]) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode("utf-8")
+
+
+class EmbeddedBackend:
+    """
+    Storage of the reactome data in a local SQLite file instead of a redis server.
+
+    Offers the same client(db) access as redis_pool.RedisPools, the clients answer the
+    subset of redis commands used by visMOP and reactome_redis.py.
+    Reads go through a memory mapping of the file and need no network round trip.
+    Every thread uses its own connection, writers of several processes wait for each other.
+
+    Args:
+        path: the database file, created on first use
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connections = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all_connections: List[sqlite3.Connection] = []
+        self._pid = os.getpid()
+
+    def __reduce__(self):
+        from visMOP.python_scripts.storage_backend import (
+            EMBEDDED_SCHEME,
+            get_storage_backend,
+        )
+
+        return (get_storage_backend, (EMBEDDED_SCHEME + self.path, 0, ""))
+
+    def connection(self) -> sqlite3.Connection:
+        """Returns the connection of the calling thread"""
+        if self._pid != os.getpid():
+            # connections must not be shared with a forked process
+            self._pid = os.getpid()
+            self._local = threading.local()
+            self._all_connections = []
+            self.connections = 0
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path,
+                timeout=EMBEDDED_BUSY_TIMEOUT / 1000,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA mmap_size={}".format(EMBEDDED_MMAP_SIZE))
+            connection.executescript(_SCHEMA)
+            self._local.connection = connection
+            with self._lock:
+                self.connections += 1
+                self._all_connections.append(connection)
+        return connection
+
+    def client(self, db: int) -> "EmbeddedClient":
+        """Returns a client of a database"""
+        return EmbeddedClient(self, db)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the file and the amount of connections opened"""
+        return {"path": self.path, "connections": self.connections}
+
+    def print_stats(self) -> None:
+        """Prints the file and the amount of connections opened"""
+        print(
+            "embedded database {}: {} connections opened".format(
+                self.path, self.connections
+            )
+        )
+
+    def disconnect(self) -> None:
+        """Closes all connections"""
+        with self._lock:
+            for connection in self._all_connections:
+                connection.close()
+            self._all_connections.clear()
+        self._local = threading.local()
+
+
+class EmbeddedClient:
+    """
+    Redis like access to one database of an EmbeddedBackend.
+
+    Keys, fields and members are returned as bytes like redis-py does without decoding.
+
+    Args:
+        backend: the embedded backend
+        db: the database number, e.g. 0 for the mapping
+    """
+
+    def __init__(self, backend: EmbeddedBackend, db: int):
+        self.backend = backend
+        self.db = db
+
+    def _execute(self, sql: str, parameters: Tuple = ()) -> sqlite3.Cursor:
+        return self.backend.connection().execute(sql, parameters)
+
+    def _write(self, statements: List[Tuple[str, Tuple]]) -> None:
+        connection = self.backend.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, parameters in statements:
+                connection.execute(sql, parameters)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def _delete_statements(self, key: str) -> List[Tuple[str, Tuple]]:
+        return [
+            ("DELETE FROM {} WHERE db = ? AND key = ?".format(table), (self.db, key))
+            for table in _TABLES
+        ]
+
+    def pipeline(self, transaction: bool = True) -> "EmbeddedPipeline":
+        """Returns a pipeline, its commands are executed in one SQLite transaction"""
+        return EmbeddedPipeline(self)
+
+    # strings
+
+    def get(self, name: Key) -> Union[bytes, None]:
+        row = self._execute(
+            "SELECT value FROM strings WHERE db = ? AND key = ?", (self.db, _text(name))
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def mget(self, keys: List[Key]) -> List[Union[bytes, None]]:
+        return [self.get(key) for key in keys]
+
+    def set(self, name: Key, value: Union[str, bytes, int, float]) -> bool:
+        key = _text(name)
+        self._write(
+            self._delete_statements(key)
+            + [
+                (
+                    "INSERT INTO strings VALUES (?, ?, ?)",
+                    (self.db, key, _blob(value)),
+                )
+            ]
+        )
+        return True
+
+    def getset(
+        self, name: Key, value: Union[str, bytes, int, float]
+    ) -> Union[bytes, None]:
+        connection = self.backend.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            previous = self.get(name)
+            for sql, parameters in self._delete_statements(_text(name)):
+                connection.execute(sql, parameters)
+            connection.execute(
+                "INSERT INTO strings VALUES (?, ?, ?)",
+                (self.db, _text(name), _blob(value)),
+            )
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return previous
+
+    # hashes
+
+    def hset(
+        self,
+        name: Key,
+        key: Union[Key, None] = None,
+        value: Union[str, bytes, int, float, None] = None,
+        mapping: Union[Dict[Key, Any], None] = None,
+    ) -> int:
+        items = dict(mapping or {})
+        if key is not None:
+            items[key] = value
+        name = _text(name)
+        self._write(
+            [
+                (
+                    "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)",
+                    (self.db, name, _text(field), _blob(field_value)),
+                )
+                for field, field_value in items.items()
+            ]
+        )
+        return len(items)
+
+    def hget(self, name: Key, key: Key) -> Union[bytes, None]:
+        return self.hmget(name, [key])[0]
+
+    def hmget(self, name: Key, keys: List[Key]) -> List[Union[bytes, None]]:
+        name = _text(name)
+        return [
+            (row[0] if row is not None else None)
+            for row in (
+                self._execute(
+                    "SELECT value FROM hashes WHERE db = ? AND key = ? AND field = ?",
+                    (self.db, name, _text(field)),
+                ).fetchone()
+                for field in keys
+            )
+        ]
+
+    def hgetall(self, name: Key) -> Dict[bytes, bytes]:
+        return {
+            field.encode("utf-8"): value
+            for field, value in self._execute(
+                "SELECT field, value FROM hashes WHERE db = ? AND key = ?",
+                (self.db, _text(name)),
+            )
+        }
+
+    def hkeys(self, name: Key) -> List[bytes]:
+        return list(self.hgetall(name))
+
+    def hlen(self, name: Key) -> int:
+        return self._execute(
+            "SELECT COUNT(*) FROM hashes WHERE db = ? AND key = ?",
+            (self.db, _text(name)),
+        ).fetchone()[0]
+
+    def hdel(self, name: Key, *keys: Key) -> int:
+        name = _text(name)
+        existing = sum(value is not None for value in self.hmget(name, list(keys)))
+        self._write(
+            [
+                (
+                    "DELETE FROM hashes WHERE db = ? AND key = ? AND field = ?",
+                    (self.db, name, _text(field)),
+                )
+                for field in keys
+            ]
+        )
+        return existing
+
+    def hscan_iter(self, name: Key, count: int = 0) -> Iterator[Tuple[bytes, bytes]]:
+        yield from self.hgetall(name).items()
+
+    # sets
+
+    def sadd(self, name: Key, *values: Union[str, bytes]) -> int:
+        name = _text(name)
+        self._write(
+            [
+                (
+                    "INSERT OR IGNORE INTO sets VALUES (?, ?, ?)",
+                    (self.db, name, _blob(value)),
+                )
+                for value in values
+            ]
+        )
+        return len(values)
+
+    def smembers(self, name: Key) -> Set[bytes]:
+        return {
+            row[0]
+            for row in self._execute(
+                "SELECT member FROM sets WHERE db = ? AND key = ?",
+                (self.db, _text(name)),
+            )
+        }
+
+    # keys
+
+    def type(self, name: Key) -> bytes:
+        for table, key_type in zip(_TABLES, (b"string", b"hash", b"set")):
+            if self._execute(
+                "SELECT 1 FROM {} WHERE db = ? AND key = ? LIMIT 1".format(table),
+                (self.db, _text(name)),
+            ).fetchone():
+                return key_type
+        return b"none"
+
+    def exists(self, *names: Key) -> int:
+        return sum(self.type(name) != b"none" for name in names)
+
+    def delete(self, *names: Key) -> int:
+        existing = self.exists(*names)
+        self._write(
+            [
+                statement
+                for name in names
+                for statement in self._delete_statements(_text(name))
+            ]
+        )
+        return existing
+
+    def rename(self, src: Key, dst: Key) -> bool:
+        src, dst = _text(src), _text(dst)
+        self._write(
+            self._delete_statements(dst)
+            + [
+                (
+                    "UPDATE {} SET key = ? WHERE db = ? AND key = ?".format(table),
+                    (dst, self.db, src),
+                )
+                for table in _TABLES
+            ]
+        )
+        return True
+
+    def copy(self, source: Key, destination: Key, replace: bool = False) -> bool:
+        source, destination = _text(source), _text(destination)
+        if not self.exists(source) or (not replace and self.exists(destination)):
+            return False
+        self._write(
+            self._delete_statements(destination)
+            + [
+                (
+                    "INSERT INTO {0} SELECT db, ?, {1} FROM {0} "
+                    "WHERE db = ? AND key = ?".format(table, columns),
+                    (destination, self.db, source),
+                )
+                for table, columns in zip(_TABLES, ("value", "field, value", "member"))
+            ]
+        )
+        return True
+
+    def scan_iter(
+        self, match: Union[str, None] = None, count: int = 0
+    ) -> Iterator[bytes]:
+        # GLOB patterns match redis patterns for *, ? and [...]
+        keys: Set[str] = set()
+        for table in _TABLES:
+            keys.update(
+                row[0]
+                for row in self._execute(
+                    "SELECT DISTINCT key FROM {} WHERE db = ? AND key GLOB ?".format(
+                        table
+                    ),
+                    (self.db, match or "*"),
+                )
+            )
+        for key in sorted(keys):
+            yield key.encode("utf-8")
+
+    def scan(
+        self, cursor: int = 0, match: Union[str, None] = None, count: int = 0
+    ) -> Tuple[int, List[bytes]]:
+        # all keys are returned at once with the final cursor 0
+        return 0, list(self.scan_iter(match))
+
+
+class EmbeddedPipeline:
+    """
+    Collects commands of an EmbeddedClient and executes them in one SQLite transaction.
+
+    Args:
+        client: the client to execute the commands with
+    """
+
+    def __init__(self, client: EmbeddedClient):
+        self.client = client
+        self._commands: List[Tuple[str, Tuple, Dict[str, Any]]] = []
+
+    def __getattr__(self, command: str):
+        if command.startswith("_") or not hasattr(EmbeddedClient, command):
+            raise AttributeError(command)
+
+        def queue(*args, **kwargs):
+            self._commands.append((command, args, kwargs))
+            return self
+
+        return queue
+
+    def execute(self) -> List[Any]:
+        """Executes the queued commands and returns their results"""
+        connection = self.client.backend.connection()
+        commands, self._commands = self._commands, []
+        # read only pipelines do not take the write lock
+        read_only = all(command in _READ_COMMANDS for command, _, _ in commands)
+        connection.execute("BEGIN" if read_only else "BEGIN IMMEDIATE")
+        try:
+            client = _NestedClient(self.client)
+            results = [
+                getattr(client, command)(*args, **kwargs)
+                for command, args, kwargs in commands
+            ]
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return results
+
+
+class _NestedClient(EmbeddedClient):
+    """Client executing writes inside the transaction of a pipeline"""
+
+    def __init__(self, client: EmbeddedClient):
+        super().__init__(client.backend, client.db)
+
+    def _write(self, statements: List[Tuple[str, Tuple]]) -> None:
+        connection = self.backend.connection()
+        for sql, parameters in statements:
+            connection.execute(sql, parameters)
+
+    def getset(self, name: Key, value: Union[str, bytes, int, float]):
+        previous = self.get(name)
+        self.set(name, value)
+        return previous
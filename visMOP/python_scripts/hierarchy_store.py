@@ -0,0 +1,138 @@
+import os
+import threading
+from typing import Dict, Iterable, Union
+from visMOP.python_scripts.reactome_hierarchy import ReactomeHierarchyTemplate
+from visMOP.python_scripts.reactome_release import get_active_release
+from visMOP.python_scripts.storage_backend import StorageBackend, get_storage_backend
+from visMOP.python_scripts.shared_hierarchy import load_shared_template
+
+# process wide store of prebuilt hierarchy templates of the active release, keyed by organism
+_hierarchy_templates: Dict[str, ReactomeHierarchyTemplate] = {}
+_hierarchy_templates_lock = threading.Lock()
+
+
+def get_hierarchy_template(
+    organism: str,
+    redis_host: str,
+    redis_port: int,
+    redis_pw: str,
+    shared_dir: Union[str, None] = None,
+    storage: Union[StorageBackend, None] = None,
+) -> ReactomeHierarchyTemplate:
+    """Returns the hierarchy template for the organism, building it on first use
+
+    The template only depends on the organism and the reactome release,
+    so it is built once per worker and release and shared by all requests.
+    A template of a previous release is replaced once the active release changed.
+    With a shared directory it is built once per host instead and the workers attach
+    to a memory mapped segment of it (see shared_hierarchy).
+
+    Args:
+        organism: 3 letter abbrev for target organism
+        redis_host: host of the redis server containing the reactome data
+        redis_port: port of the redis server
+        redis_pw: password of the redis server
+        shared_dir: directory of the shared hierarchy segments, None to build per worker
+        storage: storage backend of the reactome data, None for the process wide backend of the server
+
+    Returns:
+        the prebuilt hierarchy template
+    """
+    if storage is None:
+        storage = get_storage_backend(redis_host, redis_port, redis_pw)
+    release = get_active_release(storage.client(2))
+    with _hierarchy_templates_lock:
+        template = _hierarchy_templates.get(organism)
+        if template is None or template.fingerprint != release["fingerprint"]:
+            if shared_dir is None:
+                template = ReactomeHierarchyTemplate(
+                    organism,
+                    redis_host,
+                    redis_port,
+                    redis_pw,
+                    key_prefix=release["prefix"],
+                    storage=storage,
+                )
+                template.build()
+            else:
+                template = load_shared_template(
+                    shared_dir,
+                    organism,
+                    redis_host,
+                    redis_port,
+                    redis_pw,
+                    release,
+                    storage,
+                )
+            _hierarchy_templates[organism] = template
+        return template
+
+
+def get_release_template(
+    organism: str,
+    fingerprint: str,
+    redis_host: str,
+    redis_port: int,
+    redis_pw: str,
+    segment_path: Union[str, None] = None,
+) -> ReactomeHierarchyTemplate:
+    """Returns the template a pickled hierarchy was built on, see reactome_hierarchy.restore_hierarchy
+
+    Raises a ValueError if the reactome data changed since the hierarchy was built.
+
+    Args:
+        organism: 3 letter abbrev for target organism
+        fingerprint: release fingerprint of the template
+        redis_host: host of the redis server containing the reactome data
+        redis_port: port of the redis server
+        redis_pw: password of the redis server
+        segment_path: segment the template was attached to, None if it was built per worker
+
+    Returns:
+        the template of the current release
+    """
+    template = get_hierarchy_template(
+        organism,
+        redis_host,
+        redis_port,
+        redis_pw,
+        None if segment_path is None else os.path.dirname(segment_path),
+    )
+    if template.fingerprint != fingerprint:
+        raise ValueError(
+            "The {} hierarchy of this session was built on different reactome data ({}), "
+            "the current data is {}, please submit the data again".format(
+                organism, fingerprint, template.fingerprint
+            )
+        )
+    return template
+
+
+def preload_hierarchy_templates(
+    organisms: Iterable[str],
+    redis_host: str,
+    redis_port: int,
+    redis_pw: str,
+    shared_dir: Union[str, None] = None,
+    storage: Union[StorageBackend, None] = None,
+) -> None:
+    """Builds the hierarchy templates for the supplied organisms ahead of the first request
+
+    Args:
+        organisms: 3 letter abbrevs of the organisms to build
+        redis_host: host of the redis server containing the reactome data
+        redis_port: port of the redis server
+        redis_pw: password of the redis server
+        shared_dir: directory of the shared hierarchy segments, None to build per worker
+        storage: storage backend of the reactome data, None for the process wide backend of the server
+    """
+    for organism in organisms:
+        get_hierarchy_template(
+            organism.upper(), redis_host, redis_port, redis_pw, shared_dir, storage
+        )
+
+
+def clear_hierarchy_templates() -> None:
+    """Drops all stored templates, e.g. after the reactome data was updated"""
+    with _hierarchy_templates_lock:
+        _hierarchy_templates.clear()
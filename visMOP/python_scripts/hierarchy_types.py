@@ -1,4 +1,4 @@
-from typing import Dict, List, Literal, TypedDict, Union, NotRequired
+from typing import Dict, List, Literal, Tuple, TypedDict, Union, NotRequired
 
 
 class FormEntry(TypedDict):
@@ -291,3 +291,24 @@ class HierarchyEntryDict(TypedDict):  #
     initialPosX: NotRequired[float]
     initialPosY: NotRequired[float]
     clusterNum: NotRequired[float]
+
+
+class PathwayRecord(TypedDict):
+    """
+    A TypedDict that describes the precomputed diagram derived data of a pathway.
+    NOTE: occurrences are stored as [internalID, stableID] pairs instead of EntityOccurrence dicts
+    Attributes:
+        name (str): The name of the pathway.
+        db_Id (int): The database ID of the pathway.
+        is_overview (bool): Whether the pathway is an overview.
+        total_proteins (Dict[str, List[Tuple[int, str]]]): Occurrences of the contained proteins/genes.
+        total_metabolites (Dict[str, List[Tuple[int, str]]]): Occurrences of the contained metabolites.
+        maplinks (Dict[str, List[Tuple[int, str]]]): Occurrences of the contained maplinks.
+    """
+
+    name: str
+    db_Id: int
+    is_overview: bool
+    total_proteins: Dict[str, List[Tuple[int, str]]]
+    total_metabolites: Dict[str, List[Tuple[int, str]]]
+    maplinks: Dict[str, List[Tuple[int, str]]]
@@ -0,0 +1,216 @@
+import bisect
+import hashlib
+import zlib
+from typing import Any, Dict, List, Set, Tuple, TypedDict, Union
+from visMOP.python_scripts.value_codec import encode_value
+
+# hash fields per digest bucket on average, a bucket starts at every field whose crc32 is
+# a multiple of it, so inserting or removing a field changes a single bucket
+DIFF_BUCKET_FIELDS = 64
+# key in the relation database (db 2) of the bucket digests of a hash, by database and hash name
+FIELD_DIGESTS_KEY = "FieldDigests:{}:{}"
+# amount of keys scanned per SCAN call when looking for hashes that were not written again
+DIFF_SCAN_COUNT = 1000
+
+
+class IngestChanges(TypedDict):
+    """
+    A TypedDict that describes the keys or hash fields written by a differential ingest.
+
+    Attributes:
+        added (int): The number of keys or fields that did not exist before.
+        updated (int): The number of existing keys or fields that were written again.
+        removed (int): The number of keys or fields that were deleted.
+        unchanged (int): The number of keys or fields that were skipped as unchanged.
+    """
+
+    added: int
+    updated: int
+    removed: int
+    unchanged: int
+
+
+def no_changes() -> IngestChanges:
+    """Returns empty change counts"""
+    return {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+
+
+def add_changes(total: IngestChanges, changes: IngestChanges) -> None:
+    """Adds the change counts to total"""
+    for count in ("added", "updated", "removed", "unchanged"):
+        total[count] += changes[count]  # type: ignore
+
+
+def content_digest(content: bytes) -> bytes:
+    """Returns the short digest used to tell if stored content changed"""
+    return hashlib.blake2b(content, digest_size=8).digest()
+
+
+class HashDiffWriter:
+    """
+    Writes hashes field by field, skipping the buckets of fields that are already stored.
+
+    The fields of each hash are added in ascending order and split into buckets at fields chosen
+    by their content. The digest of every bucket (its fields, values and bounds) is stored in
+    the relation database, a bucket with the stored digest is not written.
+    The fields of a changed bucket are written and the stored fields in its range that are not
+    part of it anymore are deleted, so the hash ends up as if it was written from scratch.
+
+    Args:
+        r: client of the database of the hashes
+        digest_db: client of the relation database (db 2) holding the digests
+        db: number of the database of the hashes, part of the digest keys
+        key_prefix: prefix of the hash and digest keys, e.g. the staging prefix of an ingest
+        batch_size: amount of hash fields written per pipeline
+    """
+
+    def __init__(
+        self,
+        r: Any,
+        digest_db: Any,
+        db: int,
+        key_prefix: str = "",
+        batch_size: int = 1000,
+    ):
+        self.r = r
+        self.digest_db = digest_db
+        self.db = db
+        self.key_prefix = key_prefix
+        self.batch_size = batch_size
+        self.changes = no_changes()
+        self.round_trips = 0
+        # names of the hashes written so far, without prefix
+        self.names: List[str] = []
+        self._pipe = r.pipeline(transaction=False)
+        self._digest_pipe = digest_db.pipeline(transaction=False)
+        self._pending: Dict[str, Dict[str, bytes]] = {}
+        self._pending_fields = 0
+        self._name: Union[str, None] = None
+        self._start = ""
+        self._items: List[Tuple[str, Any]] = []
+        self._stored_digests: Dict[str, bytes] = {}
+        self._digests: Dict[str, bytes] = {}
+        self._stored_fields: Union[List[str], None] = None
+
+    def _digest_key(self, name: str) -> str:
+        return self.key_prefix + FIELD_DIGESTS_KEY.format(self.db, name)
+
+    def add(self, name: str, field: str, data: Any) -> None:
+        """Adds a field of a hash, the fields of a hash follow each other in ascending order
+
+        Args:
+            name: the hash without prefix
+            field: the field
+            data: json like value of the field, stored with encode_value
+        """
+        if name != self._name:
+            self._finish_hash()
+            self._start_hash(name)
+        elif zlib.crc32(field.encode("utf-8")) % DIFF_BUCKET_FIELDS == 0:
+            self._finish_bucket(field)
+        self._items.append((field, data))
+
+    def finish(self) -> None:
+        """Writes the remaining fields, has to be called after the last field"""
+        self._finish_hash()
+        self._flush()
+
+    def remove_unwritten(self, patterns: List[str]) -> None:
+        """Deletes the stored hashes matching the patterns that were not written
+
+        Args:
+            patterns: redis key patterns without prefix, e.g. UniProt:*
+        """
+        written = set(self.names)
+        for pattern in patterns:
+            for key in list(
+                self.r.scan_iter(match=self.key_prefix + pattern, count=DIFF_SCAN_COUNT)
+            ):
+                name = key.decode("utf-8")[len(self.key_prefix) :]
+                if name not in written:
+                    self.changes["removed"] += self.r.hlen(key)
+                    self.r.delete(key)
+                    self.digest_db.delete(self._digest_key(name))
+
+    def _start_hash(self, name: str) -> None:
+        self._name = name
+        self.names.append(name)
+        self._start = ""
+        self._items = []
+        self._stored_digests = {
+            start.decode("utf-8"): digest
+            for start, digest in self.digest_db.hgetall(self._digest_key(name)).items()
+        }
+        self._digests = {}
+        self._stored_fields = None
+
+    def _finish_hash(self) -> None:
+        if self._name is None:
+            return
+        self._finish_bucket(None)
+        digest_key = self._digest_key(self._name)
+        stale = [start for start in self._stored_digests if start not in self._digests]
+        if stale:
+            self._digest_pipe.hdel(digest_key, *stale)
+        changed = {
+            start: digest
+            for start, digest in self._digests.items()
+            if self._stored_digests.get(start) != digest
+        }
+        if changed:
+            self._digest_pipe.hset(digest_key, mapping=changed)
+        self._name = None
+
+    def _fields_in_range(self, start: str, end: Union[str, None]) -> Set[str]:
+        """Returns the stored fields from start up to end (exclusive), None for the last bucket"""
+        if self._stored_fields is None:
+            # loaded once per hash with a changed bucket
+            self._stored_fields = sorted(
+                field.decode("utf-8")
+                for field in self.r.hkeys(self.key_prefix + self._name)
+            )
+        stored = self._stored_fields
+        first = bisect.bisect_left(stored, start)
+        last = len(stored) if end is None else bisect.bisect_left(stored, end)
+        return set(stored[first:last])
+
+    def _finish_bucket(self, end: Union[str, None]) -> None:
+        digest = hashlib.blake2b(
+            repr((self._start, end)).encode("utf-8"), digest_size=8
+        )
+        for item in self._items:
+            digest.update(repr(item).encode("utf-8"))
+        self._digests[self._start] = digest.digest()
+        if self._stored_digests.get(self._start) == self._digests[self._start]:
+            self.changes["unchanged"] += len(self._items)
+        else:
+            stored = self._fields_in_range(self._start, end)
+            assert self._name is not None
+            name = self.key_prefix + self._name
+            fields = self._pending.setdefault(name, {})
+            for field, data in self._items:
+                fields[field] = encode_value(data)
+                if field in stored:
+                    self.changes["updated"] += 1
+                    stored.discard(field)
+                else:
+                    self.changes["added"] += 1
+            self._pending_fields += len(self._items)
+            if stored:
+                self._pipe.hdel(name, *stored)
+                self.changes["removed"] += len(stored)
+            if self._pending_fields >= self.batch_size:
+                self._flush()
+        if end is not None:
+            self._start = end
+        self._items = []
+
+    def _flush(self) -> None:
+        for name, fields in self._pending.items():
+            if fields:
+                self._pipe.hset(name, mapping=fields)
+        self._pipe.execute()
+        self._digest_pipe.execute()
+        self.round_trips += 1
+        self._pending = {}
+        self._pending_fields = 0
@@ -0,0 +1,133 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Tuple, TypedDict, Union
+from visMOP.python_scripts.omicsTypeDefs import ReactomeQueryEntry
+
+# default amount of mapping records kept per worker
+MAPPING_CACHE_SIZE = 200000
+
+# (id database, organism, query id), e.g. ("UniProt", "Homo_sapiens", "P12345")
+MappingKey = Tuple[str, str, str]
+
+
+class MappingCacheStats(TypedDict):
+    """
+    A TypedDict that describes the statistics of a mapping cache.
+
+    Attributes:
+        entries (int): The number of cached mapping records.
+        max_entries (int): The maximum number of cached mapping records.
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups that had to go to redis.
+        fingerprint (str | None): The reactome release the records belong to.
+    """
+
+    entries: int
+    max_entries: int
+    hits: int
+    misses: int
+    fingerprint: Union[str, None]
+
+
+def copy_entry(entry: ReactomeQueryEntry) -> ReactomeQueryEntry:
+    """Copies a mapping record down to the lists a query modifies"""
+    return {
+        entity_id: {**entity, "pathways": list(entity["pathways"])}  # type: ignore
+        for entity_id, entity in entry.items()
+    }
+
+
+class MappingCache:
+    """
+    A bounded least recently used cache of the id to reactome mapping records.
+
+    The records of one reactome release are cached, a different release fingerprint drops them.
+    IDs that are not in the mapping are cached as None.
+    Stored and returned records are copies, so the measurements a query adds stay with the query.
+
+    Args:
+        max_entries: The maximum number of cached records.
+
+    Attributes:
+        max_entries: The maximum number of cached records.
+        fingerprint: The reactome release of the cached records.
+        hits: The number of lookups answered from the cache.
+        misses: The number of lookups not answered from the cache.
+    """
+
+    def __init__(self, max_entries: int = MAPPING_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.fingerprint: Union[str, None] = None
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[MappingKey, Union[ReactomeQueryEntry, None]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def use_release(self, fingerprint: str) -> None:
+        """Drops all records if they belong to a different reactome release
+
+        Args:
+            fingerprint: release fingerprint of the current reactome data
+        """
+        with self._lock:
+            if fingerprint != self.fingerprint:
+                self._entries.clear()
+                self.fingerprint = fingerprint
+
+    def get_many(
+        self, keys: Iterable[MappingKey]
+    ) -> Dict[MappingKey, Union[ReactomeQueryEntry, None]]:
+        """Looks up mapping records
+
+        Args:
+            keys: keys of the records
+
+        Returns:
+            copies of the cached records by key, keys that are not cached are missing
+        """
+        found: Dict[MappingKey, Union[ReactomeQueryEntry, None]] = {}
+        with self._lock:
+            for key in keys:
+                if key in found:
+                    continue
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    entry = self._entries[key]
+                    found[key] = None if entry is None else copy_entry(entry)
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        return found
+
+    def put_many(
+        self, entries: Dict[MappingKey, Union[ReactomeQueryEntry, None]]
+    ) -> None:
+        """Stores copies of mapping records, evicting the least recently used ones
+
+        Args:
+            entries: records by key, None for ids without mapping
+        """
+        with self._lock:
+            for key, entry in entries.items():
+                self._entries[key] = None if entry is None else copy_entry(entry)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> MappingCacheStats:
+        """Returns the size and hit counters of the cache"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "fingerprint": self.fingerprint,
+            }
+
+    def clear(self) -> None:
+        """Drops all records, e.g. after the reactome data was updated"""
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,100 @@
+import redis
+from typing import Dict, Iterable, List, Tuple, TypedDict
+from visMOP.python_scripts.redis_bulk_loader import RedisBulkLoader
+from visMOP.python_scripts.value_codec import decode_value
+
+# hash of the entities of each pathway per id database and organism in the mapping database (db 0),
+# the inverse of the {id_database}:{organism} mapping hashes
+PATHWAY_ENTITIES_KEY = "PathwayEntities:{}:{}"
+
+# id database the ids of each omics type are mapped with
+OMICS_ID_DATABASES = {
+    "proteomics": "UniProt",
+    "metabolomics": "ChEBI",
+    "transcriptomics": "Ensembl",
+}
+
+PathwayEntities = List[Tuple[str, str]]
+"""
+A list of (query id, reactome entity id) pairs contained in a pathway.
+"""
+
+
+class PathwayCoverage(TypedDict):
+    """
+    A TypedDict that describes the entities of one omics type in a pathway.
+
+    Attributes:
+        total (int): The number of distinct query ids in the pathway.
+        entities (List[Tuple[str, str]]): The (query id, reactome entity id) pairs of the pathway.
+        measured (List[str]): The query ids of the pathway that are part of the uploaded data.
+    """
+
+    total: int
+    entities: PathwayEntities
+    measured: List[str]
+
+
+def get_pathway_entities(
+    r: redis.Redis,
+    id_database: str,
+    organism: str,
+    pathway_ids: List[str],
+    key_prefix: str = "",
+) -> Dict[str, PathwayEntities]:
+    """Looks up the entities of pathways in the reverse index
+
+    Args:
+        r: connection to the mapping database (db 0)
+        id_database: database of the query ids (e.g. UniProt, ChEBI, Ensembl)
+        organism: full name of the organism (e.g. Mus_musculus, Homo_sapiens)
+        pathway_ids: stable ids of the pathways
+        key_prefix: key prefix of the release snapshot, see reactome_release
+
+    Returns:
+        entities by pathway id, pathways without entities are missing
+    """
+    pathway_entities: Dict[str, PathwayEntities] = {}
+    for pathway_id, value in RedisBulkLoader(r, key_prefix=key_prefix).hmget_batches(
+        PATHWAY_ENTITIES_KEY.format(id_database, organism), pathway_ids
+    ):
+        if value is not None:
+            pathway_entities[pathway_id] = decode_value(value)
+    return pathway_entities
+
+
+def get_pathway_coverage(
+    r: redis.Redis,
+    id_database: str,
+    organism: str,
+    pathway_ids: List[str],
+    measured_ids: Iterable[str] = (),
+    key_prefix: str = "",
+) -> Dict[str, PathwayCoverage]:
+    """Returns the entities of pathways and which of them were measured
+
+    Args:
+        r: connection to the mapping database (db 0)
+        id_database: database of the query ids (e.g. UniProt, ChEBI, Ensembl)
+        organism: full name of the organism (e.g. Mus_musculus, Homo_sapiens)
+        pathway_ids: stable ids of the pathways
+        measured_ids: query ids of the uploaded data
+        key_prefix: key prefix of the release snapshot, see reactome_release
+
+    Returns:
+        coverage by pathway id, pathways without entities have a total of 0
+    """
+    measured = set(measured_ids)
+    pathway_entities = get_pathway_entities(
+        r, id_database, organism, pathway_ids, key_prefix
+    )
+    coverage: Dict[str, PathwayCoverage] = {}
+    for pathway_id in pathway_ids:
+        entities = pathway_entities.get(pathway_id, [])
+        query_ids = list(dict.fromkeys(query_id for query_id, _ in entities))
+        coverage[pathway_id] = {
+            "total": len(query_ids),
+            "entities": entities,
+            "measured": [query_id for query_id in query_ids if query_id in measured],
+        }
+    return coverage
@@ -1,11 +1,23 @@
 import json
 import statistics
+import numpy as np
 import pandas as pd
 from operator import itemgetter
-import redis
 
-from typing import List, Dict, DefaultDict, Tuple, Union, Literal, Iterator
+from typing import (
+    Callable,
+    List,
+    Dict,
+    DefaultDict,
+    Deque,
+    Tuple,
+    Union,
+    Literal,
+    Iterator,
+)
 import collections
+import functools
+import sys
 from visMOP.python_scripts.hierarchy_types import (
     HierarchyMetadata,
     OmicMeasurement,
@@ -18,10 +30,47 @@ from visMOP.python_scripts.hierarchy_types import (
     EntityOccurrence,
     HierarchyEntryDict,
     HierarchyEntryMeasurment,
+    PathwayRecord,
 )
 from visMOP.python_scripts.omicsTypeDefs import ReactomeDBEntry
+from visMOP.python_scripts.array_segment import (
+    csr_arrays,
+    decode_arrays,
+    decode_strings,
+    encode_arrays,
+    string_arrays,
+)
+from visMOP.python_scripts.redis_bulk_loader import RedisBulkLoader, LoaderReport
+from visMOP.python_scripts.storage_backend import StorageBackend, get_storage_backend
+from visMOP.python_scripts.value_codec import decode_value
+from visMOP.python_scripts.reactome_release import (
+    decode_relations,
+    get_active_prefix,
+    get_release_fingerprint,
+)
+from visMOP.python_scripts.diagram_store import (
+    DiagramStore,
+    get_diagram_store,
+    format_graph_json,
+    empty_graph_json,
+)
 
 from visMOP.python_scripts.timeseries_analysis import get_regression_data
+from visMOP.python_scripts.sparse_aggregation import (
+    AGGREGATED_FIELDS,
+    OMICS,
+    AggregationIndex,
+    SparseAggregation,
+)
+
+# amount of diagrams requested from redis per round trip when building a hierarchy template
+DIAGRAM_BATCH_SIZE = 100
+# hash in the relation database (db 2) containing the precomputed records of an organisms pathways
+PATHWAY_RECORDS_KEY = "PathwayRecords:{}"
+# key in the relation database containing the precomputed structure of an organisms hierarchy
+HIERARCHY_STRUCTURE_KEY = "HierarchyStructure:{}"
+# structure records of other versions are ignored and the relations are parsed instead
+HIERARCHY_STRUCTURE_VERSION = 1
 
 stat_vals = {
     "common": [
@@ -220,63 +269,134 @@ def get_PathwaySummaryData_omic(
     return pathway_summary_data
 
 
-class ReactomePathway:
-    """Pathway Class for ractome pathway entries
+def compact_occurrences(
+    entities: Dict[str, Dict[int, EntityOccurrence]],
+) -> Dict[str, List[Tuple[int, str]]]:
+    """Converts entity occurrences to lists of (internalID, stableID) pairs"""
+    return {
+        entity_id: [
+            (occurrence["internalID"], occurrence["stableID"])
+            for occurrence in occurrences.values()
+        ]
+        for entity_id, occurrences in entities.items()
+    }
+
+
+def expand_occurrences(
+    entities: Dict[str, List[Tuple[int, str]]],
+) -> Dict[str, Dict[int, EntityOccurrence]]:
+    """Converts (internalID, stableID) pairs back to entity occurrences"""
+    # entities occur in many pathways, intern their ids to store each only once
+    return {
+        sys.intern(entity_id): {
+            internal_id: {"internalID": internal_id, "stableID": sys.intern(stable_id)}
+            for internal_id, stable_id in occurrences
+        }
+        for entity_id, occurrences in entities.items()
+    }
+
+
+class ReactomePathwayTemplate:
+    """Static pathway entry of a reactome hierarchy template
+
+    Holds all data of a pathway that only depends on the organism and the reactome release.
+    Entries are shared by all requests and must not be modified once the template is built.
 
     Args:
         Reactome_sID: Stable Reactome ID for pathway
+        has_diagram: if the pathway has its own diagram files
 
     """
 
+    __slots__ = (
+        "is_root",
+        "is_leaf",
+        "has_diagram",
+        "is_overview",
+        "name",
+        "diagram_store",
+        "reactome_sID",
+        "db_Id",
+        "children",
+        "diagram_entry",
+        "total_proteins",
+        "total_metabolites",
+        "maplinks",
+        "parents",
+        "level",
+        "root_id",
+        "subtree_ids",
+        "subtree_leaves",
+        "subtree_non_overview",
+    )
+
     def __init__(self, reactome_sID: str, has_diagram: bool):
         self.is_root: bool = False
         self.is_leaf: bool = False
-        self.has_data: bool = False
         self.has_diagram: bool = has_diagram
         self.is_overview: bool = True
         self.name: str = ""
-        self.layout_json_file: Dict[str, str] = {}
-        self.graph_json_file: ModifiedReactomeGraphJSON = {
-            "nodes": {},
-            "edges": {},
-            "subpathways": {},
-            "dbId": 0,
-            "stId": "",
-        }
+        # diagram files are not kept on the entry but loaded on access
+        self.diagram_store: Union[DiagramStore, None] = None
         self.reactome_sID: str = reactome_sID
         self.db_Id: int = 0
-        self.children: List[str] = []
-        self.children_with_data: List[str] = []
-        self.subtree_ids: List[str] = []
-        self.diagram_entry: Union[ReactomePathway, None] = None
-        self.own_measured_proteins: List[str] = []
-        self.own_measured_genes: List[str] = []
-        self.own_measured_metabolites: List[str] = []
-        self.own_measured_maplinks: List[str] = []
-        self.total_measured_proteins: Dict[str, OmicMeasurement] = {}
-        self.total_measured_genes: Dict[str, OmicMeasurement] = {}
-        self.total_measured_metabolites: Dict[str, OmicMeasurement] = {}
-        self.total_measured_maplinks: Dict[str, OmicMeasurement] = {}
-        self.subdiagrams_measured_proteins: Dict[
-            Union[str, int], SubdiagramOmicEntry
-        ] = {}
-        self.subdiagrams_measured_genes: Dict[Union[str, int], SubdiagramOmicEntry] = {}
-        self.subdiagrams_measured_metabolites: Dict[
-            Union[str, int], SubdiagramOmicEntry
-        ] = {}
-        self.subdiagrams_measured_maplinks: Dict[
-            Union[str, int], SubdiagramOmicEntry
-        ] = {}
+        # relations are tuples of interned ids, set once while loading the hierarchy
+        self.children: Tuple[str, ...] = ()
+        self.diagram_entry: Union[ReactomePathwayTemplate, None] = None
         self.total_proteins: Dict[str, Dict[int, EntityOccurrence]] = {}
         self.total_metabolites: Dict[str, Dict[int, EntityOccurrence]] = {}
         self.maplinks: Dict[str, Dict[int, EntityOccurrence]] = {}
-        self.parents: List[str] = []
-        self.parents_with_data: List[str] = []
+        self.parents: Tuple[str, ...] = ()
         self.level: int = -1
         self.root_id: str = ""
+        # descendant closures, see ReactomeHierarchyTemplate.add_subtree_index
+        self.subtree_ids: Tuple[str, ...] = ()
+        self.subtree_leaves: Tuple[str, ...] = ()
+        self.subtree_non_overview: Tuple[str, ...] = ()
 
     __getitem__ = object.__getattribute__
 
+    @property
+    def layout_json_file(self) -> Dict[str, str]:
+        """Layout json of the pathway diagram, loaded on first access"""
+        if self.diagram_store is None:
+            return {}
+        return self.diagram_store.get(self.reactome_sID)[0]
+
+    @property
+    def graph_json_file(self) -> ModifiedReactomeGraphJSON:
+        """Formatted graph json of the pathway diagram, loaded on first access"""
+        if self.diagram_store is None:
+            return empty_graph_json()
+        return self.diagram_store.get(self.reactome_sID)[1]
+
+    def record_data(self) -> PathwayRecord:
+        """Returns the diagram derived data of the pathway
+
+        occurrences are stored as (internalID, stableID) pairs to keep the record compact
+        """
+        return {
+            "name": self.name,
+            "db_Id": self.db_Id,
+            "is_overview": self.is_overview,
+            "total_proteins": compact_occurrences(self.total_proteins),
+            "total_metabolites": compact_occurrences(self.total_metabolites),
+            "maplinks": compact_occurrences(self.maplinks),
+        }
+
+    def to_record(self) -> str:
+        """Serializes the diagram derived data of the pathway as json"""
+        return json.dumps(self.record_data(), separators=(",", ":"))
+
+    def apply_record(self, record: PathwayRecord) -> None:
+        """Sets the diagram derived data from a deserialized pathway record"""
+        self.name = record["name"]
+        self.db_Id = record["db_Id"]
+        self.is_overview = record["is_overview"]
+        self.total_proteins = expand_occurrences(record["total_proteins"])
+        self.total_metabolites = expand_occurrences(record["total_metabolites"])
+        self.maplinks = expand_occurrences(record["maplinks"])
+
     def asdict(self):
         """Returns Object as dictionary"""
         return {
@@ -297,59 +417,379 @@ class ReactomePathway:
             self.is_root = True
 
 
-class ReactomeHierarchy(dict[str, ReactomePathway]):
-    """Class for pathway hierarchy
+# per request containers of ReactomePathway and their empty value
+OVERLAY_CONTAINERS: Dict[str, Callable[[], Union[list, dict]]] = {
+    "children_with_data": list,
+    "parents_with_data": list,
+    **{"own_measured_" + omic: list for omic in OMICS},
+    **{"total_measured_" + omic: dict for omic in OMICS},
+    **{"subdiagrams_measured_" + omic: dict for omic in OMICS},
+}
+# template attributes of ReactomePathway that can be replaced per request
+OVERLAY_REPLACEABLE = frozenset(["name", "total_proteins", "total_metabolites"])
+
+
+class ReactomePathway:
+    """Pathway Class for ractome pathway entries
+
+    Per request overlay of a ReactomePathwayTemplate. Only the query dependent state
+    (measured entities, subdiagram data, data flags) is stored on the overlay itself,
+    every other attribute is read from the template. Assigning a template attribute
+    (e.g. name or total_proteins during aggregation) stores the new value on the overlay
+    and leaves the template untouched.
+
+    Args:
+        template: static pathway entry of the hierarchy template
 
-    functions as main datastructure for reactome data
     """
 
-    def __getitem__(self, key: str) -> ReactomePathway:
+    __slots__ = (
+        "template",
+        "has_data",
+        "diagram_entry",
+        "sparse_aggregation",
+        "children_with_data",
+        "parents_with_data",
+        "own_measured_proteins",
+        "own_measured_genes",
+        "own_measured_metabolites",
+        "own_measured_maplinks",
+        "total_measured_proteins",
+        "total_measured_genes",
+        "total_measured_metabolites",
+        "total_measured_maplinks",
+        "subdiagrams_measured_proteins",
+        "subdiagrams_measured_genes",
+        "subdiagrams_measured_metabolites",
+        "subdiagrams_measured_maplinks",
+        # template attributes that can be replaced per request
+        "name",
+        "total_proteins",
+        "total_metabolites",
+    )
+    template: ReactomePathwayTemplate
+    has_data: bool
+    diagram_entry: Union["ReactomePathway", None]
+    sparse_aggregation: Union[SparseAggregation, None]
+    children_with_data: List[str]
+    parents_with_data: List[str]
+    own_measured_proteins: List[str]
+    own_measured_genes: List[str]
+    own_measured_metabolites: List[str]
+    own_measured_maplinks: List[str]
+    total_measured_proteins: Dict[str, OmicMeasurement]
+    total_measured_genes: Dict[str, OmicMeasurement]
+    total_measured_metabolites: Dict[str, OmicMeasurement]
+    total_measured_maplinks: Dict[str, OmicMeasurement]
+    subdiagrams_measured_proteins: Dict[Union[str, int], SubdiagramOmicEntry]
+    subdiagrams_measured_genes: Dict[Union[str, int], SubdiagramOmicEntry]
+    subdiagrams_measured_metabolites: Dict[Union[str, int], SubdiagramOmicEntry]
+    subdiagrams_measured_maplinks: Dict[Union[str, int], SubdiagramOmicEntry]
+
+    def __init__(self, template: ReactomePathwayTemplate):
+        self.template = template
+        self.has_data = False
+        self.diagram_entry = None
+        self.sparse_aggregation = None
+        # the containers are only allocated when first accessed (see __getattr__),
+        # most pathways of a request never receive any data
+
+    def __getattr__(self, name: str):
+        # only called for attributes not set on the overlay, read them from the template
+        # the template itself is never looked up here (e.g. while unpickling)
+        if name == "template":
+            raise AttributeError(name)
+        if name in AGGREGATED_FIELDS and self.sparse_aggregation is not None:
+            # results of the sparse aggregation are built on first access
+            value = self.sparse_aggregation.materialize(self.reactome_sID, name)
+        elif name in OVERLAY_CONTAINERS:
+            value = OVERLAY_CONTAINERS[name]()
+        elif name in OVERLAY_REPLACEABLE:
+            # keep the template value, it may be built on access (see shared_hierarchy)
+            value = getattr(self.template, name)
+        else:
+            return getattr(self.template, name)
+        setattr(self, name, value)
+        return value
+
+    def __getitem__(self, key: str):
+        return getattr(self, key)
+
+    def overlay_state(self) -> Dict[str, object]:
+        """Returns the per request attributes set on the overlay, e.g. for pickling
+
+        Template values cached on the overlay are left out, as well as the diagram entry,
+        which is linked again when the hierarchy is restored.
+        """
+        state: Dict[str, object] = {}
+        for name in ReactomePathway.__slots__:
+            if name in ("template", "diagram_entry"):
+                continue
+            try:
+                value = object.__getattribute__(self, name)
+            except AttributeError:
+                continue
+            if name in OVERLAY_REPLACEABLE:
+                template_value = getattr(self.template, name)
+                if value is template_value or value == template_value:
+                    continue
+            state[name] = value
+        return state
+
+
+class ReactomeHierarchyTemplate(dict[str, ReactomePathwayTemplate]):
+    """Static pathway hierarchy of one organism
+
+    Contains the hierarchy structure and the diagram derived data, which only depend on the
+    organism and the reactome release. A template is built once per worker (see hierarchy_store)
+    and shared by all ReactomeHierarchy instances, thus it must not be modified after building.
+
+    Args:
+        organism: 3 letter abbrev for target organism
+        key_prefix: prefix of the redis keys to read, e.g. of data staged during ingest,
+            None to read the active release (see reactome_release)
+        storage: storage backend to build with, None for the process wide backend of the server
+    """
+
+    def __getitem__(self, key: str) -> ReactomePathwayTemplate:
         return super().__getitem__(key)
 
     def __init__(
         self,
-        redis_host: str,
-        redis_port: int,
-        redis_pw: str,
-        metadata: HierarchyMetadata,
+        organism: str,
+        redis_host: str = "localhost",
+        redis_port: int = 6379,
+        redis_pw: str = "",
+        batch_size: int = DIAGRAM_BATCH_SIZE,
+        key_prefix: Union[str, None] = None,
+        storage: Union[StorageBackend, None] = None,
     ) -> None:
-        super(ReactomeHierarchy, self).__init__()
+        super(ReactomeHierarchyTemplate, self).__init__()
+        self.organism = organism
         self.redis_host = redis_host
         self.redis_port = redis_port
         self.redis_pw = redis_pw
+        self.batch_size = batch_size
+        self.key_prefix = key_prefix
+        self.storage = (
+            storage
+            if storage is not None
+            else get_storage_backend(redis_host, redis_port, redis_pw)
+        )
         self.levels: Dict[int, List[str]] = {}
-        self.omics_recieved: List[bool] = []
-        self.amt_timesteps: int = metadata["amt_timesteps"]
-        self.omics_recieved = metadata["omics_recieved"]
-        self.load_data(metadata["target_organism"])
-        self.add_json_data()
+        self.topological_order: List[str] = []
+        self.fingerprint: str = ""
+        # segment file the template is attached to, see shared_hierarchy
+        self.segment_path: Union[str, None] = None
+        self.load_report: Union[LoaderReport, None] = None
+
+    def build(self, use_records: bool = True) -> None:
+        """Loads the hierarchy structure and the diagram data from redis
+
+        Args:
+            use_records: use the structure and pathway records precomputed during ingest
+                if available, otherwise the relations are parsed and the contained entities
+                are derived from the diagram files
+        """
+        # db 1 contains the diagram files, db 2 the pathway relations
+        relation_db = self.storage.client(2)
+        if self.key_prefix is None:
+            self.key_prefix = get_active_prefix(relation_db)
+        diagram_loader = RedisBulkLoader(
+            self.storage.client(1), self.batch_size, self.key_prefix
+        )
+        relation_loader = RedisBulkLoader(relation_db, key_prefix=self.key_prefix)
+        structure = (
+            relation_loader.get(HIERARCHY_STRUCTURE_KEY.format(self.organism))
+            if use_records
+            else None
+        )
+        if structure is None or not self.apply_structure_record(structure):
+            self.load_data(self.organism, relation_loader, diagram_loader)
+        self.fingerprint = get_release_fingerprint(
+            relation_loader.client, self.key_prefix
+        )
+        records = (
+            relation_loader.hgetall(PATHWAY_RECORDS_KEY.format(self.organism))
+            if use_records
+            else {}
+        )
+        if records:
+            self.add_pathway_records(records)
+        else:
+            self.add_json_data(diagram_loader)
+        self.add_subtree_index()
+        diagram_report = diagram_loader.report()
+        relation_report = relation_loader.report()
+        self.load_report = {
+            "round_trips": diagram_report["round_trips"]
+            + relation_report["round_trips"],
+            "keys_requested": diagram_report["keys_requested"]
+            + relation_report["keys_requested"],
+            "elapsed_seconds": diagram_report["elapsed_seconds"],
+        }
+        print(
+            "built {} hierarchy with {} pathways: {} redis round trips, {:.2f}s".format(
+                self.organism,
+                len(self),
+                self.load_report["round_trips"],
+                self.load_report["elapsed_seconds"],
+            )
+        )
 
     def add_hierarchy_levels(self) -> None:
         """Adds hierarchy levels to all entries.
         With 0 Being root and each increase is one level further
+
+        The level of an entry is the length of its shortest path to a root, assigned by a
+        breadth first search from all roots. If several roots are equally close,
+        the root_id is the smallest of their ids.
+        Raises a ValueError if the relations contain a cycle.
         """
-        for k, v in self.items():
-            final_entries: List[List[str]] = []
-            self._hierarchy_levels_recursion(k, [], final_entries)
-            shortest_path: List[str] = min(final_entries, key=len)
-            level: int = len(shortest_path) - 1
-            v.level = level
-            v.root_id = shortest_path[level]
-            if level in self.levels:
-                self.levels[level].append(v.reactome_sID)
+        self.add_topological_order()
+        roots: List[str] = sorted(k for k, v in self.items() if v.is_root)
+        for root in roots:
+            self[root].level = 0
+            self[root].root_id = root
+        queue: Deque[str] = collections.deque(roots)
+        while queue:
+            current_entry = self[queue.popleft()]
+            for child in current_entry.children:
+                child_entry = self[child]
+                if child_entry.level == -1:
+                    child_entry.level = current_entry.level + 1
+                    child_entry.root_id = current_entry.root_id
+                    queue.append(child)
+                elif (
+                    child_entry.level == current_entry.level + 1
+                    and current_entry.root_id < child_entry.root_id
+                ):
+                    child_entry.root_id = current_entry.root_id
+        for v in self.values():
+            if v.level in self.levels:
+                self.levels[v.level].append(v.reactome_sID)
             else:
-                self.levels[level] = [v.reactome_sID]
+                self.levels[v.level] = [v.reactome_sID]
 
-    def _hierarchy_levels_recursion(
-        self, entry_id: str, path: List[str], final_entries: List[List[str]]
-    ) -> None:
-        current_entry: ReactomePathway = self[entry_id]
-        path.append(entry_id)
-        if self[entry_id].is_root:
-            final_entries.append(path)
-        else:
-            for parent in current_entry.parents:
-                self._hierarchy_levels_recursion(parent, path, final_entries)
+    def add_topological_order(self) -> None:
+        """Orders all entries such that parents come before their children
+
+        Raises a ValueError if the relations contain a cycle.
+        """
+        remaining_parents: Dict[str, int] = {k: len(v.parents) for k, v in self.items()}
+        queue: Deque[str] = collections.deque(
+            k for k, v in remaining_parents.items() if v == 0
+        )
+        topological_order: List[str] = []
+        while queue:
+            entry_id = queue.popleft()
+            topological_order.append(entry_id)
+            for child in self[entry_id].children:
+                remaining_parents[child] -= 1
+                if remaining_parents[child] == 0:
+                    queue.append(child)
+        if len(topological_order) != len(self):
+            in_cycle = sorted(k for k, v in remaining_parents.items() if v > 0)
+            raise ValueError(
+                "Pathway relations of {} contain a cycle, affected pathways: {}".format(
+                    self.organism, ", ".join(in_cycle)
+                )
+            )
+        self.topological_order = topological_order
+
+    def to_structure_record(self) -> bytes:
+        """Serializes the hierarchy structure, see array_segment.encode_arrays
+
+        Contains the pathway ids in template order, the relations, levels, roots,
+        topological order and the leaf, root and diagram flags. Pathways are referred to
+        by their position in the pathway ids.
+        """
+        position = {pathway_id: num for num, pathway_id in enumerate(self)}
+        entries = list(self.values())
+        arrays = {
+            **string_arrays("pathway_ids", list(self)),
+            **csr_arrays(
+                "children",
+                [[position[child] for child in entry.children] for entry in entries],
+                np.int32,
+            ),
+            **csr_arrays(
+                "parents",
+                [[position[parent] for parent in entry.parents] for entry in entries],
+                np.int32,
+            ),
+            "levels": np.array([entry.level for entry in entries], dtype=np.int32),
+            "root_ids": np.array(
+                [position[entry.root_id] for entry in entries], dtype=np.int32
+            ),
+            "topological_order": np.array(
+                [position[pathway_id] for pathway_id in self.topological_order],
+                dtype=np.int32,
+            ),
+            "flags": np.array(
+                [
+                    entry.has_diagram | entry.is_root << 1 | entry.is_leaf << 2
+                    for entry in entries
+                ],
+                dtype=np.uint8,
+            ),
+        }
+        return encode_arrays(
+            arrays,
+            {"organism": self.organism, "version": HIERARCHY_STRUCTURE_VERSION},
+        )
+
+    def apply_structure_record(self, record: bytes) -> bool:
+        """Creates the entries of the template from a structure record written during ingest
+
+        Replaces load_data, the levels and the topological order are taken from the record.
+
+        Args:
+            record: serialized structure, see to_structure_record
+
+        Returns:
+            False if the record has another version and was not applied
+        """
+        metadata, arrays = decode_arrays(record)
+        if metadata.get("version") != HIERARCHY_STRUCTURE_VERSION:
+            return False
+        pathway_ids = decode_strings(arrays, "pathway_ids")
+        children, children_indptr = (
+            arrays["children"].tolist(),
+            arrays["children_indptr"].tolist(),
+        )
+        parents, parents_indptr = (
+            arrays["parents"].tolist(),
+            arrays["parents_indptr"].tolist(),
+        )
+        levels = arrays["levels"].tolist()
+        root_ids = arrays["root_ids"].tolist()
+        flags = arrays["flags"].tolist()
+        for num, pathway_id in enumerate(pathway_ids):
+            entry = ReactomePathwayTemplate(pathway_id, bool(flags[num] & 1))
+            entry.is_root = bool(flags[num] & 2)
+            entry.is_leaf = bool(flags[num] & 4)
+            entry.children = tuple(
+                pathway_ids[child]
+                for child in children[children_indptr[num] : children_indptr[num + 1]]
+            )
+            entry.parents = tuple(
+                pathway_ids[parent]
+                for parent in parents[parents_indptr[num] : parents_indptr[num + 1]]
+            )
+            entry.level = levels[num]
+            entry.root_id = pathway_ids[root_ids[num]]
+            self[pathway_id] = entry
+            self.levels.setdefault(entry.level, []).append(pathway_id)
+        self.topological_order = [
+            pathway_ids[num] for num in arrays["topological_order"].tolist()
+        ]
+        return True
+
+    @functools.cached_property
+    def aggregation_index(self) -> AggregationIndex:
+        """Static data of the sparse aggregation, built on first use"""
+        return AggregationIndex(self)
 
     def hierarchyInfo(self) -> Dict[str, int]:
         """Prints info about hierarchy"""
@@ -358,84 +798,97 @@ class ReactomeHierarchy(dict[str, ReactomePathway]):
         roots: int = len([v for v in self.values() if v.is_root])
         return {"size": entries, "leafs": leafs, "roots": roots}
 
-    def generate_parents_children_with_data(self) -> None:
-        for entry in self.values():
-            for parent_entry in entry.parents:
-                entryObject: ReactomePathway = self[parent_entry]
-                if entryObject.has_data:
-                    entry.parents_with_data.append(parent_entry)
-            for child_entry in entry.children:
-                entryObject: ReactomePathway = self[child_entry]
-                if entryObject.has_data:
-                    entry.children_with_data.append(child_entry)
-
-    def add_json_data(self) -> None:
-        """Adds json data to the pathways
+    def _assign_diagrams(self) -> DefaultDict[str, List[str]]:
+        """Connects the pathways to their diagrams
 
-        this includes names, aswell as detail level pathway information
+        Pathways with diagram get a handle to load their diagram files,
+        pathways without one are assigned to the closest diagram above them.
 
-        Args:
-            json_path: path at which to find the json diagram files
+        Returns:
+            dictionary of pathways with diagram and the pathways assigned to them
         """
-        current_level = 0
         key_list = list(self.levels.keys())
         key_list.sort()
-        # connect to diagram redis
-        r = redis.Redis(
-            host=self.redis_host,
-            port=self.redis_port,
-            db=1,
-            password=self.redis_pw,
+        diagram_store = get_diagram_store(
+            self.redis_host, self.redis_port, self.redis_pw, self.key_prefix or ""
         )
+        subpathways: DefaultDict[str, List[str]] = collections.defaultdict(list)
         for current_level in key_list:
-            current_level_ids: List[str] = self.levels[current_level]
-            for key in current_level_ids:
-                entry: ReactomePathway = self[key]
+            for key in self.levels[current_level]:
+                entry: ReactomePathwayTemplate = self[key]
                 if entry.has_diagram:
-                    redis_query = r.get(key)
-                    if redis_query is not None:
-                        json_file_layout = json.loads(redis_query.decode("utf-8"))
-                        entry.layout_json_file = json_file_layout
-                        entry.name = json_file_layout["displayName"]
+                    entry.diagram_store = diagram_store
+                    # make sure every diagram is listed, even without subpathways
+                    subpathways[key]
+                else:
+                    entries_with_diagram: List[Tuple[str, int]] = []
+                    self._find_diagram_recursion(key, entries_with_diagram, 0)
+                    shortest_path_key = min(entries_with_diagram, key=itemgetter(1))[0]
+                    entry.diagram_entry = self[shortest_path_key]
+                    subpathways[shortest_path_key].append(key)
+        return subpathways
+
+    def add_pathway_records(self, records: Dict[bytes, bytes]) -> None:
+        """Adds the pathway records precomputed during ingest to the pathways
 
+        Args:
+            records: serialized records by pathway id, see ReactomePathwayTemplate.to_record
+        """
+        self._assign_diagrams()
+        for key, record in records.items():
+            pathway_id = key.decode("utf-8")
+            if pathway_id in self:
+                entry = self[pathway_id]
+                entry.apply_record(decode_value(record))
                 if entry.has_diagram:
-                    redis_query = r.get(key + ".graph")
-                    if redis_query is not None:
-                        json_file_graph: ReactomeGraphJSON = json.loads(
-                            redis_query.decode("utf-8")
-                        )
-                        json_file_mod: ModifiedReactomeGraphJSON = format_graph_json(
-                            json_file_graph
-                        )
-                        entry.graph_json_file = json_file_mod
-                        (
-                            prot,
-                            molec,
-                            contained_maplinks,
-                            is_overview,
-                        ) = get_contained_entities_graph_json(
-                            list(entry.graph_json_file["nodes"].keys()),
-                            entry.graph_json_file,
-                        )
-                        entry.total_proteins = prot
-                        entry.total_metabolites = molec
-                        entry.diagram_entry = entry
-                        entry.maplinks = contained_maplinks
-                        entry.is_overview = is_overview
-                        entry.db_Id = entry.graph_json_file["dbId"]
+                    entry.diagram_entry = entry
 
-        current_level = 0
+    def add_json_data(self, diagram_loader: RedisBulkLoader) -> None:
+        """Adds json data to the pathways
 
-        for current_level in key_list:
-            current_level_ids = self.levels[current_level]
+        this includes names, aswell as detail level pathway information.
+        The diagram files are only decoded to derive the contained entities,
+        entries keep a handle to load them again on demand.
 
-            for key in current_level_ids:
-                entry = self[key]
-                if not entry.has_diagram:
-                    entries_with_diagram: List[Tuple[str, int]] = []
-                    self._find_diagram_recursion(key, entries_with_diagram, 0)
-                    shortest_path_key = min(entries_with_diagram, key=itemgetter(1))[0]
-                    entry_with_diagram = self[shortest_path_key]
+        Args:
+            diagram_loader: bulk loader for the diagram database
+        """
+        # pathways without own diagram get their entities from the closest diagram above them
+        subpathways = self._assign_diagrams()
+        diagram_keys: List[str] = list(subpathways.keys())
+
+        # layout and graph file of each diagram are requested together in batches
+        for key, (layout_query, graph_query) in diagram_loader.mget_batches(
+            diagram_keys, ("", ".graph")
+        ):
+            entry = self[key]
+            if layout_query is not None:
+                json_file_layout = decode_value(layout_query)
+                entry.name = json_file_layout["displayName"]
+
+            if graph_query is not None:
+                json_file_graph: ReactomeGraphJSON = decode_value(graph_query)
+                json_file_mod: ModifiedReactomeGraphJSON = format_graph_json(
+                    json_file_graph
+                )
+                (
+                    prot,
+                    molec,
+                    contained_maplinks,
+                    is_overview,
+                ) = get_contained_entities_graph_json(
+                    list(json_file_mod["nodes"].keys()),
+                    json_file_mod,
+                )
+                entry.total_proteins = prot
+                entry.total_metabolites = molec
+                entry.diagram_entry = entry
+                entry.maplinks = contained_maplinks
+                entry.is_overview = is_overview
+                entry.db_Id = json_file_mod["dbId"]
+
+                for subpathway_key in subpathways[key]:
+                    subpathway_entry = self[subpathway_key]
                     (
                         prot,
                         molec,
@@ -444,21 +897,20 @@ class ReactomeHierarchy(dict[str, ReactomePathway]):
                         name,
                         db_Id,
                     ) = get_subpathway_entities_graph_json(
-                        entry_with_diagram.graph_json_file, key
+                        json_file_mod, subpathway_key
                     )
-                    entry.diagram_entry = entry_with_diagram
-                    entry.name = name
-                    entry.db_Id = db_Id
-                    entry.total_proteins = prot
-                    entry.total_metabolites = molec
-                    entry.maplinks = contained_maplinks
-                    entry.is_overview = is_overview
+                    subpathway_entry.name = name
+                    subpathway_entry.db_Id = db_Id
+                    subpathway_entry.total_proteins = prot
+                    subpathway_entry.total_metabolites = molec
+                    subpathway_entry.maplinks = contained_maplinks
+                    subpathway_entry.is_overview = is_overview
 
     def _find_diagram_recursion(
         self, entry_id: str, final_entries: List[Tuple[str, int]], steps: int
     ) -> None:
         arrived_at_diagram = False
-        current_entry: ReactomePathway = self[entry_id]
+        current_entry: ReactomePathwayTemplate = self[entry_id]
 
         arrived_at_diagram: bool = current_entry.has_diagram
         if arrived_at_diagram:
@@ -471,197 +923,367 @@ class ReactomeHierarchy(dict[str, ReactomePathway]):
                 if not arrived_at_diagram:
                     print("did not find diagram for: ", entry_id)
 
-    def aggregate_pathways(self) -> None:
-        """Aggregates data from low level nodes to higher level nodes
+    def add_subtree_index(self) -> None:
+        """Precomputes the descendant closures of all entries
 
-        as the supplied omics data is only mapped to leaf nodes, data has to be aggregated to the higher level nodes
+        Every entry gets its subtree (all descendants and itself), the leaves of its subtree
+        and its non overview subtree (see get_subtree_non_overview) as tuples.
+        The closures are assembled from the closures of the children in reverse topological order,
+        subtrees are ordered descendants first. Has to be called after the overview state is known.
         """
-        # sort levels descending that propagation is correctly from the leaves to the root nodes
-        # still strange bug that some insanely high levels > 20,50 are encountered
-        levels_descending: List[int] = sorted(self.levels.keys(), reverse=True)
-        for level in levels_descending:
-            for entry_key in self.levels[level]:
-                v: ReactomePathway = self[entry_key]
-                # if not v.is_leaf:
-                subtree: List[str] = self.get_subtree_target(v.reactome_sID)
-                own_measured_proteins: List[str] = list(set(v.own_measured_proteins))
-                own_measured_genes: List[str] = list(set(v.own_measured_genes))
-                own_measured_metabolites: List[str] = list(
-                    set(v.own_measured_metabolites)
+        for entry_id in reversed(self.topological_order):
+            entry = self[entry_id]
+            subtree_ids: Dict[str, None] = {}
+            subtree_leaves: Dict[str, None] = {}
+            subtree_non_overview: Dict[str, None] = {}
+            for child in entry.children:
+                child_entry = self[child]
+                subtree_ids.update(dict.fromkeys(child_entry.subtree_ids))
+                subtree_leaves.update(dict.fromkeys(child_entry.subtree_leaves))
+                subtree_non_overview.update(
+                    dict.fromkeys(child_entry.subtree_non_overview)
                 )
-                own_measured_maplinks: List[str] = list(set(v.own_measured_maplinks))
-                total_measured_proteins: Dict[
-                    str, OmicMeasurement
-                ] = v.total_measured_proteins
-                total_measured_genes: Dict[
-                    str, OmicMeasurement
-                ] = v.total_measured_genes
-                total_measured_metabolites: Dict[
-                    str, OmicMeasurement
-                ] = v.total_measured_metabolites
-                total_measured_maplinks: Dict[
-                    str, OmicMeasurement
-                ] = v.total_measured_maplinks  # ?
-                subdiagrams_measured_proteins: Dict[
-                    Union[str, int], SubdiagramOmicEntry
-                ] = {}
-                subdiagrams_measured_genes: Dict[
-                    Union[str, int], SubdiagramOmicEntry
-                ] = {}
-                subdiagrams_measured_metabolites: Dict[
-                    Union[str, int], SubdiagramOmicEntry
-                ] = {}
-                subdiagrams_measured_maplinks: Dict[
-                    Union[str, int], SubdiagramOmicEntry
-                ] = {}  # ?
-                total_proteins: Dict[
-                    str, Dict[int, EntityOccurrence]
-                ] = v.total_proteins
-                total_metabolites: Dict[
-                    str, Dict[int, EntityOccurrence]
-                ] = v.total_metabolites
-                subtree_ids = subtree
-                subtree_ids.append(v.reactome_sID)
-                v.subtree_ids = subtree_ids
-
-                for node in v.children:
-                    current_node = self[node]
-                    if current_node.has_diagram:
-                        # current_node.db_Id is only internal ID, later we might also need the stable id
-                        if len(current_node.total_measured_proteins.keys()) > 0:
-                            subdiagrams_measured_proteins[current_node.db_Id] = {
-                                "stableID": current_node.reactome_sID,
-                                "nodes": list(
-                                    current_node.total_measured_proteins.keys()
-                                ),
-                            }
-                        if len(current_node.total_measured_genes.keys()) > 0:
-                            subdiagrams_measured_genes[current_node.db_Id] = {
-                                "stableID": current_node.reactome_sID,
-                                "nodes": list(current_node.total_measured_genes.keys()),
-                            }
-                        if len(current_node.total_measured_metabolites.keys()) > 0:
-                            subdiagrams_measured_metabolites[current_node.db_Id] = {
-                                "stableID": current_node.reactome_sID,
-                                "nodes": list(
-                                    current_node.total_measured_metabolites.keys()
-                                ),
-                            }
-                        if len(current_node.total_measured_maplinks.keys()) > 0:
-                            subdiagrams_measured_maplinks[current_node.db_Id] = {
-                                "stableID": current_node.reactome_sID,
-                                "nodes": list(
-                                    current_node.total_measured_maplinks.keys()
-                                ),
-                            }
-                    else:
-                        own_measured_proteins = list(
-                            set(
-                                own_measured_proteins
-                                + current_node.own_measured_proteins
-                            )
-                        )
-                        own_measured_genes = list(
-                            set(own_measured_genes + current_node.own_measured_genes)
-                        )
-                        own_measured_metabolites = list(
-                            set(
-                                own_measured_metabolites
-                                + current_node.own_measured_metabolites
-                            )
-                        )
-                        own_measured_maplinks = list(
-                            set(
-                                own_measured_maplinks
-                                + current_node.own_measured_maplinks
-                            )
-                        )
+            subtree_ids[entry_id] = None
+            entry.subtree_ids = tuple(subtree_ids)
+            entry.subtree_leaves = (
+                (entry_id,) if entry.is_leaf else tuple(subtree_leaves)
+            )
+            entry.subtree_non_overview = (
+                (entry_id,)
+                if not entry.is_overview and not entry.is_root
+                else tuple(subtree_non_overview)
+            )
 
-                    subdiagrams_measured_proteins = {
-                        **subdiagrams_measured_proteins,
-                        **current_node.subdiagrams_measured_proteins,
-                    }
-                    subdiagrams_measured_genes = {
-                        **subdiagrams_measured_genes,
-                        **current_node.subdiagrams_measured_genes,
-                    }
-                    subdiagrams_measured_metabolites = {
-                        **subdiagrams_measured_metabolites,
-                        **current_node.subdiagrams_measured_metabolites,
-                    }
-                    subdiagrams_measured_maplinks = {
-                        **subdiagrams_measured_maplinks,
-                        **current_node.subdiagrams_measured_maplinks,
-                    }
-                    total_measured_proteins = {
-                        **total_measured_proteins,
-                        **current_node.total_measured_proteins,
-                    }
-                    total_measured_genes = {
-                        **total_measured_genes,
-                        **current_node.total_measured_genes,
-                    }
-                    total_measured_metabolites = {
-                        **total_measured_metabolites,
-                        **current_node.total_measured_metabolites,
-                    }
-                    total_measured_maplinks = {
-                        **total_measured_maplinks,
-                        **current_node.total_measured_maplinks,
-                    }
-                    total_proteins = {**total_proteins, **current_node.total_proteins}
-                    total_metabolites = {
-                        **total_metabolites,
-                        **current_node.total_metabolites,
-                    }
+    def get_subtree_target(self, tar_id: str) -> List[str]:
+        """Gets all entries of the subtree of the target entry, including the target itself
+
+        Args:
+            tar_id: String: entry id for which to retrieve the subtree
+        """
+        if tar_id not in self:
+            return []
+        return list(self[tar_id].subtree_ids)
+
+    def get_subtree_leaves(self, tar_id: str) -> List[str]:
+        """Gets all leaves found for target entry
+
+        Args:
+            tar_id: String: entry id for which to retrieve leaves
+        """
+        if tar_id not in self:
+            return []
+        return list(self[tar_id].subtree_leaves)
+
+    def load_data(
+        self,
+        organism: str,
+        relation_loader: RedisBulkLoader,
+        diagram_loader: RedisBulkLoader,
+    ) -> None:
+        """Load hierarchy data into datastructure
+        Args:
+            organism: 3 letter abbrev for target organism
+
+            relation_loader: bulk loader for the relation database
+
+            diagram_loader: bulk loader for the diagram database
+        """
+        reactomeRelations = relation_loader.get("ReactomePathwaysRelation")
+        if reactomeRelations is None:
+            raise Exception("Could not find ReactomePathwaysRelation in redis")
+        reactomeRelations = decode_relations(reactomeRelations)
+        # get the ids of pathways with diagram files in one go instead of per relation
+        diagram_ids = diagram_loader.diagram_ids()
+
+        children: DefaultDict[str, List[str]] = collections.defaultdict(list)
+        parents: DefaultDict[str, List[str]] = collections.defaultdict(list)
+        for line in reactomeRelations.splitlines():
+            line = line.decode("utf-8")
+            line_list = line.strip().split("\t")
+            # ids are interned, so every relation refers to the same string object
+            left_entry = sys.intern(line_list[0])
+            right_entry = sys.intern(line_list[1])
+            left_entry_has_diagram = left_entry in diagram_ids
+            right_entry_has_diagram = right_entry in diagram_ids
+            if organism in left_entry:
+                if left_entry not in self.keys():
+                    self[left_entry] = ReactomePathwayTemplate(
+                        left_entry, left_entry_has_diagram
+                    )
+                children[left_entry].append(right_entry)
+                if right_entry not in self.keys():
+                    self[right_entry] = ReactomePathwayTemplate(
+                        right_entry, right_entry_has_diagram
+                    )
+                parents[right_entry].append(left_entry)
+
+        for k, v in self.items():
+            v.children = tuple(children[k])
+            v.parents = tuple(parents[k])
+            v.assert_leaf_root_state()
+        self.add_hierarchy_levels()
+
+    def get_subtree_non_overview(self, tar_id: str) -> List[str]:
+        """Gets the first non overview entries below the target entry
+
+        Overview and root entries are passed through, the search stops at the first
+        non overview entry of every branch.
+
+        Args:
+            tar_id: String: entry id for which to retrieve the non overview entries
+        """
+        if tar_id not in self:
+            return []
+        return list(self[tar_id].subtree_non_overview)
 
-                v.total_measured_proteins = total_measured_proteins
-                v.total_measured_genes = total_measured_genes
-                v.total_measured_metabolites = total_measured_metabolites
-                v.total_measured_maplinks = total_measured_maplinks
-                v.own_measured_proteins = list(set(own_measured_proteins))
-                v.own_measured_genes = list(set(own_measured_genes))
-                v.own_measured_metabolites = list(set(own_measured_metabolites))
-                v.own_measured_maplinks = list(set(own_measured_maplinks))
-                v.subdiagrams_measured_proteins = subdiagrams_measured_proteins
-                v.subdiagrams_measured_genes = subdiagrams_measured_genes
-                v.subdiagrams_measured_metabolites = subdiagrams_measured_metabolites
-                v.subdiagrams_measured_maplinks = subdiagrams_measured_maplinks
-                v.total_proteins = total_proteins
-                v.total_metabolites = total_metabolites
-                if (
-                    (len(v.total_measured_proteins) > 0)
-                    or (len(v.total_measured_genes) > 0)
-                    or (len(v.total_measured_metabolites) > 0)
-                ):
-                    v.has_data = True
+
+class ReactomeHierarchy(dict[str, ReactomePathway]):
+    """Class for pathway hierarchy
+
+    functions as main datastructure for reactome data.
+    Consists of per request ReactomePathway overlays on top of a shared ReactomeHierarchyTemplate
+
+    Args:
+        template: prebuilt hierarchy template of the target organism
+        metadata: metadata of the current request
+    """
+
+    def __getitem__(self, key: str) -> ReactomePathway:
+        return super().__getitem__(key)
+
+    def __init__(
+        self,
+        template: ReactomeHierarchyTemplate,
+        metadata: HierarchyMetadata,
+    ) -> None:
+        super(ReactomeHierarchy, self).__init__()
+        self.template = template
+        self.levels: Dict[int, List[str]] = template.levels
+        self.omics_recieved: List[bool] = []
+        self.amt_timesteps: int = metadata["amt_timesteps"]
+        self.omics_recieved = metadata["omics_recieved"]
+        for k, v in template.items():
+            self[k] = ReactomePathway(v)
+        for entry in self.values():
+            if entry.template.diagram_entry is not None:
+                entry.diagram_entry = self[entry.template.diagram_entry.reactome_sID]
+
+    def __reduce__(self):
+        # only the per request state is pickled, the template is looked up in the process wide
+        # store when loading, so session cache entries do not contain the static reactome data
+        from visMOP.python_scripts.hierarchy_store import get_release_template
+
+        attributes = {
+            k: v for k, v in self.__dict__.items() if k not in ("template", "levels")
+        }
+        return (
+            restore_hierarchy,
+            (
+                get_release_template,
+                (
+                    self.template.organism,
+                    self.template.fingerprint,
+                    self.template.redis_host,
+                    self.template.redis_port,
+                    self.template.redis_pw,
+                    self.template.segment_path,
+                ),
+                attributes,
+                {k: v.overlay_state() for k, v in self.items()},
+            ),
+        )
+
+    def hierarchyInfo(self) -> Dict[str, int]:
+        """Prints info about hierarchy"""
+        return self.template.hierarchyInfo()
 
     def get_subtree_target(self, tar_id: str) -> List[str]:
+        """Gets all entries of the subtree of the target entry, including the target itself
+
+        Args:
+            tar_id: String: entry id for which to retrieve the subtree
+        """
+        return self.template.get_subtree_target(tar_id)
+
+    def get_subtree_leaves(self, tar_id: str) -> List[str]:
         """Gets all leaves found for target entry
 
         Args:
             tar_id: String: entry id for which to retrieve leaves
         """
-        subtree: List[str] = []
-        self._subtree_recursive(tar_id, subtree)
-        return subtree
+        return self.template.get_subtree_leaves(tar_id)
+
+    def get_subtree_non_overview(self, tar_id: str) -> List[str]:
+        """Gets the first non overview entries below the target entry
 
-    def _subtree_recursive(self, entry_id: str, subtree: List[str]):
+        Args:
+            tar_id: String: entry id for which to retrieve the non overview entries
         """
-        Recursive function to get all leaves for a given entry id
+        return self.template.get_subtree_non_overview(tar_id)
+
+    def generate_parents_children_with_data(self) -> None:
+        for entry in self.values():
+            for parent_entry in entry.parents:
+                entryObject: ReactomePathway = self[parent_entry]
+                if entryObject.has_data:
+                    entry.parents_with_data.append(parent_entry)
+            for child_entry in entry.children:
+                entryObject: ReactomePathway = self[child_entry]
+                if entryObject.has_data:
+                    entry.children_with_data.append(child_entry)
+
+    def aggregate_pathways(self, engine: Literal["dict", "sparse"] = "dict") -> None:
+        """Aggregates data from low level nodes to higher level nodes
+
+        as the supplied omics data is only mapped to leaf nodes, data has to be aggregated to the higher level nodes
 
         Args:
-            entry_id: String: entry id for which to retrieve leaves
-            subtree: List: list of leaves
+            engine: "dict" merges the dictionaries of the children into each pathway,
+                "sparse" computes all pathways at once with the sparse aggregation
+                (see sparse_aggregation.SparseAggregation), both yield the same results
         """
-        if (
-            entry_id in self
-        ):  # NOTE was if entry_id is not None, so if its not working get back here
-            if len(self[entry_id].children) == 0:
-                pass  # leaves.append(entry_id)
-            for elem in self[entry_id].children:
-                self._subtree_recursive(elem, subtree)
-            subtree.append(entry_id)
+        if engine == "sparse":
+            sparse_aggregation = SparseAggregation(self)
+            for v in self.values():
+                sparse_aggregation.attach(v)
+            return
+        if engine != "dict":
+            raise ValueError("Unknown aggregation engine: {}".format(engine))
+        # children are handled before their parents, so propagation is correctly from the leaves to the root nodes
+        # NOTE levels can not be used for this, a child with several parents may be closer to a root than one of its parents
+        for entry_key in reversed(self.template.topological_order):
+            v: ReactomePathway = self[entry_key]
+            # if not v.is_leaf:
+            own_measured_proteins: List[str] = list(set(v.own_measured_proteins))
+            own_measured_genes: List[str] = list(set(v.own_measured_genes))
+            own_measured_metabolites: List[str] = list(set(v.own_measured_metabolites))
+            own_measured_maplinks: List[str] = list(set(v.own_measured_maplinks))
+            total_measured_proteins: Dict[str, OmicMeasurement] = (
+                v.total_measured_proteins
+            )
+            total_measured_genes: Dict[str, OmicMeasurement] = v.total_measured_genes
+            total_measured_metabolites: Dict[str, OmicMeasurement] = (
+                v.total_measured_metabolites
+            )
+            total_measured_maplinks: Dict[str, OmicMeasurement] = (
+                v.total_measured_maplinks
+            )  # ?
+            subdiagrams_measured_proteins: Dict[
+                Union[str, int], SubdiagramOmicEntry
+            ] = {}
+            subdiagrams_measured_genes: Dict[Union[str, int], SubdiagramOmicEntry] = {}
+            subdiagrams_measured_metabolites: Dict[
+                Union[str, int], SubdiagramOmicEntry
+            ] = {}
+            subdiagrams_measured_maplinks: Dict[
+                Union[str, int], SubdiagramOmicEntry
+            ] = {}  # ?
+            total_proteins: Dict[str, Dict[int, EntityOccurrence]] = v.total_proteins
+            total_metabolites: Dict[str, Dict[int, EntityOccurrence]] = (
+                v.total_metabolites
+            )
+
+            for node in v.children:
+                current_node = self[node]
+                if current_node.has_diagram:
+                    # current_node.db_Id is only internal ID, later we might also need the stable id
+                    if len(current_node.total_measured_proteins.keys()) > 0:
+                        subdiagrams_measured_proteins[current_node.db_Id] = {
+                            "stableID": current_node.reactome_sID,
+                            "nodes": list(current_node.total_measured_proteins.keys()),
+                        }
+                    if len(current_node.total_measured_genes.keys()) > 0:
+                        subdiagrams_measured_genes[current_node.db_Id] = {
+                            "stableID": current_node.reactome_sID,
+                            "nodes": list(current_node.total_measured_genes.keys()),
+                        }
+                    if len(current_node.total_measured_metabolites.keys()) > 0:
+                        subdiagrams_measured_metabolites[current_node.db_Id] = {
+                            "stableID": current_node.reactome_sID,
+                            "nodes": list(
+                                current_node.total_measured_metabolites.keys()
+                            ),
+                        }
+                    if len(current_node.total_measured_maplinks.keys()) > 0:
+                        subdiagrams_measured_maplinks[current_node.db_Id] = {
+                            "stableID": current_node.reactome_sID,
+                            "nodes": list(current_node.total_measured_maplinks.keys()),
+                        }
+                else:
+                    own_measured_proteins = list(
+                        set(own_measured_proteins + current_node.own_measured_proteins)
+                    )
+                    own_measured_genes = list(
+                        set(own_measured_genes + current_node.own_measured_genes)
+                    )
+                    own_measured_metabolites = list(
+                        set(
+                            own_measured_metabolites
+                            + current_node.own_measured_metabolites
+                        )
+                    )
+                    own_measured_maplinks = list(
+                        set(own_measured_maplinks + current_node.own_measured_maplinks)
+                    )
+
+                subdiagrams_measured_proteins = {
+                    **subdiagrams_measured_proteins,
+                    **current_node.subdiagrams_measured_proteins,
+                }
+                subdiagrams_measured_genes = {
+                    **subdiagrams_measured_genes,
+                    **current_node.subdiagrams_measured_genes,
+                }
+                subdiagrams_measured_metabolites = {
+                    **subdiagrams_measured_metabolites,
+                    **current_node.subdiagrams_measured_metabolites,
+                }
+                subdiagrams_measured_maplinks = {
+                    **subdiagrams_measured_maplinks,
+                    **current_node.subdiagrams_measured_maplinks,
+                }
+                total_measured_proteins = {
+                    **total_measured_proteins,
+                    **current_node.total_measured_proteins,
+                }
+                total_measured_genes = {
+                    **total_measured_genes,
+                    **current_node.total_measured_genes,
+                }
+                total_measured_metabolites = {
+                    **total_measured_metabolites,
+                    **current_node.total_measured_metabolites,
+                }
+                total_measured_maplinks = {
+                    **total_measured_maplinks,
+                    **current_node.total_measured_maplinks,
+                }
+                total_proteins = {**total_proteins, **current_node.total_proteins}
+                total_metabolites = {
+                    **total_metabolites,
+                    **current_node.total_metabolites,
+                }
+
+            v.total_measured_proteins = total_measured_proteins
+            v.total_measured_genes = total_measured_genes
+            v.total_measured_metabolites = total_measured_metabolites
+            v.total_measured_maplinks = total_measured_maplinks
+            v.own_measured_proteins = list(set(own_measured_proteins))
+            v.own_measured_genes = list(set(own_measured_genes))
+            v.own_measured_metabolites = list(set(own_measured_metabolites))
+            v.own_measured_maplinks = list(set(own_measured_maplinks))
+            v.subdiagrams_measured_proteins = subdiagrams_measured_proteins
+            v.subdiagrams_measured_genes = subdiagrams_measured_genes
+            v.subdiagrams_measured_metabolites = subdiagrams_measured_metabolites
+            v.subdiagrams_measured_maplinks = subdiagrams_measured_maplinks
+            v.total_proteins = total_proteins
+            v.total_metabolites = total_metabolites
+            if (
+                (len(v.total_measured_proteins) > 0)
+                or (len(v.total_measured_genes) > 0)
+                or (len(v.total_measured_metabolites) > 0)
+            ):
+                v.has_data = True
 
     def add_query_data(
         self,
@@ -776,82 +1398,6 @@ class ReactomeHierarchy(dict[str, ReactomePathway]):
                     ] = omic_measurment
                     self[pathway[0]].own_measured_metabolites.append(query_key)
 
-    def load_data(self, organism: str) -> None:
-        """Load hierarchy data into datastructure
-        Args:
-            path: path to data folder
-
-            organism: 3 letter abbrev for target organism
-        """
-
-        # get the diagram files as keys from redis
-        # connect to redis
-        r1 = redis.Redis(
-            host=self.redis_host,
-            port=self.redis_port,
-            db=1,
-            password=self.redis_pw,
-        )
-        r2 = redis.Redis(
-            host=self.redis_host,
-            port=self.redis_port,
-            db=2,
-            password=self.redis_pw,
-        )
-        reactomeRelations = r2.get("ReactomePathwaysRelation")
-        if reactomeRelations is None:
-            raise Exception("Could not find ReactomePathwaysRelation in redis")
-
-        for line in reactomeRelations.splitlines():
-            line = line.decode("utf-8")
-            line_list = line.strip().split("\t")
-            left_entry = line_list[0]
-            right_entry = line_list[1]
-            left_entry_has_diagram = r1.exists(left_entry + ".graph") != 0
-            right_entry_has_diagram = r1.exists(right_entry + ".graph") != 0
-            if organism in left_entry:
-                if left_entry not in self.keys():
-                    self[left_entry] = ReactomePathway(
-                        left_entry, left_entry_has_diagram
-                    )
-                    self[left_entry].children.append(right_entry)
-                else:
-                    self[left_entry].children.append(right_entry)
-                if right_entry not in self.keys():
-                    self[right_entry] = ReactomePathway(
-                        right_entry, right_entry_has_diagram
-                    )
-                    self[right_entry].parents.append(left_entry)
-                else:
-                    self[right_entry].parents.append(left_entry)
-
-        for v in self.values():
-            v.assert_leaf_root_state()
-        self.add_hierarchy_levels()
-
-    def get_subtree_non_overview(self, tar_id: str) -> List[str]:
-        """Gets all leaves found for target entry
-
-        Args:
-            tar_id: String: entry id for which to retrieve leaves
-        """
-        subtree: List[str] = []
-        self._get_subtree_non_overview_recursion(tar_id, subtree)
-        return subtree
-
-    def _get_subtree_non_overview_recursion(self, entry_id: str, subtree: List[str]):
-        """Recursive function for leaf retrieval"""
-        if (
-            entry_id in self
-        ):  # NOTE was if entry_id is not None, so if its not working get back here
-            if not self[entry_id].is_overview:
-                if not self[entry_id].is_root:
-                    subtree.append(entry_id)
-                    return
-            if self[entry_id].is_overview or self[entry_id].is_root:
-                for elem in self[entry_id].children:
-                    self._get_subtree_non_overview_recursion(elem, subtree)
-
     def generate_overview_data(
         self,
         omic_limits: List[List[float]],
@@ -990,6 +1536,36 @@ class ReactomeHierarchy(dict[str, ReactomePathway]):
 ###
 # Auxilliary Functions
 ###
+def restore_hierarchy(
+    load_template: Callable[..., ReactomeHierarchyTemplate],
+    template_args: Tuple,
+    attributes: Dict[str, object],
+    overlays: Dict[str, Dict[str, object]],
+) -> ReactomeHierarchy:
+    """Restores a pickled ReactomeHierarchy on top of the template of the loading process
+
+    Args:
+        load_template: returns the template for the template_args
+        template_args: organism, release fingerprint and connection settings of the template
+        attributes: hierarchy attributes besides the template
+        overlays: per request state of each overlay, see ReactomePathway.overlay_state
+
+    Returns:
+        the restored hierarchy
+    """
+    template = load_template(*template_args)
+    hierarchy = ReactomeHierarchy(template, attributes)  # type: ignore
+    hierarchy.__dict__.update(attributes)
+    for pathway_id, state in overlays.items():
+        entry = hierarchy[pathway_id]
+        for name, value in state.items():
+            setattr(entry, name, value)
+        if entry.sparse_aggregation is not None:
+            # the aggregation index belongs to the template and is not pickled
+            entry.sparse_aggregation.index = template.aggregation_index
+    return hierarchy
+
+
 def extract_measurement_data(
     data: List[OmicMeasurement],
     timepoint_index: int,
@@ -1230,48 +1806,6 @@ def generate_overview_pathway_entry(
     return pathway_dict, pathway_dropdown_entry, pathway_summary_data
 
 
-def format_graph_json(graph_json_file: ReactomeGraphJSON) -> ModifiedReactomeGraphJSON:
-    """Formats .graph.json nodes to be easily accessible in dictionary form with
-    the keys being node Ids
-
-    Args:
-        graph_json_file: loaded graph.json file
-
-    Returns:
-        formatted json file dictionary
-    """
-
-    intermediate_node_dict: Dict[int, EntityNode] = {}
-    intermediate_edge_dict: Dict[int, EventNode] = {}
-    intermediate_subpathway_dict: Dict[int, SubpathwayNode] = {}
-
-    try:
-        for v in graph_json_file["nodes"]:
-            intermediate_node_dict[v["dbId"]] = v
-    except:
-        pass
-
-    try:
-        for v in graph_json_file["edges"]:
-            intermediate_edge_dict[v["dbId"]] = v
-    except:
-        pass
-
-    try:
-        for v in graph_json_file["subpathways"]:
-            intermediate_subpathway_dict[v["dbId"]] = v
-    except:
-        pass
-
-    return {
-        "nodes": intermediate_node_dict,
-        "edges": intermediate_edge_dict,
-        "subpathways": intermediate_subpathway_dict,
-        "dbId": graph_json_file["dbId"],
-        "stId": graph_json_file["stId"],
-    }
-
-
 def get_contained_entities_graph_json(
     node_ids: List[int], formatted_json: ModifiedReactomeGraphJSON
 ):
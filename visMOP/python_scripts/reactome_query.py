@@ -1,12 +1,32 @@
 import json
-import redis
-from typing import Literal, Tuple, List, Dict
+from typing import Literal, Tuple, List, Dict, Union
 from visMOP.python_scripts.omicsTypeDefs import (
     OmicsDataTuples,
     ReactomeQueryEntry,
     MeasurementData,
 )
 from visMOP.python_scripts.reactome_hierarchy import ReactomeHierarchy
+from visMOP.python_scripts.reactome_release import (
+    get_active_prefix,
+    get_release_fingerprint,
+)
+from visMOP.python_scripts.redis_bulk_loader import RedisBulkLoader, LoaderReport
+from visMOP.python_scripts.mapping_cache import MappingCache, MappingKey
+from visMOP.python_scripts.storage_backend import StorageBackend, get_storage_backend
+from visMOP.python_scripts.value_codec import decode_value
+
+# amount of query ids looked up per HMGET round trip
+QUERY_BATCH_SIZE = 1000
+
+
+def load_json_mapping_record(value: bytes) -> ReactomeQueryEntry:
+    """Decodes a mapping record stored as json, before the binary value format"""
+    reactome_elem = json.loads(value)  # convert string back to Python object
+    for pathway_id in reactome_elem:
+        reactome_elem[pathway_id]["pathways"] = [
+            tuple(elem) for elem in reactome_elem[pathway_id]["pathways"]
+        ]
+    return reactome_elem
 
 
 class ReactomeQuery:
@@ -18,6 +38,10 @@ class ReactomeQuery:
         target_organism: The full name of the organism (e.g. Mus_musculus, Homo_sapiens).
         id_database: The database for which to map the IDs to Reactome (e.g. uniprot, ensmbl).
         pickle_path: The path to the pickle files.
+        batch_size: The number of query IDs looked up per redis round trip.
+        cache: Cache of the mapping records shared by the queries of a worker, None to disable.
+        storage: Storage backend shared by the queries of a worker, None for the process wide
+            backend of the server (see storage_backend.get_storage_backend).
 
     Attributes:
         query: The query string.
@@ -27,6 +51,8 @@ class ReactomeQuery:
         query_results: A dictionary containing the query results.
         id_table_id: A dictionary mapping IDs to table IDs.
         all_contained_pathways: A list of all Reactome low level pathways contained in the query.
+        lookup_report: Round trips and duration of the ID lookup.
+        batch_seconds: The duration of each lookup round trip.
     """
 
     def __init__(
@@ -37,12 +63,24 @@ class ReactomeQuery:
         query_data: List[OmicsDataTuples],
         target_organism: Literal["Mus_musculus", "Homo_sapiens"],
         id_database: Literal["ChEBI", "UniProt", "Ensembl"],
+        batch_size: int = QUERY_BATCH_SIZE,
+        cache: Union[MappingCache, None] = None,
+        storage: Union[StorageBackend, None] = None,
     ):
         """ """
         self.redis_host = redis_host
         self.redis_port = redis_port
         self.redis_pw = redis_pw
+        self.storage = (
+            storage
+            if storage is not None
+            else get_storage_backend(redis_host, redis_port, redis_pw)
+        )
+        self.batch_size = batch_size
+        self.cache = cache
         self.query_data = query_data
+        self.lookup_report: Union[LoaderReport, None] = None
+        self.batch_seconds: List[float] = []
         self.query_results: Dict[str, ReactomeQueryEntry] = {}
         self.id_table_id = {elem[0]["ID"]: elem[0]["table_id"] for elem in query_data}
         self.all_contained_pathways = []
@@ -63,26 +101,41 @@ class ReactomeQuery:
 
 
         """
-        r = redis.Redis(
-            host=self.redis_host,
-            port=self.redis_port,
-            db=0,
-            password=self.redis_pw,
-        )  # connect to local redis
+        r = self.storage.client(0)
+        relation_db = self.storage.client(2)
+        # all records of a query are read from the release active at its start
+        key_prefix = get_active_prefix(relation_db)
+        loader = RedisBulkLoader(r, self.batch_size, key_prefix)
+        query_ids = [elem[0]["ID"] for elem in self.query_data]
+        keys: Dict[str, MappingKey] = {
+            query_id: (id_database, target_organism, query_id) for query_id in query_ids
+        }
+        cached: Dict[MappingKey, Union[ReactomeQueryEntry, None]] = {}
+        if self.cache is not None:
+            self.cache.use_release(get_release_fingerprint(relation_db, key_prefix))
+            cached = self.cache.get_many(keys.values())
+        # the records of ids that are not cached are requested in batches
+        fetched: Dict[MappingKey, Union[ReactomeQueryEntry, None]] = {}
+        for query_id, reactome_elem_str in loader.hmget_batches(
+            f"{id_database}:{target_organism}",
+            [query_id for query_id, key in keys.items() if key not in cached],
+        ):
+            fetched[keys[query_id]] = (
+                decode_value(reactome_elem_str, load_json_mapping_record)
+                if reactome_elem_str is not None
+                else None
+            )
+        if self.cache is not None:
+            self.cache.put_many(fetched)
+        records = {**cached, **fetched}
         not_found = 0
+        # later rows with the same id overwrite earlier ones
         for elem in self.query_data:
             query_id = elem[0]["ID"]
-            reactome_elem_str = r.hget(f"{id_database}:{target_organism}", query_id)
-            if reactome_elem_str is not None:
-                reactome_elem = json.loads(
-                    reactome_elem_str
-                )  # convert string back to Python object
-
+            reactome_elem = records[keys[query_id]]
+            if reactome_elem is not None:
                 for pathway_id in reactome_elem:
                     reactome_elem[pathway_id]["measurement"] = elem[1]
-                    reactome_elem[pathway_id]["pathways"] = [
-                        tuple(elem) for elem in reactome_elem[pathway_id]["pathways"]
-                    ]
                 self.query_results[query_id] = reactome_elem
             else:
                 not_found += 1
@@ -91,6 +144,34 @@ class ReactomeQuery:
                 not_found, id_database
             )
         )
+        self.lookup_report = loader.report()
+        self.batch_seconds = loader.batch_seconds
+        if self.batch_seconds:
+            print(
+                "looked up {} {} ids in {} batches of up to {}: {:.3f}s, "
+                "{:.1f}ms per batch (max {:.1f}ms)".format(
+                    self.lookup_report["keys_requested"],
+                    id_database,
+                    len(self.batch_seconds),
+                    self.batch_size,
+                    self.lookup_report["elapsed_seconds"],
+                    1000 * sum(self.batch_seconds) / len(self.batch_seconds),
+                    1000 * max(self.batch_seconds),
+                )
+            )
+        if self.cache is not None:
+            stats = self.cache.stats()
+            print(
+                "mapping cache: {} of {} {} ids cached, {} records stored, "
+                "{} hits and {} misses in total".format(
+                    len(cached),
+                    len(keys),
+                    id_database,
+                    stats["entries"],
+                    stats["hits"],
+                    stats["misses"],
+                )
+            )
 
     def calc_all_pathways(self) -> None:
         """Calculates the set of all reactome low level pathways contained in the query"""
@@ -0,0 +1,106 @@
+import hashlib
+import redis
+from typing import List, TypedDict, Union
+from visMOP.python_scripts.value_codec import decode_value
+
+# key in the relation database (db 2) holding the key prefix of the active reactome release,
+# switched by reactome_redis.py once a release is completely ingested
+ACTIVE_RELEASE_KEY = "ActiveRelease"
+# key prefix of a release snapshot in the databases 0 to 2, e.g. r87:
+RELEASE_KEY_PREFIX = "r{}:"
+# key in the relation database identifying the ingested reactome data, set by reactome_redis.py
+RELEASE_FINGERPRINT_KEY = "ReleaseFingerprint"
+
+
+class ReactomeRelease(TypedDict):
+    """
+    A TypedDict that describes the reactome release read by the server.
+
+    Attributes:
+        prefix (str): The key prefix of the release snapshot, empty for data without snapshots.
+        fingerprint (str): The hex digest identifying the ingested data.
+    """
+
+    prefix: str
+    fingerprint: str
+
+
+def decode_relations(value: bytes) -> bytes:
+    """Returns the text of the ReactomePathwaysRelation value, stored plain or encoded"""
+    return decode_value(value, bytes)
+
+
+def get_release_fingerprint(relation_db: redis.Redis, key_prefix: str = "") -> str:
+    """Returns the fingerprint of the reactome data stored in redis
+
+    Data ingested without fingerprint is identified by a hash of the pathway relations.
+
+    Args:
+        relation_db: connection to the relation database (db 2)
+        key_prefix: prefix of the keys, e.g. of a release snapshot or data staged during ingest
+
+    Returns:
+        hex digest identifying the ingested data
+    """
+    fingerprint = relation_db.get(key_prefix + RELEASE_FINGERPRINT_KEY)
+    if fingerprint is not None:
+        return fingerprint.decode("utf-8")  # type: ignore
+    relations = relation_db.get(key_prefix + "ReactomePathwaysRelation")
+    if relations is None:
+        raise Exception("Could not find ReactomePathwaysRelation in redis")
+    return hashlib.sha1(decode_relations(relations)).hexdigest()  # type: ignore
+
+
+def get_active_prefix(relation_db: redis.Redis) -> str:
+    """Returns the key prefix of the active release snapshot
+
+    Data ingested before release snapshots is stored without prefix.
+
+    Args:
+        relation_db: connection to the relation database (db 2)
+    """
+    prefix = relation_db.get(ACTIVE_RELEASE_KEY)
+    return prefix.decode("utf-8") if prefix is not None else ""  # type: ignore
+
+
+def get_active_release(relation_db: redis.Redis) -> ReactomeRelease:
+    """Returns key prefix and fingerprint of the active release
+
+    Args:
+        relation_db: connection to the relation database (db 2)
+    """
+    prefix = get_active_prefix(relation_db)
+    return {
+        "prefix": prefix,
+        "fingerprint": get_release_fingerprint(relation_db, prefix),
+    }
+
+
+def activate_release(relation_db: redis.Redis, prefix: str) -> Union[str, None]:
+    """Switches the server to the release snapshot stored under prefix
+
+    The pointer is replaced in a single command, readers resolving it afterwards read
+    the new release only.
+
+    Args:
+        relation_db: connection to the relation database (db 2)
+        prefix: key prefix of the release snapshot
+
+    Returns:
+        the prefix of the previously active release, None if there was none
+    """
+    previous = relation_db.getset(ACTIVE_RELEASE_KEY, prefix)
+    return previous.decode("utf-8") if previous is not None else None  # type: ignore
+
+
+def list_release_prefixes(relation_db: redis.Redis) -> List[str]:
+    """Returns the key prefixes of all release snapshots, active or not
+
+    Args:
+        relation_db: connection to the relation database (db 2)
+    """
+    pattern = RELEASE_KEY_PREFIX.format("*") + RELEASE_FINGERPRINT_KEY
+    return sorted(
+        key.decode("utf-8")[: -len(RELEASE_FINGERPRINT_KEY)]  # type: ignore
+        for key in relation_db.scan_iter(match=pattern, count=1000)
+    )
@@ -0,0 +1,141 @@
+import time
+import redis
+from typing import Dict, Iterator, List, Set, Tuple, TypedDict, Union
+
+# name of the set in the diagram database (db 1) containing the ids of all pathways with diagram files
+DIAGRAM_ID_SET = "DiagramIds"
+
+
+class LoaderReport(TypedDict):
+    """
+    A TypedDict that describes the statistics of a bulk loader.
+
+    Attributes:
+        round_trips (int): The number of network round trips to redis.
+        keys_requested (int): The number of keys requested from redis.
+        elapsed_seconds (float): The time spent since the loader was created.
+    """
+
+    round_trips: int
+    keys_requested: int
+    elapsed_seconds: float
+
+
+class RedisBulkLoader:
+    """
+    Bulk access to a redis database, bundling requests into as few round trips as possible.
+
+    Args:
+        client: redis client of the database to read from.
+        batch_size: The number of keys requested per MGET round trip.
+        key_prefix: Prefix of all keys, e.g. of data staged during ingest.
+
+    Attributes:
+        round_trips: The number of round trips issued so far.
+        keys_requested: The number of keys requested so far.
+        batch_seconds: The duration of each batch round trip so far.
+    """
+
+    def __init__(
+        self, client: redis.Redis, batch_size: int = 200, key_prefix: str = ""
+    ):
+        self.client = client
+        self.batch_size = batch_size
+        self.key_prefix = key_prefix
+        self.round_trips = 0
+        self.keys_requested = 0
+        self.batch_seconds: List[float] = []
+        self.start_time = time.perf_counter()
+
+    def get(self, key: str) -> Union[bytes, None]:
+        """Gets a single key"""
+        self.round_trips += 1
+        self.keys_requested += 1
+        return self.client.get(self.key_prefix + key)  # type: ignore
+
+    def hgetall(self, name: str) -> Dict[bytes, bytes]:
+        """Gets all fields of a hash"""
+        self.round_trips += 1
+        self.keys_requested += 1
+        return self.client.hgetall(self.key_prefix + name)  # type: ignore
+
+    def diagram_ids(self) -> Set[str]:
+        """Gets the ids of all pathways that have a diagram
+
+        Uses the id set written during ingest and falls back to scanning for graph keys,
+        if the database was populated without it.
+        """
+        self.round_trips += 1
+        members: Set[bytes] = self.client.smembers(self.key_prefix + DIAGRAM_ID_SET)  # type: ignore
+        if members:
+            return {member.decode("utf-8") for member in members}
+        diagram_ids: Set[str] = set()
+        cursor = 0
+        while True:
+            self.round_trips += 1
+            cursor, keys = self.client.scan(cursor, match=self.key_prefix + "*.graph", count=10000)  # type: ignore
+            diagram_ids.update(
+                key.decode("utf-8")[len(self.key_prefix) : -len(".graph")]
+                for key in keys
+            )
+            if cursor == 0:
+                return diagram_ids
+
+    def mget_batches(
+        self, keys: List[str], suffixes: Tuple[str, ...] = ("",)
+    ) -> Iterator[Tuple[str, List[Union[bytes, None]]]]:
+        """Gets the values of keys + suffix for every key and suffix
+
+        One MGET per suffix is pipelined for each batch, so every batch
+        costs a single round trip.
+
+        Args:
+            keys: base keys to request
+            suffixes: suffixes appended to each key, e.g. ("", ".graph") for layout and graph files
+
+        Yields:
+            tuples of base key and the values for each suffix (None if missing)
+        """
+        for batch_start in range(0, len(keys), self.batch_size):
+            batch = keys[batch_start : batch_start + self.batch_size]
+            batch_start_time = time.perf_counter()
+            pipe = self.client.pipeline(transaction=False)
+            for suffix in suffixes:
+                pipe.mget([self.key_prefix + key + suffix for key in batch])
+            results: List[List[Union[bytes, None]]] = pipe.execute()
+            self.batch_seconds.append(time.perf_counter() - batch_start_time)
+            self.round_trips += 1
+            self.keys_requested += len(batch) * len(suffixes)
+            for idx, key in enumerate(batch):
+                yield key, [result[idx] for result in results]
+
+    def hmget_batches(
+        self, name: str, fields: List[str]
+    ) -> Iterator[Tuple[str, Union[bytes, None]]]:
+        """Gets the values of fields of a hash
+
+        Every batch is requested with a single HMGET round trip.
+
+        Args:
+            name: name of the hash
+            fields: fields to request, in the order they are yielded
+
+        Yields:
+            tuples of field and its value (None if missing)
+        """
+        for batch_start in range(0, len(fields), self.batch_size):
+            batch = fields[batch_start : batch_start + self.batch_size]
+            batch_start_time = time.perf_counter()
+            values: List[Union[bytes, None]] = self.client.hmget(self.key_prefix + name, batch)  # type: ignore
+            self.batch_seconds.append(time.perf_counter() - batch_start_time)
+            self.round_trips += 1
+            self.keys_requested += len(batch)
+            yield from zip(batch, values)
+
+    def report(self) -> LoaderReport:
+        """Returns round trip count and elapsed time of the loader"""
+        return {
+            "round_trips": self.round_trips,
+            "keys_requested": self.keys_requested,
+            "elapsed_seconds": time.perf_counter() - self.start_time,
+        }
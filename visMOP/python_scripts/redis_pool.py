@@ -0,0 +1,178 @@
+import threading
+import time
+import redis
+from typing import Dict, List, TypedDict
+
+# default maximum of connections per database and worker, further requests wait for a free one
+REDIS_POOL_SIZE = 16
+# seconds a request waits for a free connection before failing
+REDIS_POOL_TIMEOUT = 20
+# seconds a connection may be idle before it is checked with a PING on its next use
+REDIS_HEALTH_CHECK_INTERVAL = 30
+
+
+class RedisPoolStats(TypedDict):
+    """
+    A TypedDict that describes the usage of the connection pool of one database.
+
+    Attributes:
+        db (int): The redis database of the pool.
+        max_connections (int): The maximum number of connections of the pool.
+        created (int): The number of connections opened so far.
+        in_use (int): The number of connections currently checked out.
+        peak_in_use (int): The highest number of connections checked out at the same time.
+        checkouts (int): The number of times a connection was checked out.
+        wait_seconds (float): The total time spent waiting for a free connection.
+    """
+
+    db: int
+    max_connections: int
+    created: int
+    in_use: int
+    peak_in_use: int
+    checkouts: int
+    wait_seconds: float
+
+
+class CountingConnectionPool(redis.BlockingConnectionPool):
+    """
+    A blocking connection pool counting the connections it creates and hands out.
+
+    Args:
+        max_connections: The maximum number of open connections.
+        timeout: Seconds to wait for a free connection.
+        connection_kwargs: Settings of the connections, e.g. host, port, db and password.
+    """
+
+    def __init__(self, max_connections: int, timeout: int, **connection_kwargs):
+        self._stats_lock = threading.Lock()
+        self.created = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        super().__init__(
+            max_connections=max_connections, timeout=timeout, **connection_kwargs
+        )
+
+    def make_connection(self):
+        with self._stats_lock:
+            self.created += 1
+        return super().make_connection()
+
+    def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        connection = super().get_connection(*args, **kwargs)
+        with self._stats_lock:
+            self.wait_seconds += time.perf_counter() - start
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+        return connection
+
+    def release(self, connection) -> None:
+        with self._stats_lock:
+            self.in_use -= 1
+        super().release(connection)
+
+    def reset(self) -> None:
+        # also called by the constructor and after a fork
+        with self._stats_lock:
+            self.created = 0
+            self.in_use = 0
+        super().reset()
+
+
+class RedisPools:
+    """
+    Connection pools of one redis server, one per database, shared by all requests of a worker.
+
+    Pickling only keeps the connection settings, unpickling returns the
+    process wide pools for them (see storage_backend.get_storage_backend).
+
+    Args:
+        redis_host: host of the redis server containing the reactome data
+        redis_port: port of the redis server
+        redis_pw: password of the redis server
+        max_connections: maximum of open connections per database
+        health_check_interval: seconds a connection may idle before it is checked on its next use
+    """
+
+    def __init__(
+        self,
+        redis_host: str,
+        redis_port: int,
+        redis_pw: str,
+        max_connections: int = REDIS_POOL_SIZE,
+        health_check_interval: int = REDIS_HEALTH_CHECK_INTERVAL,
+    ):
+        self.redis_host = redis_host
+        self.redis_port = redis_port
+        self.redis_pw = redis_pw
+        self.max_connections = max_connections
+        self.health_check_interval = health_check_interval
+        self._pools: Dict[int, CountingConnectionPool] = {}
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        from visMOP.python_scripts.storage_backend import get_storage_backend
+
+        return (get_storage_backend, (self.redis_host, self.redis_port, self.redis_pw))
+
+    def pool(self, db: int) -> CountingConnectionPool:
+        """Returns the connection pool of a database, creating it on first use"""
+        with self._lock:
+            if db not in self._pools:
+                self._pools[db] = CountingConnectionPool(
+                    self.max_connections,
+                    REDIS_POOL_TIMEOUT,
+                    host=self.redis_host,
+                    port=self.redis_port,
+                    db=db,
+                    password=self.redis_pw,
+                    health_check_interval=self.health_check_interval,
+                )
+            return self._pools[db]
+
+    def client(self, db: int) -> redis.Redis:
+        """Returns a client of a database, its connections are taken from the shared pool"""
+        return redis.Redis(connection_pool=self.pool(db))
+
+    def stats(self) -> List[RedisPoolStats]:
+        """Returns the usage of the pools of all databases used so far"""
+        with self._lock:
+            pools = sorted(self._pools.items())
+        return [
+            {
+                "db": db,
+                "max_connections": pool.max_connections,
+                "created": pool.created,
+                "in_use": pool.in_use,
+                "peak_in_use": pool.peak_in_use,
+                "checkouts": pool.checkouts,
+                "wait_seconds": pool.wait_seconds,
+            }
+            for db, pool in pools
+        ]
+
+    def print_stats(self) -> None:
+        """Prints the usage of the pools"""
+        for pool_stats in self.stats():
+            print(
+                "redis db {}: {} connections opened, {} of {} in use (peak {}), "
+                "{} checkouts, waited {:.3f}s".format(
+                    pool_stats["db"],
+                    pool_stats["created"],
+                    pool_stats["in_use"],
+                    pool_stats["max_connections"],
+                    pool_stats["peak_in_use"],
+                    pool_stats["checkouts"],
+                    pool_stats["wait_seconds"],
+                )
+            )
+
+    def disconnect(self) -> None:
+        """Closes all connections of the pools"""
+        with self._lock:
+            for pool in self._pools.values():
+                pool.disconnect()
@@ -0,0 +1,479 @@
+import mmap
+import os
+import time
+import numpy as np
+from typing import Any, Dict, List, Mapping, Sequence, Tuple, Union
+from visMOP.python_scripts.array_segment import (
+    csr_arrays,
+    decode_arrays,
+    decode_strings,
+    encode_arrays,
+    string_arrays,
+)
+from visMOP.python_scripts.diagram_store import get_diagram_store
+from visMOP.python_scripts.hierarchy_types import EntityOccurrence
+from visMOP.python_scripts.reactome_hierarchy import (
+    ReactomeHierarchyTemplate,
+    ReactomePathwayTemplate,
+)
+from visMOP.python_scripts.reactome_release import ReactomeRelease, get_active_release
+from visMOP.python_scripts.storage_backend import StorageBackend, get_storage_backend
+from visMOP.python_scripts.sparse_aggregation import AggregatedField, AggregationIndex
+
+try:
+    import fcntl
+except ImportError:  # not available on windows, segments are then built without locking
+    fcntl = None
+
+# segment file of an organism and release fingerprint in the shared directory
+SEGMENT_FILE = "{}-{}.hierarchy"
+
+# diagram derived entity occurrences, stored per pathway and entity
+ENTITY_FIELDS = ("total_proteins", "total_metabolites", "maplinks")
+# descendant closures, see ReactomeHierarchyTemplate.add_subtree_index
+CLOSURE_FIELDS = ("subtree_ids", "subtree_leaves", "subtree_non_overview")
+# boolean attributes of the pathways, stored as bits of one flag byte
+FLAGS = ("is_root", "is_leaf", "has_diagram", "is_overview")
+
+
+def write_segment(
+    path: str, arrays: Mapping[str, np.ndarray], metadata: Dict[str, Any]
+) -> None:
+    """Writes one dimensional arrays to a segment file, see array_segment.encode_arrays
+
+    The file is written next to the target and moved in place, so it appears atomically.
+
+    Args:
+        path: target file
+        arrays: arrays by name
+        metadata: json serializable information about the segment
+    """
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, "wb") as fh:
+        fh.write(encode_arrays(arrays, metadata))
+    os.replace(tmp_path, path)
+
+
+class SharedSegment:
+    """Read only memory mapping of a segment file written by write_segment
+
+    The arrays are views on the mapping, all processes mapping the same file share its pages
+    instead of holding a copy each. Pickling a segment only keeps the path, unpickling maps
+    the file again.
+
+    Args:
+        path: segment file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as fh:
+            self._mapping = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self.metadata: Dict[str, Any]
+        self.arrays: Dict[str, np.ndarray]
+        self.metadata, self.arrays = decode_arrays(self._mapping)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+    def __reduce__(self):
+        return (SharedSegment, (self.path,))
+
+    def nbytes(self) -> int:
+        """Size of the mapped file"""
+        return len(self._mapping)
+
+    def strings(self, name: str) -> List[str]:
+        """Decodes a string table, the strings are interned"""
+        return decode_strings(self.arrays, name)
+
+
+class SharedEntities(Sequence[Dict[str, Dict[int, EntityOccurrence]]]):
+    """Entity occurrences of one diagram derived field for all pathways of a segment
+
+    The occurrence dictionary of a pathway is built from the segment on every access.
+
+    Args:
+        segment: mapped hierarchy segment
+        field: one of ENTITY_FIELDS
+        entity_names: decoded entity string table of the segment
+    """
+
+    def __init__(self, segment: SharedSegment, field: str, entity_names: List[str]):
+        self.entity_names = entity_names
+        self.indptr = segment[field + "_indptr"]
+        self.entities = segment[field]
+        self.occurrence_indptr = segment[field + "_occurrences_indptr"]
+        self.internal_ids = segment[field + "_occurrences"]
+        self.stable_ids = segment[field + "_stable_ids"]
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def __getitem__(self, position: int) -> Dict[str, Dict[int, EntityOccurrence]]:  # type: ignore
+        start, end = int(self.indptr[position]), int(self.indptr[position + 1])
+        bounds = self.occurrence_indptr[start : end + 1].tolist()
+        internal_ids = self.internal_ids[bounds[0] : bounds[-1]].tolist()
+        stable_ids = self.stable_ids[bounds[0] : bounds[-1]].tolist()
+        names = self.entity_names
+        values: Dict[str, Dict[int, EntityOccurrence]] = {}
+        for num, entity in enumerate(self.entities[start:end].tolist()):
+            values[names[entity]] = {
+                internal_ids[occurrence]: {
+                    "internalID": internal_ids[occurrence],
+                    "stableID": names[stable_ids[occurrence]],
+                }
+                for occurrence in range(
+                    bounds[num] - bounds[0], bounds[num + 1] - bounds[0]
+                )
+            }
+        return values
+
+
+class SharedHierarchy:
+    """Per worker access to the data of a mapped hierarchy segment
+
+    Args:
+        segment: mapped hierarchy segment
+    """
+
+    def __init__(self, segment: SharedSegment):
+        self.segment = segment
+        self.pathway_ids: List[str] = segment.strings("pathway_ids")
+        self.entity_names: List[str] = segment.strings("entities")
+        self.entities: Dict[str, SharedEntities] = {
+            field: SharedEntities(segment, field, self.entity_names)
+            for field in ENTITY_FIELDS
+        }
+
+    def __reduce__(self):
+        return (SharedHierarchy, (self.segment,))
+
+    def pathway_tuple(self, name: str, position: int) -> Tuple[str, ...]:
+        """Pathway ids of one row of a relation or closure"""
+        indptr = self.segment[name + "_indptr"]
+        return tuple(
+            self.pathway_ids[pathway]
+            for pathway in self.segment[name][
+                indptr[position] : indptr[position + 1]
+            ].tolist()
+        )
+
+
+class SharedPathwayTemplate(ReactomePathwayTemplate):
+    """Pathway entry of a template attached to a shared segment
+
+    The entity occurrences and descendant closures are not stored on the entry,
+    they are built from the segment on every access.
+
+    Args:
+        reactome_sID: Stable Reactome ID for pathway
+        has_diagram: if the pathway has its own diagram files
+        shared: data of the mapped segment
+        position: position of the pathway in the segment
+    """
+
+    __slots__ = ("shared", "position")
+
+    def __init__(
+        self,
+        reactome_sID: str,
+        has_diagram: bool,
+        shared: SharedHierarchy,
+        position: int,
+    ):
+        super().__init__(reactome_sID, has_diagram)
+        for name in ENTITY_FIELDS + CLOSURE_FIELDS:
+            delattr(self, name)
+        self.shared = shared
+        self.position = position
+
+    def __getattr__(self, name: str):
+        # only called for attributes not set on the entry
+        if name in ENTITY_FIELDS:
+            return self.shared.entities[name][self.position]
+        if name in CLOSURE_FIELDS:
+            return self.shared.pathway_tuple(name, self.position)
+        raise AttributeError(name)
+
+    def __getitem__(self, key: str):
+        return getattr(self, key)
+
+    def __getstate__(self):
+        # the shared attributes are not part of the state, they are read from the segment again
+        state: Dict[str, Any] = {}
+        for name in ReactomePathwayTemplate.__slots__ + SharedPathwayTemplate.__slots__:
+            try:
+                state[name] = object.__getattribute__(self, name)
+            except AttributeError:
+                pass
+        return (None, state)
+
+
+def export_template(template: ReactomeHierarchyTemplate, path: str) -> None:
+    """Writes the static data of a built template to a segment file
+
+    Pathways are stored in topological order, the order of the aggregation index.
+    The segment contains the relations, the descendant closures, the entity occurrences
+    and the arrays of the sparse aggregation index.
+
+    Args:
+        template: built hierarchy template
+        path: target file
+    """
+    pathway_ids = template.topological_order
+    position = {pathway_id: num for num, pathway_id in enumerate(pathway_ids)}
+    entries = [template[pathway_id] for pathway_id in pathway_ids]
+    entity_position: Dict[str, int] = {}
+
+    arrays: Dict[str, np.ndarray] = {}
+    arrays["dict_order"] = np.array(
+        [position[pathway_id] for pathway_id in template], dtype=np.int64
+    )
+    arrays["db_ids"] = np.array([entry.db_Id for entry in entries], dtype=np.int64)
+    arrays["levels"] = np.array([entry.level for entry in entries], dtype=np.int64)
+    arrays["root_ids"] = np.array(
+        [position.get(entry.root_id, -1) for entry in entries], dtype=np.int64
+    )
+    arrays["diagram_entries"] = np.array(
+        [
+            (
+                -1
+                if entry.diagram_entry is None
+                else position[entry.diagram_entry.reactome_sID]
+            )
+            for entry in entries
+        ],
+        dtype=np.int64,
+    )
+    arrays["flags"] = np.array(
+        [
+            sum(1 << bit for bit, flag in enumerate(FLAGS) if getattr(entry, flag))
+            for entry in entries
+        ],
+        dtype=np.uint8,
+    )
+    for name in ("children", "parents") + CLOSURE_FIELDS:
+        arrays.update(
+            csr_arrays(
+                name,
+                [
+                    [position[pathway_id] for pathway_id in entry[name]]
+                    for entry in entries
+                ],
+            )
+        )
+    for field in ENTITY_FIELDS:
+        rows: List[List[int]] = []
+        occurrence_rows: List[List[int]] = []
+        stable_ids: List[int] = []
+        for entry in entries:
+            values: Dict[str, Dict[int, EntityOccurrence]] = getattr(entry, field)
+            rows.append(
+                [
+                    entity_position.setdefault(entity, len(entity_position))
+                    for entity in values
+                ]
+            )
+            for occurrences in values.values():
+                occurrence_rows.append(list(occurrences))
+                stable_ids.extend(
+                    entity_position.setdefault(
+                        occurrence["stableID"], len(entity_position)
+                    )
+                    for occurrence in occurrences.values()
+                )
+        arrays.update(csr_arrays(field, rows))
+        arrays.update(csr_arrays(field + "_occurrences", occurrence_rows))
+        arrays[field + "_stable_ids"] = np.array(stable_ids, dtype=np.int64)
+
+    index = template.aggregation_index
+    for name, array in index.to_arrays().items():
+        arrays["index_" + name] = array
+    for field in ("total_proteins", "total_metabolites"):
+        aggregated: AggregatedField = getattr(index, field)
+        # keys refer to the entity string table of the segment
+        key_positions = np.array(
+            [entity_position[key] for key in aggregated.key_names], dtype=np.int64
+        )
+        aggregated_arrays = aggregated.to_arrays()
+        aggregated_arrays["keys"] = key_positions[aggregated_arrays["keys"]]
+        for name, array in aggregated_arrays.items():
+            arrays["aggregated_{}_{}".format(field, name)] = array
+
+    arrays.update(string_arrays("pathway_ids", pathway_ids))
+    arrays.update(string_arrays("names", [entry.name for entry in entries]))
+    arrays.update(string_arrays("entities", list(entity_position)))
+    write_segment(
+        path,
+        arrays,
+        {
+            "organism": template.organism,
+            "fingerprint": template.fingerprint,
+            "key_prefix": template.key_prefix or "",
+        },
+    )
+
+
+def attach_template(
+    path: str,
+    redis_host: str,
+    redis_port: int,
+    redis_pw: str,
+    key_prefix: Union[str, None] = None,
+) -> ReactomeHierarchyTemplate:
+    """Builds a hierarchy template on top of a segment file written by export_template
+
+    Only the pathway entries with their scalar attributes and relations are created per worker,
+    the bulk of the data stays in the mapped segment.
+
+    Args:
+        path: segment file
+        redis_host: host of the redis server containing the diagram files
+        redis_port: port of the redis server
+        redis_pw: password of the redis server
+        key_prefix: key prefix of the release snapshot to load diagrams from,
+            None for the snapshot the segment was written from
+
+    Returns:
+        the attached hierarchy template
+    """
+    start = time.perf_counter()
+    segment = SharedSegment(path)
+    shared = SharedHierarchy(segment)
+    if key_prefix is None:
+        # segments written before release snapshots refer to keys without prefix
+        key_prefix = segment.metadata.get("key_prefix", "")
+    template = ReactomeHierarchyTemplate(
+        segment.metadata["organism"],
+        redis_host,
+        redis_port,
+        redis_pw,
+        key_prefix=key_prefix,
+    )
+    template.fingerprint = segment.metadata["fingerprint"]
+    template.segment_path = path
+    pathway_ids = shared.pathway_ids
+    names = segment.strings("names")
+    db_ids: List[int] = segment["db_ids"].tolist()
+    levels: List[int] = segment["levels"].tolist()
+    root_ids: List[int] = segment["root_ids"].tolist()
+    diagram_entries: List[int] = segment["diagram_entries"].tolist()
+    flags: List[int] = segment["flags"].tolist()
+    diagram_store = get_diagram_store(redis_host, redis_port, redis_pw, key_prefix)
+
+    entries: List[SharedPathwayTemplate] = []
+    for position, pathway_id in enumerate(pathway_ids):
+        entry = SharedPathwayTemplate(pathway_id, False, shared, position)
+        for bit, flag in enumerate(FLAGS):
+            setattr(entry, flag, bool(flags[position] & 1 << bit))
+        entry.name = names[position]
+        entry.db_Id = db_ids[position]
+        entry.level = levels[position]
+        entry.root_id = (
+            pathway_ids[root_ids[position]] if root_ids[position] >= 0 else ""
+        )
+        entry.children = shared.pathway_tuple("children", position)
+        entry.parents = shared.pathway_tuple("parents", position)
+        if entry.has_diagram:
+            entry.diagram_store = diagram_store
+        entries.append(entry)
+    for entry, diagram_entry in zip(entries, diagram_entries):
+        if diagram_entry >= 0:
+            entry.diagram_entry = entries[diagram_entry]
+
+    # keep the pathway order of a template built from redis
+    for position in segment["dict_order"].tolist():
+        entry = entries[position]
+        template[entry.reactome_sID] = entry
+        template.levels.setdefault(entry.level, []).append(entry.reactome_sID)
+    template.topological_order = list(pathway_ids)
+
+    index = AggregationIndex.from_arrays(
+        pathway_ids,
+        db_ids,
+        {
+            name[len("index_") :]: array
+            for name, array in segment.arrays.items()
+            if name.startswith("index_")
+        },
+    )
+    for field in ("total_proteins", "total_metabolites"):
+        prefix = "aggregated_{}_".format(field)
+        setattr(
+            index,
+            field,
+            AggregatedField.from_arrays(
+                {
+                    name[len(prefix) :]: array
+                    for name, array in segment.arrays.items()
+                    if name.startswith(prefix)
+                },
+                shared.entity_names,
+                shared.entities[field],
+            ),
+        )
+    template.aggregation_index = index
+    print(
+        "attached {} hierarchy with {} pathways from {} ({:.1f} MB), {:.2f}s".format(
+            template.organism,
+            len(template),
+            path,
+            segment.nbytes() / 1e6,
+            time.perf_counter() - start,
+        )
+    )
+    return template
+
+
+def load_shared_template(
+    directory: str,
+    organism: str,
+    redis_host: str,
+    redis_port: int,
+    redis_pw: str,
+    release: Union[ReactomeRelease, None] = None,
+    storage: Union[StorageBackend, None] = None,
+) -> ReactomeHierarchyTemplate:
+    """Attaches to the shared segment of the organism and the current release
+
+    The first worker builds the template and writes the segment, workers starting at the
+    same time wait for it and attach afterwards. A new release fingerprint leads to a new segment,
+    segments of previous releases are left in place for hierarchies still referring to them.
+
+    Args:
+        directory: directory of the segment files, e.g. on a tmpfs
+        organism: 3 letter abbrev for target organism
+        redis_host: host of the redis server containing the reactome data
+        redis_port: port of the redis server
+        redis_pw: password of the redis server
+        release: release to load, None for the active release
+        storage: storage backend of the reactome data, None for the process wide backend of the server
+
+    Returns:
+        the attached hierarchy template
+    """
+    if storage is None:
+        storage = get_storage_backend(redis_host, redis_port, redis_pw)
+    if release is None:
+        release = get_active_release(storage.client(2))
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(
+        directory, SEGMENT_FILE.format(organism, release["fingerprint"])
+    )
+    with open(path + ".lock", "w") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if not os.path.exists(path):
+            template = ReactomeHierarchyTemplate(
+                organism,
+                redis_host,
+                redis_port,
+                redis_pw,
+                key_prefix=release["prefix"],
+                storage=storage,
+            )
+            template.build()
+            export_template(template, path)
+    # the diagrams of equal fingerprints are the same, whichever snapshot wrote the segment
+    return attach_template(path, redis_host, redis_port, redis_pw, release["prefix"])
@@ -0,0 +1,393 @@
+import numpy as np
+from scipy import sparse
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, Sequence, Tuple, Union
+from visMOP.python_scripts.hierarchy_types import SubdiagramOmicEntry
+
+if TYPE_CHECKING:
+    from visMOP.python_scripts.reactome_hierarchy import (
+        ReactomeHierarchy,
+        ReactomeHierarchyTemplate,
+        ReactomePathway,
+    )
+
+OMICS = ("proteins", "genes", "metabolites", "maplinks")
+
+# overlay attributes computed by the aggregation, materialized on first access
+AGGREGATED_FIELDS = frozenset(
+    [
+        prefix + omic
+        for prefix in ("own_measured_", "total_measured_", "subdiagrams_measured_")
+        for omic in OMICS
+    ]
+    + ["total_proteins", "total_metabolites"]
+)
+
+IndexArray = np.ndarray[Tuple[int], np.dtype[np.int64]]
+
+
+def _csr_arrays(rows: List[List[int]]) -> Tuple[IndexArray, IndexArray]:
+    """Concatenates rows of column indices to indptr and indices arrays"""
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum([len(row) for row in rows], out=indptr[1:])
+    indices = np.fromiter(
+        (column for row in rows for column in row), dtype=np.int64, count=indptr[-1]
+    )
+    return indptr, indices
+
+
+def _expand_rows(indptr: IndexArray, rows: IndexArray) -> Tuple[IndexArray, IndexArray]:
+    """Returns the positions of all entries of the given csr rows and the row length of each row"""
+    counts = indptr[rows + 1] - indptr[rows]
+    row_starts = np.repeat(indptr[rows] - (np.cumsum(counts) - counts), counts)
+    return row_starts + np.arange(counts.sum(), dtype=np.int64), counts
+
+
+class AggregationIndex:
+    """Static part of the sparse aggregation of one organism hierarchy
+
+    Pathways are numbered in topological order. For every pathway the closure (the pathway and
+    all its descendants) is stored as csr matrix together with two ranks of each descendant,
+    which reproduce the merging order of the dictionary based aggregation:
+
+        first rank: position in the preorder of the unrolled subtree, earliest occurrence counts.
+            Keys of the aggregated dictionaries are ordered by the first rank of the pathway
+            they were first inserted from.
+        last rank: position in the preorder of the unrolled subtree, latest occurrence counts.
+            Values of the aggregated dictionaries are taken from the pathway with the highest last rank.
+
+    Args:
+        template: built hierarchy template of the organism
+    """
+
+    def __init__(self, template: "ReactomeHierarchyTemplate"):
+        self.pathway_ids: List[str] = list(template.topological_order)
+        self.position: Dict[str, int] = {
+            pathway_id: num for num, pathway_id in enumerate(self.pathway_ids)
+        }
+        amt_pathways = len(self.pathway_ids)
+        entries = [template[pathway_id] for pathway_id in self.pathway_ids]
+        has_diagram = [entry.has_diagram for entry in entries]
+        self.db_ids: List[int] = [entry.db_Id for entry in entries]
+
+        first_orders: List[List[int]] = [[] for _ in range(amt_pathways)]
+        last_ranks: List[List[int]] = [[] for _ in range(amt_pathways)]
+        non_diagram_closures: List[List[int]] = [[] for _ in range(amt_pathways)]
+        diagram_descendants: List[List[int]] = [[] for _ in range(amt_pathways)]
+        last_orders: List[List[int]] = [[] for _ in range(amt_pathways)]
+        for pathway in reversed(range(amt_pathways)):
+            children = [self.position[child] for child in entries[pathway].children]
+            first_order: Dict[int, None] = {pathway: None}
+            non_diagram_closure: Dict[int, None] = {pathway: None}
+            for child in children:
+                first_order.update(dict.fromkeys(first_orders[child]))
+                if not has_diagram[child]:
+                    non_diagram_closure.update(
+                        dict.fromkeys(non_diagram_closures[child])
+                    )
+            # the last occurrence of a descendant is in the last child containing it
+            seen: set[int] = set()
+            segments: List[List[int]] = []
+            for child in reversed(children):
+                segments.append([p for p in last_orders[child] if p not in seen])
+                seen.update(last_orders[child])
+            last_order = [pathway]
+            for segment in reversed(segments):
+                last_order.extend(segment)
+            last_rank = {p: rank for rank, p in enumerate(last_order)}
+
+            first_orders[pathway] = list(first_order)
+            last_orders[pathway] = last_order
+            last_ranks[pathway] = [last_rank[p] for p in first_order]
+            non_diagram_closures[pathway] = list(non_diagram_closure)
+            diagram_descendants[pathway] = [
+                p for p in first_orders[pathway][1:] if has_diagram[p]
+            ]
+
+        self.closure_indptr, self.closure_indices = _csr_arrays(first_orders)
+        self.closure_rows: IndexArray = np.repeat(
+            np.arange(amt_pathways, dtype=np.int64), np.diff(self.closure_indptr)
+        )
+        self.closure_first_rank: IndexArray = np.arange(
+            len(self.closure_indices), dtype=np.int64
+        ) - np.repeat(self.closure_indptr[:-1], np.diff(self.closure_indptr))
+        self.closure_last_rank: IndexArray = np.fromiter(
+            (rank for row in last_ranks for rank in row),
+            dtype=np.int64,
+            count=len(self.closure_indices),
+        )
+        indptr, indices = _csr_arrays(non_diagram_closures)
+        self.non_diagram_closure = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.int64), indices, indptr),
+            shape=(amt_pathways, amt_pathways),
+        )
+        self.diagram_indptr, self.diagram_indices = _csr_arrays(diagram_descendants)
+
+        # the entities contained in the diagrams do not depend on the request
+        self.total_proteins = AggregatedField(
+            self, [entry.total_proteins for entry in entries]
+        )
+        self.total_metabolites = AggregatedField(
+            self, [entry.total_metabolites for entry in entries]
+        )
+
+    def to_arrays(self) -> Dict[str, IndexArray]:
+        """Returns the index arrays by name, without the static fields"""
+        return {
+            "closure_indptr": self.closure_indptr,
+            "closure_indices": self.closure_indices,
+            "closure_rows": self.closure_rows,
+            "closure_first_rank": self.closure_first_rank,
+            "closure_last_rank": self.closure_last_rank,
+            "non_diagram_closure_indptr": self.non_diagram_closure.indptr,
+            "non_diagram_closure_indices": self.non_diagram_closure.indices,
+            "diagram_indptr": self.diagram_indptr,
+            "diagram_indices": self.diagram_indices,
+        }
+
+    @classmethod
+    def from_arrays(
+        cls,
+        pathway_ids: List[str],
+        db_ids: List[int],
+        arrays: Mapping[str, IndexArray],
+    ) -> "AggregationIndex":
+        """Restores an index from the arrays of to_arrays without copying them
+
+        The static fields total_proteins and total_metabolites have to be restored by the caller,
+        see AggregatedField.from_arrays.
+
+        Args:
+            pathway_ids: pathway ids in index order
+            db_ids: database ids of the pathways in index order
+            arrays: arrays returned by to_arrays, e.g. mapped from a shared segment
+        """
+        index = cls.__new__(cls)
+        index.pathway_ids = pathway_ids
+        index.position = {pathway_id: num for num, pathway_id in enumerate(pathway_ids)}
+        index.db_ids = db_ids
+        index.closure_indptr = arrays["closure_indptr"]
+        index.closure_indices = arrays["closure_indices"]
+        index.closure_rows = arrays["closure_rows"]
+        index.closure_first_rank = arrays["closure_first_rank"]
+        index.closure_last_rank = arrays["closure_last_rank"]
+        indices = arrays["non_diagram_closure_indices"]
+        index.non_diagram_closure = sparse.csr_matrix(
+            (
+                np.ones(len(indices), dtype=np.int64),
+                indices,
+                arrays["non_diagram_closure_indptr"],
+            ),
+            shape=(len(pathway_ids), len(pathway_ids)),
+        )
+        index.diagram_indptr = arrays["diagram_indptr"]
+        index.diagram_indices = arrays["diagram_indices"]
+        return index
+
+
+class AggregatedField:
+    """Aggregation of one dictionary valued pathway attribute
+
+    The pathway x key incidence of the own values is joined with the closure of the index,
+    for each pathway the keys are kept in insertion order and point to the pathway
+    whose own value is used.
+
+    Args:
+        index: aggregation index of the hierarchy
+        own_values: dictionary of each pathway before aggregation, in index order
+    """
+
+    def __init__(self, index: AggregationIndex, own_values: Sequence[Dict[str, Any]]):
+        self.own_values = own_values
+        key_position: Dict[str, int] = {}
+        own_rows: List[List[int]] = []
+        for values in own_values:
+            own_rows.append(
+                [key_position.setdefault(key, len(key_position)) for key in values]
+            )
+        self.key_names: List[str] = list(key_position)
+        own_indptr, own_keys = _csr_arrays(own_rows)
+        own_ranks = np.arange(len(own_keys), dtype=np.int64) - np.repeat(
+            own_indptr[:-1], np.diff(own_indptr)
+        )
+
+        # one entry for each pathway, descendant and key of the descendant
+        positions, counts = _expand_rows(own_indptr, index.closure_indices)
+        pathways = np.repeat(index.closure_rows, counts)
+        sources = np.repeat(index.closure_indices, counts)
+        first_ranks = np.repeat(index.closure_first_rank, counts)
+        last_ranks = np.repeat(index.closure_last_rank, counts)
+        keys = own_keys[positions]
+        own_ranks = own_ranks[positions]
+
+        by_last = np.lexsort((last_ranks, keys, pathways))
+        by_first = np.lexsort((own_ranks, first_ranks, keys, pathways))
+        sorted_pathways = pathways[by_last]
+        sorted_keys = keys[by_last]
+        group_end = np.ones(len(by_last), dtype=bool)
+        group_end[:-1] = (sorted_pathways[1:] != sorted_pathways[:-1]) | (
+            sorted_keys[1:] != sorted_keys[:-1]
+        )
+        group_start = np.roll(group_end, 1)
+        group_pathways = sorted_pathways[group_end]
+        group_keys = sorted_keys[group_end]
+        group_sources = sources[by_last][group_end]
+        group_first_ranks = first_ranks[by_first][group_start]
+        group_own_ranks = own_ranks[by_first][group_start]
+
+        order = np.lexsort((group_own_ranks, group_first_ranks, group_pathways))
+        self.keys: IndexArray = group_keys[order]
+        self.sources: IndexArray = group_sources[order]
+        self.indptr: IndexArray = np.zeros(len(index.pathway_ids) + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(group_pathways, minlength=len(index.pathway_ids)),
+            out=self.indptr[1:],
+        )
+        self._key_lists: Dict[int, List[str]] = {}
+
+    def to_arrays(self) -> Dict[str, IndexArray]:
+        """Returns the aggregated keys, their source pathways and the row pointers by name"""
+        return {"keys": self.keys, "sources": self.sources, "indptr": self.indptr}
+
+    @classmethod
+    def from_arrays(
+        cls,
+        arrays: Mapping[str, IndexArray],
+        key_names: List[str],
+        own_values: Sequence[Dict[str, Any]],
+    ) -> "AggregatedField":
+        """Restores an aggregated field from the arrays of to_arrays without copying them
+
+        Args:
+            arrays: arrays returned by to_arrays
+            key_names: names of the keys the key array refers to
+            own_values: dictionary of each pathway before aggregation, in index order
+        """
+        field = cls.__new__(cls)
+        field.own_values = own_values
+        field.key_names = key_names
+        field.keys = arrays["keys"]
+        field.sources = arrays["sources"]
+        field.indptr = arrays["indptr"]
+        field._key_lists = {}
+        return field
+
+    def row_lengths(self) -> IndexArray:
+        """Amount of aggregated keys per pathway"""
+        return np.diff(self.indptr)
+
+    def key_list(self, pathway: int) -> List[str]:
+        """Aggregated keys of a pathway in insertion order"""
+        # diagrams are listed in the subdiagram data of all their ancestors
+        if pathway not in self._key_lists:
+            self._key_lists[pathway] = [
+                self.key_names[key]
+                for key in self.keys[
+                    self.indptr[pathway] : self.indptr[pathway + 1]
+                ].tolist()
+            ]
+        return list(self._key_lists[pathway])
+
+    def materialize(self, pathway: int) -> Dict[str, Any]:
+        """Aggregated dictionary of a pathway"""
+        start, end = self.indptr[pathway], self.indptr[pathway + 1]
+        key_names = [self.key_names[key] for key in self.keys[start:end].tolist()]
+        sources = self.sources[start:end].tolist()
+        # look up every source pathway once, its values may be built on access
+        source_values = {source: self.own_values[source] for source in set(sources)}
+        own_values = [source_values[source] for source in sources]
+        return dict(zip(key_names, map(dict.__getitem__, own_values, key_names)))
+
+
+class SparseAggregation:
+    """Sparse matrix alternative to the dictionary based ReactomeHierarchy.aggregate_pathways
+
+    Computes the aggregated data of all pathways of a request at once. The per pathway
+    dictionaries and lists are only built when the attribute is read from the overlay.
+
+    Args:
+        hierarchy: hierarchy with the query data of the request added
+    """
+
+    def __init__(self, hierarchy: "ReactomeHierarchy"):
+        self.index: AggregationIndex = hierarchy.template.aggregation_index
+        overlays = [hierarchy[pathway_id] for pathway_id in self.index.pathway_ids]
+        self.total_measured: Dict[str, AggregatedField] = {
+            omic: AggregatedField(
+                self.index, [v["total_measured_" + omic] for v in overlays]
+            )
+            for omic in OMICS
+        }
+        self.own_measured: Dict[str, Tuple[List[str], sparse.csr_matrix]] = {}
+        for omic in OMICS:
+            key_position: Dict[str, int] = {}
+            own_rows = [
+                [
+                    key_position.setdefault(key, len(key_position))
+                    for key in set(v["own_measured_" + omic])
+                ]
+                for v in overlays
+            ]
+            indptr, indices = _csr_arrays(own_rows)
+            own_incidence = sparse.csr_matrix(
+                (np.ones(len(indices), dtype=np.int64), indices, indptr),
+                shape=(len(overlays), len(key_position)),
+            )
+            # own measured entities are passed on through children without diagram
+            self.own_measured[omic] = (
+                list(key_position),
+                (self.index.non_diagram_closure @ own_incidence).tocsr(),
+            )
+        # pathways with aggregated measurements, per omic
+        self.has_measured: Dict[str, np.ndarray[Tuple[int], np.dtype[np.bool_]]] = {
+            omic: self.total_measured[omic].row_lengths() > 0 for omic in OMICS
+        }
+        has_data = np.zeros(len(overlays), dtype=bool)
+        for omic in ("proteins", "genes", "metabolites"):
+            has_data |= self.has_measured[omic]
+        self.has_data: List[bool] = has_data.tolist()
+
+    def __getstate__(self):
+        # the index is part of the template, it is set again by restore_hierarchy
+        return {k: v for k, v in self.__dict__.items() if k != "index"}
+
+    def attach(self, entry: "ReactomePathway") -> None:
+        """Replaces the aggregated attributes of an overlay by the lazily materialized results"""
+        for field in AGGREGATED_FIELDS:
+            try:
+                delattr(entry, field)
+            except AttributeError:
+                pass
+        entry.sparse_aggregation = self
+        if self.has_data[self.index.position[entry.reactome_sID]]:
+            entry.has_data = True
+
+    def materialize(self, pathway_id: str, field: str) -> Any:
+        """Builds the aggregated value of an overlay attribute"""
+        pathway = self.index.position[pathway_id]
+        if field == "total_proteins":
+            return self.index.total_proteins.materialize(pathway)
+        if field == "total_metabolites":
+            return self.index.total_metabolites.materialize(pathway)
+        prefix, omic = field.rsplit("_", 1)
+        if prefix == "total_measured":
+            return self.total_measured[omic].materialize(pathway)
+        if prefix == "own_measured":
+            key_names, own_measured = self.own_measured[omic]
+            return [
+                key_names[key]
+                for key in own_measured.indices[
+                    own_measured.indptr[pathway] : own_measured.indptr[pathway + 1]
+                ].tolist()
+            ]
+        subdiagrams: Dict[Union[str, int], SubdiagramOmicEntry] = {}
+        total_measured = self.total_measured[omic]
+        diagrams = self.index.diagram_indices[
+            self.index.diagram_indptr[pathway] : self.index.diagram_indptr[pathway + 1]
+        ]
+        measured_diagrams = diagrams[self.has_measured[omic][diagrams]]
+        for diagram in measured_diagrams.tolist():
+            subdiagrams[self.index.db_ids[diagram]] = {
+                "stableID": self.index.pathway_ids[diagram],
+                "nodes": total_measured.key_list(diagram),
+            }
+        return subdiagrams
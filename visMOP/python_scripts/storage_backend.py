@@ -0,0 +1,87 @@
+import threading
+from typing import Dict, Tuple, Union
+from visMOP.python_scripts.embedded_store import EmbeddedBackend
+from visMOP.python_scripts.redis_pool import (
+    REDIS_HEALTH_CHECK_INTERVAL,
+    REDIS_POOL_SIZE,
+    RedisPools,
+)
+
+# redis hosts starting with this scheme refer to an embedded database file instead,
+# e.g. sqlite:///srv/vismop/reactome.sqlite
+EMBEDDED_SCHEME = "sqlite://"
+
+StorageBackend = Union[RedisPools, EmbeddedBackend]
+"""
+Access to the databases 0 to 2 of the reactome data, client(db) returns a redis like client.
+"""
+
+# process wide backends, keyed by connection settings
+_backends: Dict[Tuple[str, int, str], StorageBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def is_embedded(redis_host: str) -> bool:
+    """Returns if the host refers to an embedded database file"""
+    return redis_host.startswith(EMBEDDED_SCHEME)
+
+
+def _create_backend(
+    redis_host: str,
+    redis_port: int,
+    redis_pw: str,
+    max_connections: int = REDIS_POOL_SIZE,
+    health_check_interval: int = REDIS_HEALTH_CHECK_INTERVAL,
+) -> StorageBackend:
+    if is_embedded(redis_host):
+        return EmbeddedBackend(redis_host[len(EMBEDDED_SCHEME) :])
+    return RedisPools(
+        redis_host, redis_port, redis_pw, max_connections, health_check_interval
+    )
+
+
+def get_storage_backend(
+    redis_host: str, redis_port: int, redis_pw: str
+) -> StorageBackend:
+    """Returns the process wide backend for the connection settings, with default settings if not configured
+
+    Args:
+        redis_host: host of the redis server or sqlite:// and the path of an embedded database
+        redis_port: port of the redis server, ignored for embedded databases
+        redis_pw: password of the redis server, ignored for embedded databases
+    """
+    with _backends_lock:
+        key = (redis_host, redis_port, redis_pw)
+        if key not in _backends:
+            _backends[key] = _create_backend(redis_host, redis_port, redis_pw)
+        return _backends[key]
+
+
+def configure_storage_backend(
+    redis_host: str,
+    redis_port: int,
+    redis_pw: str,
+    max_connections: int = REDIS_POOL_SIZE,
+    health_check_interval: int = REDIS_HEALTH_CHECK_INTERVAL,
+) -> StorageBackend:
+    """Creates the process wide backend for the connection settings, replacing one created before
+
+    Args:
+        redis_host: host of the redis server or sqlite:// and the path of an embedded database
+        redis_port: port of the redis server
+        redis_pw: password of the redis server
+        max_connections: maximum of open connections per redis database
+        health_check_interval: seconds a redis connection may idle before it is checked on its next use
+
+    Returns:
+        the backend, see get_storage_backend
+    """
+    backend = _create_backend(
+        redis_host, redis_port, redis_pw, max_connections, health_check_interval
+    )
+    with _backends_lock:
+        previous = _backends.get((redis_host, redis_port, redis_pw))
+        _backends[(redis_host, redis_port, redis_pw)] = backend
+    if previous is not None:
+        previous.disconnect()
+    return backend
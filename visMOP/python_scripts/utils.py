@@ -1,6 +1,19 @@
 from collections import defaultdict
-from reactome2py import analysis
 from typing import List, DefaultDict, TypedDict
+from visMOP.python_scripts.redis_bulk_loader import RedisBulkLoader
+from visMOP.python_scripts.reactome_release import get_active_prefix
+from visMOP.python_scripts.storage_backend import get_storage_backend
+from visMOP.python_scripts.value_codec import decode_value
+
+try:
+    from reactome2py import analysis
+except (
+    ImportError
+):  # optional, KEGG ids are then only translated with the table in redis
+    analysis = None
+
+# hash of the KEGG compound to ChEBI translation in the mapping database (db 0)
+KEGG_CHEBI_KEY = "KEGG2ChEBI"
 
 
 class mapsTo(TypedDict):
@@ -22,9 +35,50 @@ class ReactomeAnalysisResult(TypedDict):
     mapsTo: List[mapsTo]
 
 
-def kegg_to_chebi(keggIDlist: List[str]) -> DefaultDict[str, List[str]]:
+def kegg_to_chebi(
+    keggIDlist: List[str],
+    redis_host: str,
+    redis_port: int,
+    redis_pw: str,
+    live_fallback: bool = True,
+) -> DefaultDict[str, List[str]]:
+    """
+    Maps KEGG IDs to ChEBI IDs with the translation table stored by reactome_redis.populate_kegg_chebi.
+
+    Args:
+        keggIDlist: KEGG compound ids
+        redis_host: host of the redis server containing the reactome data
+        redis_port: port of the redis server
+        redis_pw: password of the redis server
+        live_fallback: use the reactome analysis service if the table was not stored
+
+    Returns:
+        ChEBI ids by KEGG id, KEGG ids without ChEBI id are missing
+    """
+    storage = get_storage_backend(redis_host, redis_port, redis_pw)
+    r = storage.client(0)
+    key_prefix = get_active_prefix(storage.client(2))
+    if not r.exists(key_prefix + KEGG_CHEBI_KEY):
+        if live_fallback and analysis is not None:
+            print("KEGG to ChEBI table not found in redis, using the reactome service")
+            return kegg_to_chebi_online(keggIDlist)
+        raise Exception("Could not find {} in redis".format(KEGG_CHEBI_KEY))
+    out_ids: DefaultDict[str, List[str]] = defaultdict(list)
+    not_found = 0
+    for kegg_id, chebi_ids in RedisBulkLoader(r, key_prefix=key_prefix).hmget_batches(
+        KEGG_CHEBI_KEY, list(dict.fromkeys(keggIDlist))
+    ):
+        if chebi_ids is not None:
+            out_ids[kegg_id].extend(decode_value(chebi_ids))
+        else:
+            not_found += 1
+    print("No ChEBI found for {} of {} KEGG ids".format(not_found, len(keggIDlist)))
+    return out_ids
+
+
+def kegg_to_chebi_online(keggIDlist: List[str]) -> DefaultDict[str, List[str]]:
     """
-    Maps KEGG IDs to ChEBI IDs.
+    Maps KEGG IDs to ChEBI IDs with the reactome analysis service.
     """
     results: List[ReactomeAnalysisResult] = analysis.identifiers_mapping(
         ids=",".join(keggIDlist)
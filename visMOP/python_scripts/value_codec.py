@@ -0,0 +1,138 @@
+import json
+import marshal
+import zlib
+from typing import Any, Callable, Literal
+
+try:
+    import zstandard
+except ImportError:  # optional, diagrams are then compressed with zlib
+    zstandard = None
+
+# binary redis values: magic, format version, compression, payload format, payload
+# json never starts with a zero byte, so values written before the format are told apart
+VALUE_MAGIC = b"\x00VMV"
+VALUE_VERSION = 3
+# payload: python data (dicts, lists, tuples, strings, numbers) serialized with marshal, which
+# decodes considerably faster than json and keeps tuples. marshal is not stable between python
+# versions, so the format of the writing interpreter is stored and other formats are not read
+MARSHAL_VERSION = marshal.version
+# payload format of json documents stored as they are, e.g. the diagram files. Not a marshal
+# format, those are numbered from 0, and independent of the python version
+JSON_PAYLOAD = 255
+# marshal format of version 1 values, their header does not contain it
+_VERSION_1_MARSHAL = 4
+# format of the values written by this interpreter, data in another format has to be ingested again
+VALUE_FORMAT = "{}.{}".format(VALUE_VERSION, MARSHAL_VERSION)
+
+Compression = Literal["none", "zlib", "zstd"]
+COMPRESSION_IDS = {"none": 0, "zlib": 1, "zstd": 2}
+# compression of the diagram files, the largest values in redis
+DIAGRAM_COMPRESSION: Compression = "zstd" if zstandard is not None else "zlib"
+
+_HEADER_LENGTH = len(VALUE_MAGIC) + 3
+
+
+class StaleValueError(ValueError):
+    """Raised for values written in the marshal format of another python version"""
+
+
+def is_encoded(value: bytes) -> bool:
+    """Returns if a redis value was written by encode_value"""
+    return value[: len(VALUE_MAGIC)] == VALUE_MAGIC
+
+
+def _encode_payload(
+    payload: bytes, compression: Compression, payload_format: int
+) -> bytes:
+    """Compresses a payload and prepends the header"""
+    if compression == "zlib":
+        payload = zlib.compress(payload, 6)
+    elif compression == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        payload = zstandard.ZstdCompressor(level=9).compress(payload)
+    return (
+        VALUE_MAGIC
+        + bytes((VALUE_VERSION, COMPRESSION_IDS[compression], payload_format))
+        + payload
+    )
+
+
+def encode_value(data: Any, compression: Compression = "none") -> bytes:
+    """Encodes data for storage in redis
+
+    Args:
+        data: json like python data, tuples and bytes are kept
+        compression: compression of the payload, zstd requires the zstandard package
+
+    Returns:
+        the encoded value
+    """
+    return _encode_payload(
+        marshal.dumps(data, MARSHAL_VERSION), compression, MARSHAL_VERSION
+    )
+
+
+def encode_json(content: bytes, compression: Compression = "none") -> bytes:
+    """Encodes a json document for storage in redis, the bytes are stored unchanged
+
+    Args:
+        content: utf-8 encoded json
+        compression: compression of the payload, zstd requires the zstandard package
+
+    Returns:
+        the encoded value, decode_value returns the parsed json
+    """
+    return _encode_payload(content, compression, JSON_PAYLOAD)
+
+
+def decode_value(value: bytes, legacy: Callable[[bytes], Any] = json.loads) -> Any:
+    """Decodes a redis value written by encode_value
+
+    Values written before the binary format are decoded with the legacy function, json
+    payloads with json.loads.
+    Raises a ValueError for newer format versions and unavailable compressions and a
+    StaleValueError for values of another marshal format, the data has to be ingested again.
+
+    Args:
+        value: value as returned by redis
+        legacy: decoder of values without header, json by default
+
+    Returns:
+        the decoded data
+    """
+    if not is_encoded(value):
+        return legacy(value)
+    version = value[len(VALUE_MAGIC)]
+    if version == 1:
+        payload_format = _VERSION_1_MARSHAL
+        payload = memoryview(value)[_HEADER_LENGTH - 1 :]
+    elif version in (2, VALUE_VERSION):
+        # version 3 added json payloads
+        payload_format = value[_HEADER_LENGTH - 1]
+        payload = memoryview(value)[_HEADER_LENGTH:]
+    else:
+        raise ValueError(
+            "Redis value has format version {}, this version reads {}".format(
+                version, VALUE_VERSION
+            )
+        )
+    if payload_format not in (MARSHAL_VERSION, JSON_PAYLOAD):
+        raise StaleValueError(
+            "Redis value was written in marshal format {}, this python reads {}: "
+            "ingest the reactome data again (reactome_redis.py)".format(
+                payload_format, MARSHAL_VERSION
+            )
+        )
+    compression = value[len(VALUE_MAGIC) + 1]
+    if compression == COMPRESSION_IDS["zlib"]:
+        payload = zlib.decompress(payload)
+    elif compression == COMPRESSION_IDS["zstd"]:
+        if zstandard is None:
+            raise ValueError("Redis value is zstd compressed, install zstandard")
+        payload = zstandard.ZstdDecompressor().decompress(payload)
+    elif compression != COMPRESSION_IDS["none"]:
+        raise ValueError("Unknown compression {} of redis value".format(compression))
+    if payload_format == JSON_PAYLOAD:
+        return json.loads(bytes(payload))
+    return marshal.loads(payload)